@@ -0,0 +1,137 @@
+import heapq
+import tempfile
+from itertools import islice
+
+from pods import *
+
+
+def createPod(podList: PodList, line: str) -> Pod:
+    # Pod from one line of a pod file
+    # user name arrivalTime work prio tickets cpu gpu ram
+    line = line.strip().split()
+    user = line[0]
+    name = line[1]
+    arrivalTime = int(line[2])
+    work = int(line[3])
+    prio = int(line[4])
+    tickets = int(line[5])
+    cpu = int(line[6])
+    gpu = int(line[7])
+    ram = int(line[8])
+
+    return podList.createPod(user, name, arrivalTime, work, cpu, gpu, ram, prio, tickets, State.CREATED)
+
+def getArrivalTime(line: str) -> int:
+    return int(line.split(None, 3)[2])
+
+class ArrivalSource:
+    # Pods of a pod file in arrival order, read while the simulation runs instead of all at once
+    # Pods with the same arrival time keep their file order
+    # A file that is not sorted by arrival time is sorted first, in runs of at most runSize lines
+    # that are spilled to temp files and then merged, so memory does not depend on the file length
+    runSize = 100000
+
+    def __init__(self, pfile: str, podList: PodList) -> None:
+        self.pfile = pfile
+        self.podList = podList
+        self.header = ""
+        self.files = [] # Open files the lines are read from
+        self.runs = 0 # Number of sorted runs, 0 if the file was already sorted
+        self.linesRead = 0 # Lines read in arrival order, including the line of nextPod
+
+        self.openLines()
+        self.nextPod = None
+        self.advance()
+
+    def openLines(self) -> None:
+        # Sets self.lines to the pod lines in arrival order
+        if self.isSorted():
+            f = open(self.pfile, 'r')
+            self.files.append(f)
+            self.header = f.readline().strip()
+            self.lines = (line for line in f if line.strip() != "")
+        else:
+            self.lines = self.sortRuns()
+
+    def isSorted(self) -> bool:
+        # One pass over the file, only keeps the last arrival time
+        with open(self.pfile, 'r') as f:
+            f.readline()
+            lastTime = None
+            for line in f:
+                if line.strip() == "":
+                    continue
+                arrivalTime = getArrivalTime(line)
+                if lastTime != None and arrivalTime < lastTime:
+                    return False
+                lastTime = arrivalTime
+        return True
+
+    def sortRuns(self):
+        # Sorts runs of runSize lines into temp files, returns the merged lines of all runs
+        # sort and heapq.merge are both stable, equal arrival times stay in file order
+        with open(self.pfile, 'r') as f:
+            self.header = f.readline().strip()
+            lines = (line for line in f if line.strip() != "")
+            while True:
+                run = list(islice(lines, self.runSize))
+                if len(run) == 0:
+                    break
+                run.sort(key=getArrivalTime)
+                tmp = tempfile.TemporaryFile('w+')
+                for line in run:
+                    tmp.write(line if line.endswith("\n") else line + "\n")
+                tmp.seek(0)
+                self.files.append(tmp)
+        self.runs = len(self.files)
+        return heapq.merge(*self.files, key=getArrivalTime)
+
+    def advance(self) -> None:
+        line = next(self.lines, None)
+        if line == None:
+            self.nextPod = None
+            self.close()
+        else:
+            self.linesRead += 1
+            self.nextPod = createPod(self.podList, line)
+
+    def close(self) -> None:
+        for f in self.files:
+            f.close()
+        self.files = []
+
+    def hasNext(self) -> bool:
+        return self.nextPod != None
+
+    def getNextTime(self) -> int:
+        # Arrival time of the next pod, None if there are no more pods
+        if self.nextPod == None:
+            return None
+        return self.nextPod.at
+
+    def popPod(self) -> Pod:
+        # Next pod in arrival order, reads one more line
+        pod = self.nextPod
+        self.advance()
+        return pod
+
+    def __getstate__(self) -> dict:
+        # Open files are not pickled, only how far into the pod file the source is
+        state = self.__dict__.copy()
+        del state["files"]
+        del state["lines"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        # Opens the pod file again, sorted again if it has to be, and skips the lines already read
+        setState(self, state)
+        self.files = []
+        if self.nextPod == None:
+            self.lines = iter(())
+            return
+        self.openLines()
+        next(islice(self.lines, self.linesRead, self.linesRead), None)
+
+    def podDone(self, pod: Pod) -> None:
+        # The simulation is done with this pod
+        self.podList.podDone(pod)
@@ -0,0 +1,300 @@
+import contextlib, gc, getopt, io, json, math, multiprocessing, os, random, resource, sys, tempfile, time, tracemalloc
+
+import simulator
+from pods import *
+from nodes import *
+from pod_table import PodTable
+from simulator import EventQueue
+from sweep import getTableStr, getCsvStr
+from pod_gen import parseCount
+import node_gen, pod_gen
+
+# Runs every pod scheduler against every node scheduler on synthetic workloads of growing size
+# Each run is a fresh process, so its peak RSS is its own and a run that takes too long can be stopped
+# Results can be saved as a baseline and later runs compared against it, e.g. before and after a change
+
+columns = ("sched", "nsched", "pods", "nodes", "events", "unscheduled", "rejected", "load", "simulate", "report", "eventsPerSec", "peakRssMB",
+    "allocPeakMB", "allocBlocks", "growth", "baseline", "error")
+
+allScheds = ("FCFS", "SRTF", "SRF", "RR:0:50", "PRIO:0:50:4", "DRF", "Lottery", "Vergil") # One of each in schedulers.py
+allNScheds = ("DEF", "LRP", "BRA")
+
+superLinear = 1.3 # Growth above this is super-linear, doubling the size more than doubles the time per run
+minSeconds = 0.05 # Shorter simulations are too noisy for the growth
+
+def parseScales(arg: str) -> list[tuple]:
+    # "1k:100,10k:1k" -> [(1000, 100), (10000, 1000)]
+    scales = []
+    for spec in arg.split(","):
+        pods, nodes = spec.split(":")
+        scales.append((parseCount(pods), parseCount(nodes)))
+    return scales
+
+def genWorkload(workDir: str, pods: int, nodes: int, seed: int) -> tuple:
+    # Pod and node files for one scale, written once and reused by every run at that scale
+    pfile = os.path.join(workDir, "pods_%d_%d_%d.txt" % (pods, nodes, seed))
+    nfile = os.path.join(workDir, "nodes_%d.txt" % (nodes))
+    # pods_mix.txt and nodes.txt of pod_gen.py and node_gen.py, arrivals are spread over a time that grows with pods
+    # per node so the cluster load is about the same at every scale
+    if not os.path.exists(pfile):
+        pod_gen.generate(pfile, pods, ("uniform", [max(120, pods * 500 // nodes)]), ("uniform", [100, 1000]), "mix", 0.0,
+            100, 0.0, seed, False)
+    if not os.path.exists(nfile):
+        node_gen.generate(nfile, nodes, node_gen.fleets["default"], 0, False, 0, 1, False)
+    return pfile, nfile
+
+def loadSim(case: tuple) -> simulator.Simulation:
+    sched, nsched, pfile, nfile, seed, useTable, useCompact, traceAlloc = case
+    random.seed(seed)
+    simulator.resetEventID()
+    return simulator.loadMain(pfile, nfile, simulator.parseSchedulerInfo(sched), simulator.parseNodeListInfo(nsched),
+        PodTable() if useCompact else PodList(), EventQueue(), False, useTable, False)
+
+def runCase(conn, case: tuple) -> None:
+    # Runs in its own process, sends the measurements of one run back through conn
+    traceAlloc = case[-1]
+    result = dict()
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            start = time.perf_counter()
+            mySim = loadSim(case)
+            result["load"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            mySim.run()
+            result["simulate"] = time.perf_counter() - start
+            result["events"] = simulator.eventID
+            result["unscheduled"] = mySim.scheduler.getQueueLength()
+            result["rejected"] = len(mySim.scheduler.rejectedPods)
+
+            start = time.perf_counter()
+            mySim.podList.calcAvgJct()
+            mySim.podList.calcAvgLatency()
+            mySim.nodeList.calcAvgUtil()
+            result["report"] = time.perf_counter() - start
+            result["peakRssMB"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # kB on Linux
+
+            if traceAlloc:
+                # Second run under tracemalloc, it is several times slower so the times above come from the first run
+                mySim = None
+                gc.collect()
+                tracemalloc.start()
+                mySim = loadSim(case)
+                mySim.run()
+                result["allocPeakMB"] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+                result["allocBlocks"] = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+                tracemalloc.stop()
+    except BaseException as e: # The simulator exits on fatal errors
+        lines = out.getvalue().strip().splitlines()
+        result["error"] = lines[-1] if isinstance(e, SystemExit) and len(lines) > 0 else "%s: %s" % (type(e).__name__, e)
+    conn.send(result)
+    conn.close()
+
+def measure(case: tuple, timeout: float) -> dict:
+    # runCase in a new interpreter, spawned instead of forked so nothing of this process counts towards its RSS
+    ctx = multiprocessing.get_context("spawn")
+    parentConn, childConn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=runCase, args=(childConn, case))
+    proc.start()
+    childConn.close()
+    if parentConn.poll(timeout):
+        try:
+            result = parentConn.recv()
+        except EOFError:
+            result = {"error": "Run died, exit code %s" % (proc.exitcode)}
+    else:
+        proc.kill()
+        result = {"error": "Timeout after %ds" % (timeout)}
+    proc.join()
+    return result
+
+def getGrowth(result: dict, prev: dict) -> float:
+    # Exponent of the simulate time against the number of events between two scales
+    # 1 is linear, the time per event stays the same, 2 is quadratic
+    if prev == None or "error" in result or "error" in prev or prev["simulate"] < minSeconds or result["events"] <= prev["events"]:
+        return None
+    return math.log(result["simulate"] / prev["simulate"]) / math.log(result["events"] / prev["events"])
+
+def compareBaseline(key: str, result: dict, baseline: dict, tolerance: float) -> str:
+    # "ok", or what got worse by more than tolerance, None when the baseline has no such run
+    if baseline == None or key not in baseline["runs"] or "error" in result:
+        return None
+    base = baseline["runs"][key]
+    flags = []
+    if result["eventsPerSec"] < base["eventsPerSec"] * (1 - tolerance):
+        flags.append("SLOWER %.0f%%" % (100 * (1 - result["eventsPerSec"] / base["eventsPerSec"])))
+    if result["peakRssMB"] > base["peakRssMB"] * (1 + tolerance):
+        flags.append("MORE MEMORY %.0f%%" % (100 * (result["peakRssMB"] / base["peakRssMB"] - 1)))
+    return " ".join(flags) if len(flags) > 0 else "ok"
+
+def getKey(sched: str, nsched: str, pods: int, nodes: int) -> str:
+    return "%s %s %d %d" % (sched, nsched, pods, nodes)
+
+def userCallHelper():
+    print('benchmark.py -h -a -c -m -s <scheduler,...> -d <node scheduler,...> -z <pods:nodes,...> -x <max pods> -r <seed>')
+    print('             -l <seconds> -g <dir> -o <out.csv> -b <baseline.json> -w <baseline.json> -f <tolerance>')
+    print('Runs every pod scheduler with every node scheduler on generated workloads of each size')
+    print('-s pod schedulers, default one of each: %s' % (",".join(allScheds)))
+    print('-d node schedulers, default %s' % (",".join(allNScheds)))
+    print('-z sizes as pods:nodes, k and M suffixes work, default 1k:100,10k:1k')
+    print('-x doubles the first size until max pods instead, a pair stops once it grows super-linear')
+    print('-r seed for the generated workloads and the random module, default 0')
+    print('-l time limit of one run in seconds, default 300')
+    print('-g keeps the generated workloads in dir, default a temp dir')
+    print('-m also measures allocations with tracemalloc, in a second run')
+    print('-o also writes the table to a csv file')
+    print('-w saves the results as a baseline, -b compares against one')
+    print('-f how much worse than the baseline is flagged, default 0.2')
+    print('-a for array backed node matching (needs numpy)')
+    print('-c for compact pod storage')
+
+def main(argv):
+    scheds = list(allScheds)
+    nscheds = list(allNScheds)
+    scales = [(1000, 100), (10000, 1000)]
+    maxPods = 0
+    seed = 0
+    timeout = 300
+    workDir = ''
+    outFile = ''
+    baselineFile = ''
+    saveFile = ''
+    tolerance = 0.2
+    traceAlloc = False
+    useTable = False
+    useCompact = False
+
+    try:
+        opts, args = getopt.getopt(argv, "hacms:d:z:x:r:l:g:o:b:w:f:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    try:
+        for opt, arg in opts:
+            if opt == "-h":
+                userCallHelper()
+                sys.exit(1)
+            elif opt == "-s":
+                scheds = arg.split(",")
+            elif opt == "-d":
+                nscheds = arg.split(",")
+            elif opt == "-z":
+                scales = parseScales(arg)
+            elif opt == "-x":
+                maxPods = parseCount(arg)
+            elif opt == "-r":
+                seed = int(arg)
+            elif opt == "-l":
+                timeout = float(arg)
+            elif opt == "-g":
+                workDir = arg
+            elif opt == "-o":
+                outFile = arg
+            elif opt == "-b":
+                baselineFile = arg
+            elif opt == "-w":
+                saveFile = arg
+            elif opt == "-f":
+                tolerance = float(arg)
+            elif opt == "-m":
+                traceAlloc = True
+            elif opt == "-a":
+                useTable = True
+            elif opt == "-c":
+                useCompact = True
+    except ValueError:
+        print('Invalid value for %s: %s' % (opt, arg))
+        sys.exit(1)
+
+    if pod_gen.np is None:
+        print('benchmark.py needs numpy to generate its workloads, exiting')
+        sys.exit(1)
+    for sched in scheds:
+        if simulator.parseSchedulerInfo(sched) == None:
+            print('Invalid scheduler: %s' % (sched))
+            sys.exit(1)
+    for nsched in nscheds:
+        if simulator.parseNodeListInfo(nsched) == None:
+            print('Invalid node scheduler: %s' % (nsched))
+            sys.exit(1)
+    if maxPods > 0:
+        pods, nodes = scales[0]
+        scales = []
+        while pods <= maxPods:
+            scales.append((pods, nodes))
+            pods, nodes = pods * 2, nodes * 2
+
+    options = " ".join(flag for flag, used in (("-a", useTable), ("-c", useCompact)) if used)
+    baseline = None
+    if baselineFile != "":
+        with open(baselineFile, 'r') as f:
+            baseline = json.load(f)
+        if baseline["options"] != options:
+            print('Baseline was made with options "%s", this run has "%s"' % (baseline["options"], options))
+
+    tmpDir = None
+    if workDir == "":
+        tmpDir = tempfile.TemporaryDirectory()
+        workDir = tmpDir.name
+    os.makedirs(workDir, exist_ok=True)
+
+    rows = []
+    saved = {"options": options, "runs": dict()}
+    regressed = False
+    stopped = set() # Pairs that grew super-linear or failed, -x does not run them at larger sizes
+    firstSuperLinear = dict() # (sched, nsched) -> (pods, nodes, growth)
+    prevResults = dict()
+
+    for pods, nodes in scales:
+        start = time.perf_counter()
+        pfile, nfile = genWorkload(workDir, pods, nodes, seed)
+        print("Generated %d pods and %d nodes in %.2fs" % (pods, nodes, time.perf_counter() - start), file=sys.stderr)
+
+        for sched in scheds:
+            for nsched in nscheds:
+                if (sched, nsched) in stopped:
+                    continue
+                result = measure((sched, nsched, pfile, nfile, seed, useTable, useCompact, traceAlloc), timeout)
+                key = getKey(sched, nsched, pods, nodes)
+                growth = None
+                status = None
+                if "error" not in result:
+                    result["eventsPerSec"] = result["events"] / result["simulate"] if result["simulate"] > 0 else 0.0
+                    growth = getGrowth(result, prevResults.get((sched, nsched)))
+                    status = compareBaseline(key, result, baseline, tolerance)
+                    saved["runs"][key] = {name: result[name] for name in ("events", "load", "simulate", "report", "eventsPerSec", "peakRssMB")}
+                    if status != None and status != "ok":
+                        regressed = True
+                    if growth != None and growth > superLinear and (sched, nsched) not in firstSuperLinear:
+                        firstSuperLinear[(sched, nsched)] = (pods, nodes, growth)
+                if maxPods > 0 and ("error" in result or (sched, nsched) in firstSuperLinear):
+                    stopped.add((sched, nsched))
+                prevResults[(sched, nsched)] = result
+
+                rows.append((sched, nsched, pods, nodes, result.get("events"), result.get("unscheduled"), result.get("rejected"), result.get("load"), result.get("simulate"),
+                    result.get("report"), result.get("eventsPerSec"), result.get("peakRssMB"), result.get("allocPeakMB"),
+                    result.get("allocBlocks"), growth, status, result.get("error", "")))
+                done = result["error"] if "error" in result else "%.2fs" % (result["simulate"])
+                print("%s %s %d:%d %s" % (sched, nsched, pods, nodes, done), file=sys.stderr)
+
+    if tmpDir != None:
+        tmpDir.cleanup()
+
+    print(getTableStr(rows, columns), end="")
+    if len(firstSuperLinear) > 0:
+        print("\nSuper-linear from:")
+        for (sched, nsched), (pods, nodes, growth) in firstSuperLinear.items():
+            print("\t%s %s at %d pods, %d nodes, growth %.2f" % (sched, nsched, pods, nodes, growth))
+    if outFile != "":
+        with open(outFile, 'w') as f:
+            f.write(getCsvStr(rows, columns))
+    if saveFile != "":
+        with open(saveFile, 'w') as f:
+            json.dump(saved, f, indent=1)
+    if regressed:
+        print("Slower or bigger than the baseline")
+        sys.exit(1)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,122 @@
+from pods import *
+
+
+class CapacityTree:
+    # Segment tree over the nodes of a NodeList
+    # Each tree entry keeps the max free cpu, gpu and ram of the nodes below it
+    # Leaf of node i is at size + i, entry j has children 2j and 2j+1, root is entry 1
+    BLOCK = 32
+
+    def __init__(self) -> None:
+        self.nodes = [] # Same order as the leaves, node.index is the leaf
+        self.size = 1
+        self.maxCpu = [-1] * 2
+        self.maxGpu = [-1] * 2
+        self.maxRam = [-1] * 2
+
+    def rebuild(self) -> None:
+        size = self.size
+        self.maxCpu = [-1] * (2 * size)
+        self.maxGpu = [-1] * (2 * size)
+        self.maxRam = [-1] * (2 * size)
+        for i, node in enumerate(self.nodes):
+            self.maxCpu[size + i] = node.curCpu
+            self.maxGpu[size + i] = node.curGpu
+            self.maxRam[size + i] = node.curRam
+        for j in range(size - 1, 0, -1):
+            self.maxCpu[j] = max(self.maxCpu[2*j], self.maxCpu[2*j + 1])
+            self.maxGpu[j] = max(self.maxGpu[2*j], self.maxGpu[2*j + 1])
+            self.maxRam[j] = max(self.maxRam[2*j], self.maxRam[2*j + 1])
+
+    def addNode(self, node) -> None:
+        self.nodes.append(node)
+        if len(self.nodes) > self.size:
+            self.size *= 2
+            self.rebuild()
+        else:
+            self.updateNode(node)
+
+    def updateNode(self, node) -> None:
+        # O(log N), stops once an entry does not change
+        maxCpu = self.maxCpu
+        maxGpu = self.maxGpu
+        maxRam = self.maxRam
+        j = self.size + node.index
+        maxCpu[j] = node.curCpu
+        maxGpu[j] = node.curGpu
+        maxRam[j] = node.curRam
+        j //= 2
+        while j > 0:
+            cpu = max(maxCpu[2*j], maxCpu[2*j + 1])
+            gpu = max(maxGpu[2*j], maxGpu[2*j + 1])
+            ram = max(maxRam[2*j], maxRam[2*j + 1])
+            if cpu == maxCpu[j] and gpu == maxGpu[j] and ram == maxRam[j]:
+                break
+            maxCpu[j] = cpu
+            maxGpu[j] = gpu
+            maxRam[j] = ram
+            j //= 2
+
+    def mayFit(self, j: int, pod: Pod) -> bool:
+        # False means no node below entry j can run this pod
+        return self.maxCpu[j] >= pod.cpu and self.maxGpu[j] >= pod.gpu and self.maxRam[j] >= pod.ram
+
+    def canFit(self, pod: Pod) -> bool:
+        # O(1) rejection, if the cluster wide max of any resource is too small no node can run this pod
+        # True does not guarantee a node can run it, the max of each resource may come from different nodes
+        return self.mayFit(1, pod)
+
+    def getFeasible(self, pod: Pod) -> list:
+        # Nodes that can run this pod in node list order, skipping subtrees that cannot
+        # Stops pruning at blocks of BLOCK leaves, scanning a block is cheaper than walking it
+        cpu = pod.cpu
+        gpu = pod.gpu
+        ram = pod.ram
+        maxCpu = self.maxCpu
+        maxGpu = self.maxGpu
+        maxRam = self.maxRam
+        if maxCpu[1] < cpu or maxGpu[1] < gpu or maxRam[1] < ram:
+            return []
+        size = self.size
+        nodes = self.nodes
+        blockStart = max(size // self.BLOCK, 1) # Entries from here on cover at most BLOCK leaves
+        feasible = []
+        stack = [1]
+        while stack:
+            j = stack.pop()
+            if j >= blockStart:
+                # Leaves covered by entry j
+                first = j
+                last = j + 1
+                while first < size:
+                    first *= 2
+                    last *= 2
+                for node in nodes[first - size:last - size]:
+                    if node.curCpu >= cpu and node.curGpu >= gpu and node.curRam >= ram:
+                        feasible.append(node)
+                continue
+            # Right child first so the left one is visited first, same check as mayFit
+            k = 2*j + 1
+            if maxCpu[k] >= cpu and maxGpu[k] >= gpu and maxRam[k] >= ram:
+                stack.append(k)
+            k = 2*j
+            if maxCpu[k] >= cpu and maxGpu[k] >= gpu and maxRam[k] >= ram:
+                stack.append(k)
+        return feasible
+
+    def getFirstFit(self, pod: Pod):
+        # First node in node list order that can run this pod, None if there is none
+        # O(log N) unless many subtrees only look like they fit
+        if not self.mayFit(1, pod):
+            return None
+        size = self.size
+        stack = [1]
+        while stack:
+            j = stack.pop()
+            if j >= size:
+                return self.nodes[j - size]
+            if self.mayFit(2*j + 1, pod):
+                stack.append(2*j + 1)
+            if self.mayFit(2*j, pod):
+                stack.append(2*j)
+        return None
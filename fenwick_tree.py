@@ -0,0 +1,57 @@
+class FenwickTree:
+    # Prefix sums over a growing list of values, O(log N) update and search by prefix sum
+    # Entry i (1 based) holds the sum of the values in (i - lowbit(i), i]
+    def __init__(self) -> None:
+        self.values = []
+        self.tree = [0]
+        self.sum = 0
+        self.topStep = 0 # Largest power of 2 below len(self.tree)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def append(self, value) -> None:
+        # Entry i covers the lowbit(i) values ending at i, sum the earlier ones from the tree
+        i = len(self.tree)
+        self.values.append(value)
+        total = value
+        j = i - 1
+        stop = i - (i & -i)
+        while j > stop:
+            total += self.tree[j]
+            j -= j & -j
+        self.tree.append(total)
+        self.sum += value
+        if self.topStep * 2 < len(self.tree):
+            self.topStep = max(self.topStep * 2, 1)
+
+    def set(self, index: int, value) -> None:
+        # index is 0 based like the values list
+        delta = value - self.values[index]
+        if delta == 0:
+            return
+        self.values[index] = value
+        self.sum += delta
+        tree = self.tree
+        size = len(tree)
+        i = index + 1
+        while i < size:
+            tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        return self.sum
+
+    def search(self, target):
+        # Smallest 0 based index whose prefix sum including it is >= target, values must be >= 0
+        # Returns len(self) if the total is smaller than target
+        tree = self.tree
+        size = len(tree)
+        pos = 0
+        step = self.topStep
+        while step > 0:
+            if pos + step < size and tree[pos + step] < target:
+                pos += step
+                target -= tree[pos]
+            step //= 2
+        return pos
@@ -3,4 +3,14 @@
 vFlag = False # General debug info
 tFlag = False # Prints simulation trace
 qFlag = False # Prints scheduler q
-zFlag = False # Node related debugging information
\ No newline at end of file
+zFlag = False # Node related debugging information
+traceSink = None # Structured trace, see trace_sink.py
+
+def reset() -> None:
+    # Turns every flag off, for running several simulations in one process
+    global vFlag, tFlag, qFlag, zFlag, traceSink
+    vFlag = False
+    tFlag = False
+    qFlag = False
+    zFlag = False
+    traceSink = None
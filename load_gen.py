@@ -0,0 +1,247 @@
+import asyncio, getopt, json, random, sys, time
+
+from arrival_source import ArrivalSource
+from metrics import Metric
+from pod_gen import kinds, parseCount
+from pods import *
+
+# Load generator for sched_server.py, measures how many scheduling decisions per second it sustains
+# Each connection submits its share of the pods, keeping at most a number of them outstanding (submitted and not
+# done yet), and tells the service a bound pod is done after it ran work * time scale seconds
+# With the default time scale of 0 pods are done as soon as they are bound, so the cluster never fills up
+# and the rate is bound by the service alone
+
+class Client:
+    def __init__(self, reader, writer, pods: list[dict], outstanding: int, interval: float, timeScale: float) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.pods = pods
+        self.slots = asyncio.Semaphore(outstanding)
+        self.interval = interval # Seconds between two submissions, 0 for as fast as the slots allow
+        self.timeScale = timeScale
+        self.sentAt = dict() # pod name -> perf_counter of its submission
+        self.work = dict() # pod name -> work, until it is done
+        self.timers = dict() # pod name -> timer sending its done
+        self.finishing = set() # Names of the pods whose done was sent and not answered yet
+        self.left = len(pods) # Pods that are not done or rejected
+
+        self.bound = 0
+        self.preempted = 0
+        self.evicted = 0
+        self.rejected = 0
+        self.errors = 0
+        self.bindMs = Metric() # Submission to bind, as seen by the client
+        self.lastBind = None
+
+    async def run(self) -> None:
+        await asyncio.gather(self.submitAll(), self.receiveAll())
+
+    async def submitAll(self) -> None:
+        nextTime = time.perf_counter()
+        for pod in self.pods:
+            await self.slots.acquire()
+            if self.interval > 0:
+                nextTime += self.interval
+                delay = nextTime - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.sentAt[pod["pod"]] = time.perf_counter()
+            self.work[pod["pod"]] = pod["work"]
+            self.writer.write(json.dumps(pod).encode() + b"\n")
+            await self.writer.drain()
+
+    def sendDone(self, name: str) -> None:
+        self.timers.pop(name, None)
+        self.finishing.add(name)
+        self.writer.write(json.dumps({"op": "done", "pod": name}).encode() + b"\n")
+
+    def podOver(self, name: str) -> None:
+        del self.work[name]
+        self.left -= 1
+        self.slots.release()
+
+    async def receiveAll(self) -> None:
+        while self.left > 0:
+            line = await self.reader.readline()
+            if not line:
+                print('The service closed the connection')
+                sys.exit(1)
+            msg = json.loads(line)
+            op = msg.get("op")
+            if op == "bind":
+                name = msg["pod"]
+                self.lastBind = time.perf_counter()
+                self.bindMs.add((self.lastBind - self.sentAt[name]) * 1000)
+                self.bound += 1
+                if self.timeScale > 0:
+                    self.timers[name] = asyncio.get_running_loop().call_later(self.work[name] * self.timeScale, self.sendDone, name)
+                else:
+                    self.sendDone(name)
+            elif op == "preempt":
+                # The pod keeps running for the grace period of the service
+                self.preempted += 1
+            elif op == "evict":
+                # Queued again, the pod is bound again later
+                timer = self.timers.pop(msg["pod"], None)
+                if timer is not None:
+                    timer.cancel()
+                self.sentAt[msg["pod"]] = time.perf_counter()
+                self.evicted += 1
+            elif op == "done":
+                self.finishing.discard(msg["pod"])
+                self.podOver(msg["pod"])
+            elif op == "reject":
+                self.rejected += 1
+                self.podOver(msg["pod"])
+            elif msg.get("pod") in self.finishing:
+                # Evicted before the service got its done, it is bound again later
+                self.finishing.discard(msg["pod"])
+            else:
+                print('Error from the service: %s' % (msg.get("error")))
+                self.errors += 1
+                if msg.get("pod") in self.work:
+                    self.podOver(msg["pod"])
+
+def getPods(n: int, kind: str, users: int, seed: int) -> list[dict]:
+    # Random submissions with the cpu, gpu and ram ranges of pod_gen.py
+    rng = random.Random(seed)
+    pods = []
+    for i in range(n):
+        (cpuLow, cpuHigh), (gpuLow, gpuHigh), (ramLow, ramHigh) = kinds[kind]
+        pods.append({"op": "submit", "pod": "Pod%d" % (i), "user": "User%d" % (rng.randrange(users)),
+            "cpu": rng.randint(cpuLow, cpuHigh), "gpu": rng.randint(gpuLow, gpuHigh), "ram": rng.randint(ramLow, ramHigh),
+            "work": rng.randint(100, 1000), "prio": rng.randint(1, 4), "tickets": rng.randint(1, 10) * 10})
+    return pods
+
+def readPods(pfile: str, n: int) -> list[dict]:
+    # Submissions from a pod file, in arrival order, at most n of them
+    myPodList = StreamedPodList()
+    arrivals = ArrivalSource(pfile, myPodList)
+    pods = []
+    while arrivals.hasNext() and len(pods) < n:
+        pod = arrivals.popPod()
+        pods.append({"op": "submit", "pod": pod.name, "user": pod.user, "cpu": pod.cpu, "gpu": pod.gpu, "ram": pod.ram,
+            "work": pod.work, "prio": pod.prio, "tickets": pod.tickets})
+    arrivals.close()
+    return pods
+
+async def connect(address: str, socketPath: str):
+    if socketPath != "":
+        return await asyncio.open_unix_connection(socketPath)
+    host, port = address.rsplit(":", 1)
+    return await asyncio.open_connection(host, int(port))
+
+async def getStats(address: str, socketPath: str) -> dict:
+    reader, writer = await connect(address, socketPath)
+    writer.write(b'{"op": "stats"}\n')
+    stats = json.loads(await reader.readline())
+    writer.close()
+    return stats
+
+async def runLoad(address: str, socketPath: str, pods: list[dict], connections: int, outstanding: int, rate: float, timeScale: float):
+    # Pods are dealt round robin to the connections, the rate is shared by them
+    interval = connections / rate if rate > 0 else 0
+    clients = []
+    for i in range(connections):
+        reader, writer = await connect(address, socketPath)
+        clients.append(Client(reader, writer, pods[i::connections], outstanding, interval, timeScale))
+    start = time.perf_counter()
+    await asyncio.gather(*[client.run() for client in clients])
+    end = max([client.lastBind for client in clients if client.lastBind is not None], default=time.perf_counter())
+    for client in clients:
+        await client.writer.drain()
+        client.writer.close()
+    return clients, end - start, await getStats(address, socketPath)
+
+def printReport(clients: list[Client], seconds: float, stats: dict) -> None:
+    bound = sum(client.bound for client in clients)
+    bindMs = Metric()
+    for client in clients:
+        bindMs.merge(client.bindMs)
+    print("Load: %d connections, %d pods in %.2f sec" % (len(clients), sum(len(client.pods) for client in clients), seconds))
+    print("\tDecisions: %d binds, %d preemptions, %d evictions, %d rejected, %d errors" % (bound, sum(client.preempted for client in clients),
+        sum(client.evicted for client in clients), sum(client.rejected for client in clients), sum(client.errors for client in clients)))
+    print("\tDecisions per sec: %.2f" % (bound / seconds if seconds > 0 else 0))
+    print("\t%-18s %10s %10s %10s %10s %10s %10s" % ("", "mean", "std", "p50", "p95", "p99", "max"))
+    print("\t%-18s %s" % ("Client bind ms", bindMs.getStr()))
+    for name in ("bindMs", "cycleMs", "cyclePods"):
+        q = stats.get(name, {})
+        if len(q) > 0:
+            print("\t%-18s %10.2f %10.2f %10.2f %10.2f %10.2f %10.2f" % ("Service " + name, q["mean"], q["std"], q["p50"], q["p95"], q["p99"], q["max"]))
+    print("\tService: %d cycles, %d queued, %d running" % (stats["cycles"], stats["queued"], stats["running"]))
+
+def userCallHelper():
+    print('load_gen.py -h -l <host>:<port> -u <socket path> -c <connections> -n <pods> -o <outstanding> -r <rate> -t <time scale> -p <pods.txt> -k <kind> -s <seed>')
+    print('Submits pods to sched_server.py and reports the decisions per sec it sustains')
+    print('-l tcp address, default 127.0.0.1:7070, -u connects to a unix socket instead')
+    print('-c number of connections, default 4')
+    print('-n number of pods, default 10k, k and M suffixes work')
+    print('-o most pods a connection has submitted and not done, default 64')
+    print('-r submissions per sec over all connections, default 0 for as fast as possible')
+    print('-t seconds a pod runs per unit of work before it is done, default 0 for done as soon as it is bound')
+    print('-p submits the pods of a pod file, in arrival order, instead of random ones')
+    print('-k cpu, gpu and ram ranges of the random pods, mix (default), small or large, -s seed, default 0')
+
+def main(argv):
+    address = "127.0.0.1:7070"
+    socketPath = ''
+    connections = 4
+    n = 10000
+    outstanding = 64
+    rate = 0
+    timeScale = 0
+    pfile = ''
+    kind = "mix"
+    seed = 0
+
+    try:
+        opts, args = getopt.getopt(argv, "hl:u:c:n:o:r:t:p:k:s:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    try:
+        for opt, arg in opts:
+            if opt == "-h":
+                userCallHelper()
+                sys.exit(1)
+            elif opt == "-l":
+                address = arg
+            elif opt == "-u":
+                socketPath = arg
+            elif opt == "-c":
+                connections = int(arg)
+            elif opt == "-n":
+                n = parseCount(arg)
+            elif opt == "-o":
+                outstanding = int(arg)
+            elif opt == "-r":
+                rate = float(arg)
+            elif opt == "-t":
+                timeScale = float(arg)
+            elif opt == "-p":
+                pfile = arg
+            elif opt == "-k":
+                kind = arg
+            elif opt == "-s":
+                seed = int(arg)
+    except ValueError:
+        print('Invalid value for %s: %s' % (opt, arg))
+        sys.exit(1)
+
+    if connections < 1 or outstanding < 1 or n < 1:
+        print('There has to be at least one connection, one outstanding pod and one pod')
+        sys.exit(1)
+    if kind not in kinds:
+        print('Unknown kind %s, use mix, small or large' % (kind))
+        sys.exit(1)
+    pods = readPods(pfile, n) if pfile != "" else getPods(n, kind, 100, seed)
+
+    try:
+        clients, seconds, stats = asyncio.run(runLoad(address, socketPath, pods, connections, outstanding, rate, timeScale))
+    except OSError as e:
+        print('Cannot reach the service: %s' % (e))
+        sys.exit(1)
+    printReport(clients, seconds, stats)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
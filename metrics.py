@@ -0,0 +1,199 @@
+import math
+from sys import exit
+
+from pods import *
+
+class RunningStats:
+    # Count, mean, variance, min and max of a stream of values in O(1) memory (Welford)
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # Sum of squared distances from the mean
+        self.min = None
+        self.max = None
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if self.min == None or x < self.min:
+            self.min = x
+        if self.max == None or x > self.max:
+            self.max = x
+
+    def merge(self, other: "RunningStats") -> None:
+        # Same result as adding the values of other one by one, up to rounding (Chan et al.)
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = other.min if self.min == None else min(self.min, other.min)
+        self.max = other.max if self.max == None else max(self.max, other.max)
+
+    def getStd(self) -> float:
+        return math.sqrt(self.m2 / self.count) if self.count > 0 else 0.0
+
+class QuantileSketch:
+    # Quantiles of a stream of non negative values within relativeError of the true value (DDSketch)
+    # Value v goes to bucket ceil(log(v) / log(gamma)), zeros are counted on their own
+    # When there are more than maxBuckets buckets the two lowest are folded together, the memory is bounded
+    # and only the lowest quantiles lose accuracy
+    # Two sketches with the same relativeError merge by adding their bucket counts
+    def __init__(self, relativeError: float = 0.01, maxBuckets: int = 2048) -> None:
+        self.relativeError = relativeError
+        self.gamma = (1 + relativeError) / (1 - relativeError)
+        self.logGamma = math.log(self.gamma)
+        self.maxBuckets = maxBuckets
+        self.buckets = dict() # bucket -> count
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, v: float) -> None:
+        self.count += 1
+        if v <= 0:
+            self.zeros += 1
+            return
+        i = math.ceil(math.log(v) / self.logGamma)
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+        if len(self.buckets) > self.maxBuckets:
+            self.collapse()
+
+    def collapse(self) -> None:
+        while len(self.buckets) > self.maxBuckets:
+            lowest = min(self.buckets)
+            count = self.buckets.pop(lowest)
+            nextLowest = min(self.buckets)
+            self.buckets[nextLowest] += count
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.gamma != self.gamma:
+            print("Cannot merge quantile sketches with different errors")
+            exit(1)
+        for i, count in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.collapse()
+
+    def quantile(self, q: float) -> float:
+        # Value with about q * count values below it, None if the sketch is empty
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen > rank:
+                return 2 * self.gamma ** i / (self.gamma + 1) # Middle of the bucket in relative terms
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+class Metric:
+    # Moments and quantiles of one value
+    def __init__(self) -> None:
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch()
+
+    def add(self, x: float) -> None:
+        self.stats.add(x)
+        self.sketch.add(x)
+
+    def merge(self, other: "Metric") -> None:
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+
+    def quantile(self, q: float) -> float:
+        # Sketch quantile kept within the exact min and max
+        if self.stats.count == 0:
+            return None
+        return min(max(self.sketch.quantile(q), self.stats.min), self.stats.max)
+
+    def getStr(self) -> str:
+        # mean std p50 p95 p99 max
+        if self.stats.count == 0:
+            return "%10s %10s %10s %10s %10s %10s" % ("-", "-", "-", "-", "-", "-")
+        return "%10.2f %10.2f %10.2f %10.2f %10.2f %10.2f" % (self.stats.mean, self.stats.getStd(), self.quantile(0.5),
+            self.quantile(0.95), self.quantile(0.99), self.stats.max)
+
+class PodMetrics:
+    # Metrics of a group of pods
+    #   jct: (work + totalWaitTime) / work of a terminated pod, like Pod.calcJct
+    #   wait: totalWaitTime of a terminated pod, every time it spent queued, also after preemptions
+    #   delay: time from arrival to the first run
+    def __init__(self) -> None:
+        self.jct = Metric()
+        self.wait = Metric()
+        self.delay = Metric()
+
+    def merge(self, other: "PodMetrics") -> None:
+        self.jct.merge(other.jct)
+        self.wait.merge(other.wait)
+        self.delay.merge(other.delay)
+
+class OnlineMetrics:
+    # Pod metrics per user and per priority, updated by simulate() as pods start and terminate
+    # Nothing is kept per pod, so it works with pods that are dropped once they terminate (-l)
+    # The totals are the merge of the user groups
+    # With an interval, a progress line is printed every interval seconds of simulated time
+    def __init__(self, interval: int = 0) -> None:
+        self.users = dict() # user -> PodMetrics
+        self.prios = dict() # prio -> PodMetrics
+        self.interval = interval
+        self.nextReport = interval
+
+    def getGroups(self, pod: Pod) -> tuple:
+        user = self.users.get(pod.user)
+        if user is None:
+            user = self.users[pod.user] = PodMetrics()
+        prio = self.prios.get(pod.prio)
+        if prio is None:
+            prio = self.prios[pod.prio] = PodMetrics()
+        return user, prio
+
+    def podStarted(self, pod: Pod, currentTime: int) -> None:
+        # First time the pod runs
+        delay = currentTime - pod.at
+        for group in self.getGroups(pod):
+            group.delay.add(delay)
+
+    def podDone(self, pod: Pod, currentTime: int) -> None:
+        jct = (pod.work + pod.totalWaitTime) / pod.work
+        for group in self.getGroups(pod):
+            group.jct.add(jct)
+            group.wait.add(pod.totalWaitTime)
+        if self.interval > 0 and currentTime >= self.nextReport:
+            print(self.getProgressStr(currentTime))
+            self.nextReport = currentTime - currentTime % self.interval + self.interval
+
+    def getTotal(self) -> PodMetrics:
+        total = PodMetrics()
+        for group in self.users.values():
+            total.merge(group)
+        return total
+
+    def getProgressStr(self, currentTime: int) -> str:
+        total = self.getTotal()
+        return "Time [%d] Started: %d, Done: %d, JCT p50: %.2f p95: %.2f p99: %.2f, Wait p95: %.2f p99: %.2f" \
+            % (currentTime, total.delay.stats.count, total.jct.stats.count, total.jct.quantile(0.5),
+               total.jct.quantile(0.95), total.jct.quantile(0.99), total.wait.quantile(0.95), total.wait.quantile(0.99))
+
+    def getGroupStr(self, name: str, group: PodMetrics) -> str:
+        s = "\t%s: started %d, done %d\n" % (name, group.delay.stats.count, group.jct.stats.count)
+        s += "\t\t%-8s %s\n" % ("JCT", group.jct.getStr())
+        s += "\t\t%-8s %s\n" % ("Wait", group.wait.getStr())
+        s += "\t\t%-8s %s\n" % ("Delay", group.delay.getStr())
+        return s
+
+    def __repr__(self) -> str:
+        s = ["Online Metrics:\n", "\t\t%-8s %10s %10s %10s %10s %10s %10s\n" % ("", "mean", "std", "p50", "p95", "p99", "max")]
+        s.append(self.getGroupStr("All", self.getTotal()))
+        for prio in sorted(self.prios):
+            s.append(self.getGroupStr("Prio %d" % (prio), self.prios[prio]))
+        for user in sorted(self.users):
+            s.append(self.getGroupStr("User %s" % (user), self.users[user]))
+        return "".join(s)
@@ -1,45 +1,180 @@
-from random import randint
+try:
+    import numpy as np
+except ImportError: # Needed to generate nodes, checked in main
+    np = None
+
 from name_generator import iter_all_strings
-import sys
+import getopt, itertools, os, sys
+import workload_file
+from pod_gen import parseCount
+
+# Generates a node file from a fleet spec, the node shapes and the share of the fleet each one gets
+# Shapes get their exact share of the nodes (largest remainder) and are laid out in spec order, -x shuffles them
+# With zones, nodes fill racks of rackSize nodes in order and racks go to the zones round robin
+
+header = "nodeName cpu gpu ram"
+chunkSize = 1 << 16
+
+fleets = { # name -> [(shape, cpu, gpu, ram, share)]
+    # The old 100 node cluster, 30% small, 30% medium and 40% large nodes
+    "default": [("small", 4, 1, 8, 30), ("medium", 8, 2, 16, 30), ("large", 16, 4, 32, 40)],
+    # A dozen instance types, most of them without GPUs
+    "cloud": [
+        ("c.large", 2, 0, 4, 8), ("c.xlarge", 4, 0, 8, 12), ("c.2xlarge", 8, 0, 16, 12), ("c.4xlarge", 16, 0, 32, 6),
+        ("m.xlarge", 4, 0, 16, 12), ("m.2xlarge", 8, 0, 32, 12), ("m.4xlarge", 16, 0, 64, 8),
+        ("r.2xlarge", 8, 0, 64, 6), ("r.4xlarge", 16, 0, 128, 4),
+        ("g.xlarge", 4, 1, 16, 10), ("g.4xlarge", 16, 4, 64, 7), ("p.8xlarge", 32, 8, 244, 3),
+    ],
+}
+
+def readFleet(path: str) -> list[tuple]:
+    # Fleet spec file, a header line then one "shape cpu gpu ram share" line per node shape
+    shapes = []
+    with open(path, 'r') as f:
+        f.readline()
+        for line in f.readlines():
+            line = line.strip().split()
+            if len(line) == 0:
+                continue
+            if len(line) != 5:
+                print("Fleet spec %s needs shape cpu gpu ram share on every line, got %s" % (path, " ".join(line)))
+                sys.exit(1)
+            shapes.append((line[0], int(line[1]), int(line[2]), int(line[3]), float(line[4])))
+    return shapes
+
+def getCounts(shares, n: int):
+    # Nodes per shape, n in total, the shapes with the largest remainders get the nodes left after rounding down
+    shares = np.asarray(shares, dtype=np.float64)
+    exact = n * shares / shares.sum()
+    counts = np.floor(exact + 1e-9).astype(np.int64)
+    left = n - counts.sum()
+    if left > 0:
+        counts[np.argsort(counts - exact, kind="stable")[:left]] += 1
+    return counts
+
+def getNodes(shapes: list[tuple], n: int, seed: int, shuffle: bool) -> tuple:
+    # cpu, gpu and ram columns of n nodes
+    counts = getCounts([shape[4] for shape in shapes], n)
+    columns = [np.repeat(np.array([shape[i] for shape in shapes], dtype=np.int64), counts) for i in (1, 2, 3)]
+    if shuffle:
+        order = np.random.default_rng(seed).permutation(n)
+        columns = [column[order] for column in columns]
+    return columns
+
+def getTopology(n: int, zones: int, rackSize: int) -> tuple:
+    # Zone and rack names of n nodes, None without zones
+    if zones == 0:
+        return None, None
+    racks = (n + rackSize - 1) // rackSize
+    rackNames = ["rack" + name for name in itertools.islice(iter_all_strings(), racks)]
+    zoneNames = ["zone" + name for name in itertools.islice(iter_all_strings(), zones)]
+    rackIds = np.arange(n) // rackSize
+    return [zoneNames[i] for i in (rackIds % zones).tolist()], [rackNames[i] for i in rackIds.tolist()]
+
+def writeText(outFile: str, names: list[str], columns: list, zones: list[str], racks: list[str]) -> None:
+    # Same format as before, no newline after the last node
+    n = len(names)
+    labels = [] if zones is None else [zones, racks]
+    line = "%s %d %d %d" + " %s" * len(labels)
+    with open(outFile, 'w', buffering=1 << 20) as f:
+        f.write(header + (" zone rack" if zones is not None else "") + "\n")
+        for start in range(0, n, chunkSize):
+            end = min(start + chunkSize, n)
+            rows = zip(names[start:end], *[column[start:end].tolist() for column in columns], *[l[start:end] for l in labels])
+            f.write(("\n" if start > 0 else "") + "\n".join(line % row for row in rows))
+
+def writeBinary(outFile: str, names: list[str], columns: list, zones: list[str], racks: list[str]) -> None:
+    # Binary workload file of kind "nodes", in the column order of the text file
+    strings = dict() # string -> id, in first seen order
+    def getIds(labels: list[str]) -> bytes:
+        return np.array([strings.setdefault(label, len(strings)) for label in labels], dtype=np.int64).tobytes()
+
+    data = {"nameIds": getIds(names)}
+    for name, column in zip(workload_file.nodeColumns[1:], columns):
+        data[name] = column.tobytes()
+    if zones is not None:
+        data["zoneIds"] = getIds(zones)
+        data["rackIds"] = getIds(racks)
+    data["stringOffsets"], data["strings"] = workload_file.packStrings(strings)
+    workload_file.writeWorkload(outFile, "nodes", header + (" zone rack" if zones is not None else ""), len(names), data)
+
+def userCallHelper():
+    print('node_gen.py -h -b -x -n <nodes> -o <out> -s <seed> -f <fleet> -z <zones>:<rack size>')
+    print('Writes a node file, default the 100 nodes of the default fleet to nodes.txt')
+    print('-n number of nodes, k and M suffixes work')
+    print('-f fleet, default or cloud (a dozen shapes, mostly GPU-less), or a file of "shape cpu gpu ram share" lines')
+    print('-z adds zone and rack columns, racks of rack size nodes spread round robin over zones')
+    print('-x shuffles the node shapes with seed (default 0) instead of writing them in fleet order')
+    print('-b writes the binary workload format instead of text')
+
+def generate(outFile: str, n: int, shapes: list[tuple], seed: int, shuffle: bool, zones: int, rackSize: int, binary: bool) -> None:
+    names = ["Node" + name for name in itertools.islice(iter_all_strings(), n)]
+    columns = getNodes(shapes, n, seed, shuffle)
+    zoneNames, rackNames = getTopology(n, zones, rackSize)
+    (writeBinary if binary else writeText)(outFile, names, columns, zoneNames, rackNames)
 
 def main(argv: list[str]):
-    gen = iter_all_strings()
-    N = 100
-    outFile = argv[0] if len(argv) == 1 else "nodes.txt"
-
-    cpus = [4,8,16]
-    rams = [8,16,32]
-    gpus = [1,2,4]
-
-    with open(outFile, 'w') as f:
-        f.write("nodeName cpu gpu ram\n")
-
-        # Small Nodes
-        for i in range(0, int(N*0.3)):
-            if i != 0:
-                f.write("\n")
-            nodeName = "Node" + next(gen)
-            # cpu = randint(10,16)
-            # gpu = randint(10,32)
-            # ram = randint(32,128)
-            f.write("%s %d %d %d" % (nodeName, cpus[0], gpus[0], rams[0]))
-        f.write("\n")
-
-        # Medium Nodes
-        for i in range(0, int(N*0.3)):
-            if i != 0:
-                f.write("\n")
-            nodeName = "Node" + next(gen)
-            f.write("%s %d %d %d" % (nodeName, cpus[1], gpus[1], rams[1]))
-        f.write("\n")
-
-        # Large Nodes
-        for i in range(0, int(N*0.4)):
-            if i != 0:
-                f.write("\n")
-
-            nodeName = "Node" + next(gen)
-            f.write("%s %d %d %d" % (nodeName, cpus[2], gpus[2], rams[2]))
+    n = 100
+    outFile = "nodes.txt"
+    seed = 0
+    fleet = "default"
+    zones = 0
+    rackSize = 1
+    shuffle = False
+    binary = False
+
+    try:
+        opts, args = getopt.getopt(argv, "hbxn:o:s:f:z:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    if len(args) == 1: # node_gen.py <out> still works
+        outFile = args[0]
+    try:
+        for opt, arg in opts:
+            if opt == "-h":
+                userCallHelper()
+                sys.exit(1)
+            elif opt == "-n":
+                n = parseCount(arg)
+            elif opt == "-o":
+                outFile = arg
+            elif opt == "-s":
+                seed = int(arg)
+            elif opt == "-f":
+                fleet = arg
+            elif opt == "-z":
+                zones, rackSize = [int(v) for v in arg.split(":")]
+            elif opt == "-x":
+                shuffle = True
+            elif opt == "-b":
+                binary = True
+    except ValueError:
+        print('Invalid value for %s: %s' % (opt, arg))
+        sys.exit(1)
+
+    if np is None:
+        print('node_gen.py needs numpy, exiting')
+        sys.exit(1)
+    if fleet in fleets:
+        shapes = fleets[fleet]
+    elif os.path.exists(fleet):
+        shapes = readFleet(fleet)
+    else:
+        print('Unknown fleet %s, use %s or a fleet spec file' % (fleet, " or ".join(fleets)))
+        sys.exit(1)
+    if n < 1 or len(shapes) == 0 or zones < 0 or rackSize < 1:
+        print('There has to be at least one node and one shape, and racks need at least one node')
+        sys.exit(1)
+    for shape, cpu, gpu, ram, share in shapes:
+        if cpu < 1 or ram < 1 or gpu < 0 or share < 0:
+            print('Shape %s needs cpu and ram above 0, gpu and share of at least 0' % (shape))
+            sys.exit(1)
+    if sum(shape[4] for shape in shapes) <= 0:
+        print('At least one shape needs a share above 0')
+        sys.exit(1)
+
+    generate(outFile, n, shapes, seed, shuffle, zones, rackSize, binary)
 
 if __name__ == "__main__":
    main(sys.argv[1:])
@@ -0,0 +1,274 @@
+try:
+    import numpy as np
+except ImportError: # Optional, only needed when the node table is enabled
+    np = None
+
+from types import SimpleNamespace
+from pods import *
+
+
+class NodeTable:
+    # Structure of arrays copy of the node resources in a NodeList
+    # Node.addPod and Node.removePod keep it in sync through the NodeList
+    def __init__(self) -> None:
+        if np is None:
+            raise ImportError("numpy is required for the node table")
+
+        self.nodes = [] # Same order as the arrays, node.index is the row
+        self.size = 0
+        capacity = 16
+
+        # Basic info - DOES NOT CHANGE
+        self.cpu = np.zeros(capacity, dtype=np.int64)
+        self.gpu = np.zeros(capacity, dtype=np.int64)
+        self.ram = np.zeros(capacity, dtype=np.int64)
+
+        # Remaining resource
+        self.curCpu = np.zeros(capacity, dtype=np.int64)
+        self.curGpu = np.zeros(capacity, dtype=np.int64)
+        self.curRam = np.zeros(capacity, dtype=np.int64)
+
+        # Rank of node.name among all nodes, used as tie breaker like Node.__lt__
+        self.nameRank = np.zeros(capacity, dtype=np.int64)
+        self.nameRankDirty = False
+
+        # Indexes of updated nodes, lets a BatchMatcher refresh only the nodes that changed
+        self.dirty = None
+
+    def grow(self) -> None:
+        capacity = len(self.cpu) * 2
+        for attr in ("cpu", "gpu", "ram", "curCpu", "curGpu", "curRam", "nameRank"):
+            old = getattr(self, attr)
+            new = np.zeros(capacity, dtype=np.int64)
+            new[:self.size] = old[:self.size]
+            setattr(self, attr, new)
+
+    def addNode(self, node) -> None:
+        if self.size == len(self.cpu):
+            self.grow()
+        i = self.size
+        self.cpu[i] = node.cpu
+        self.gpu[i] = node.gpu
+        self.ram[i] = node.ram
+        self.curCpu[i] = node.curCpu
+        self.curGpu[i] = node.curGpu
+        self.curRam[i] = node.curRam
+        self.nodes.append(node)
+        self.size += 1
+        self.nameRankDirty = True
+
+    def updateNode(self, node) -> None:
+        i = node.index
+        self.curCpu[i] = node.curCpu
+        self.curGpu[i] = node.curGpu
+        self.curRam[i] = node.curRam
+        if self.dirty is not None:
+            self.dirty.append(i)
+
+    def getNameRank(self):
+        if self.nameRankDirty:
+            order = sorted(range(self.size), key=lambda i: self.nodes[i].name)
+            self.nameRank[order] = np.arange(self.size, dtype=np.int64)
+            self.nameRankDirty = False
+        return self.nameRank[:self.size]
+
+    def getFeasibleMask(self, pod, idx):
+        # pod can also hold columns of pod resources, giving a pods x nodes mask
+        return (self.curCpu[idx] >= pod.cpu) & (self.curGpu[idx] >= pod.gpu) & (self.curRam[idx] >= pod.ram)
+
+    def getFeasible(self, pod: Pod):
+        # Indexes of the nodes that have enough resource to run this pod
+        return np.flatnonzero(self.getFeasibleMask(pod, slice(0, self.size)))
+
+    def getDistance(self, pod: Pod, idx):
+        # Same formula as NodeList.getMatch
+        return np.sqrt((self.curCpu[idx] - pod.cpu)**2 + (self.curGpu[idx] - pod.cpu)**2 + (self.curRam[idx] - pod.ram)**2)
+
+    def getLRPScore(self, idx):
+        # Same formula as Node.getLRPScore, 0 for the gpu of GPU-less nodes
+        gpu = self.gpu[idx]
+        gpuScore = np.divide(self.curGpu[idx] * 10, gpu, out=np.zeros(np.shape(gpu)), where=gpu > 0)
+        return ((self.curCpu[idx] * 10 / self.cpu[idx]) + gpuScore + (self.curRam[idx] * 10 / self.ram[idx])) / 3
+
+    def getBRAScore(self, pod: Pod, idx):
+        # Same formula as NodeListByBRA.getBRAScore
+        return 10 - self.getDistance(pod, idx) * 10
+
+    def selectTopK(self, idx, keys: list, k: int) -> list:
+        # Returns the nodes with the k smallest keys, sorted by keys
+        # keys[0] is the primary sort key, ties go to the next key and finally to the larger node.name
+        # which is the order the heap based getMatch returns
+        if len(idx) == 0 or k <= 0:
+            return []
+
+        primary = keys[0]
+        if len(idx) > k:
+            # Only keep nodes that are not worse than the k-th node in the primary key, ties included
+            kth = primary[np.argpartition(primary, k - 1)[k - 1]]
+            keep = primary <= kth
+            idx = idx[keep]
+            keys = [key[keep] for key in keys]
+
+        nameRank = self.getNameRank()[idx]
+        order = np.lexsort([-nameRank] + keys[::-1])[:k]
+        return [self.nodes[i] for i in idx[order]]
+
+    def getKeys(self, policy: str, pod, idx) -> list:
+        # Sort keys of a node policy, smaller is better
+        if policy == "distance":
+            return [self.getDistance(pod, idx)]
+        elif policy == "lrp":
+            return [self.getLRPScore(idx)]
+        elif policy == "bra":
+            # Smaller lrp score first, then larger bra score
+            return [self.getLRPScore(idx), -self.getBRAScore(pod, idx)]
+        elif policy == "first":
+            # Node list order
+            return [idx]
+        raise ValueError("Unknown node policy %s" % (policy))
+
+    def getMatch(self, policy: str, pod: Pod, k: int) -> list:
+        idx = self.getFeasible(pod)
+        return self.selectTopK(idx, self.getKeys(policy, pod, idx), k)
+
+    def matchByDistance(self, pod: Pod, k: int) -> list:
+        return self.getMatch("distance", pod, k)
+
+    def matchByLRP(self, pod: Pod, k: int) -> list:
+        return self.getMatch("lrp", pod, k)
+
+    def matchByBRA(self, pod: Pod, k: int) -> list:
+        return self.getMatch("bra", pod, k)
+
+    def matchByFirstFit(self, pod: Pod, k: int) -> list:
+        return self.getMatch("first", pod, k)
+
+
+class BatchMatcher:
+    # Matches the candidate pods of one scheduling cycle against a NodeTable
+    # Feasibility of a block of pods x all nodes is computed in one vectorized pass, then the
+    # scores of the feasible pairs, giving the nodes each pod picks from: the feasible nodes up
+    # to its k-th best primary key
+    # After a pod takes a node only that node's column is recomputed and added to or dropped from
+    # the picks, a pod's picks are only recomputed when fewer than k are left
+    # Gives the same nodes as calling NodeList.getMatch one by one, pods can be matched in any order
+    # Blocks are built in the given order, a pod outside the current block that is not the next one is matched alone
+    # close has to be called at the end of the cycle, the table tracks node updates until then
+    MAX_CELLS = 1 << 22 # Bounds the memory of a block
+
+    def __init__(self, table: NodeTable, policy: str, pods: list, k: int, capacityTree=None) -> None:
+        self.table = table
+        self.policy = policy
+        self.k = k
+        self.capacityTree = capacityTree
+        if capacityTree is not None:
+            # Pods that no node can run are answered without touching the arrays, same check as canFit
+            maxCpu, maxGpu, maxRam = capacityTree.maxCpu[1], capacityTree.maxGpu[1], capacityTree.maxRam[1]
+            pods = [pod for pod in pods if pod.cpu <= maxCpu and pod.gpu <= maxGpu and pod.ram <= maxRam]
+        self.pods = pods
+        self.blockSize = max(1, self.MAX_CELLS // max(table.size, 1))
+
+        self.rows = {} # Maps pod -> row in the current block
+        self.blockEnd = 0 # Pods before this have had a block
+        self.podCols = None
+        self.threshold = None # Per pod, primary key of its k-th best feasible node, inf if less than k
+        self.picked = None # Block pods x nodes, feasible and primary key within the threshold
+        self.pickSets = None # Per pod, indexes of its picked nodes
+
+        table.dirty = []
+        self.dirtySeen = 0
+
+    def buildBlock(self) -> None:
+        table = self.table
+        pods = self.pods[self.blockEnd:self.blockEnd + self.blockSize]
+        self.rows = {pod: row for row, pod in enumerate(pods)}
+        self.blockEnd += len(pods)
+
+        # Pod resources as column vectors, broadcast against the node arrays
+        self.podCols = SimpleNamespace(
+            cpu=np.array([pod.cpu for pod in pods], dtype=np.int64)[:, None],
+            gpu=np.array([pod.gpu for pod in pods], dtype=np.int64)[:, None],
+            ram=np.array([pod.ram for pod in pods], dtype=np.int64)[:, None])
+        rows, cols = np.nonzero(table.getFeasibleMask(self.podCols, slice(0, table.size)))
+
+        # Primary key of the feasible pairs only
+        pairs = SimpleNamespace(cpu=self.podCols.cpu[rows, 0], gpu=self.podCols.gpu[rows, 0], ram=self.podCols.ram[rows, 0])
+        primary = table.getKeys(self.policy, pairs, cols)[0]
+
+        # k-th smallest primary key of every pod, pairs sorted by pod then key
+        order = np.lexsort((primary, rows))
+        sortedKeys = primary[order]
+        counts = np.bincount(rows, minlength=len(pods))
+        starts = np.cumsum(counts) - counts
+        kthPos = starts + np.minimum(counts, self.k) - 1
+        self.threshold = np.where(counts >= self.k, sortedKeys[np.maximum(kthPos, 0)] if len(order) > 0 else np.inf, np.inf)
+
+        keep = primary <= self.threshold[rows]
+        rows = rows[keep]
+        cols = cols[keep]
+        self.picked = np.zeros((len(pods), table.size), dtype=bool)
+        self.picked[rows, cols] = True
+        # Small per pod sets of the picked nodes, a row of picked spans the whole cluster
+        self.pickSets = [set() for _ in pods]
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            self.pickSets[row].add(col)
+
+        # Block is up to date
+        self.dirtySeen = len(table.dirty)
+
+    def repick(self, pod: Pod, row: int) -> None:
+        table = self.table
+        idx = table.getFeasible(pod)
+        primary = table.getKeys(self.policy, pod, idx)[0]
+        self.threshold[row] = np.partition(primary, self.k - 1)[self.k - 1] if len(idx) >= self.k else np.inf
+        idx = idx[primary <= self.threshold[row]]
+        self.picked[row] = False
+        self.picked[row, idx] = True
+        self.pickSets[row] = set(idx.tolist())
+
+    def refresh(self) -> None:
+        # Recompute the columns of nodes that changed since the block was computed
+        dirty = self.table.dirty
+        if self.dirtySeen == len(dirty):
+            return
+        idx = np.unique(np.array(dirty[self.dirtySeen:], dtype=np.int64))
+        self.dirtySeen = len(dirty)
+
+        feasible = self.table.getFeasibleMask(self.podCols, idx)
+        primary = np.broadcast_to(self.table.getKeys(self.policy, self.podCols, idx)[0], feasible.shape)
+        picked = feasible & (primary <= self.threshold[:, None])
+        rows, cols = np.nonzero(picked != self.picked[:, idx])
+        self.picked[:, idx] = picked
+        for row, col in zip(rows.tolist(), idx[cols].tolist()):
+            # Only the cells that flipped
+            if col in self.pickSets[row]:
+                self.pickSets[row].remove(col)
+            else:
+                self.pickSets[row].add(col)
+
+    def getMatch(self, pod: Pod) -> list:
+        canFit = self.capacityTree is None or self.capacityTree.canFit(pod)
+        if pod not in self.rows:
+            if self.blockEnd < len(self.pods) and self.pods[self.blockEnd] is pod:
+                self.buildBlock()
+            elif canFit:
+                # Not a candidate of this batch
+                return self.table.getMatch(self.policy, pod, self.k)
+
+        matchedNodes = []
+        if canFit and pod in self.rows:
+            self.refresh()
+            row = self.rows[pod]
+            # Picks still hold every node within the k-th best key unless some were dropped
+            # below k, a node whose key got better than the threshold is added by refresh
+            if len(self.pickSets[row]) < self.k and self.threshold[row] != np.inf:
+                self.repick(pod, row)
+            picks = self.pickSets[row]
+            if picks:
+                idx = np.fromiter(picks, dtype=np.int64, count=len(picks))
+                matchedNodes = self.table.selectTopK(idx, self.table.getKeys(self.policy, pod, idx), self.k)
+        return matchedNodes
+
+    def close(self) -> None:
+        # Scheduling cycle is over, stop tracking node updates
+        self.table.dirty = None
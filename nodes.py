@@ -1,27 +1,44 @@
 from sys import exit
-from math import sqrt
+from math import sqrt, inf
 from pods import *
 import heapq
+from bisect import bisect_right
 import global_
+from node_table import NodeTable, BatchMatcher
+from capacity_tree import CapacityTree
 
 
 class Node:
-    def __init__(self, name: str, cpu: int, gpu: int, ram: int) -> None:
+    def __init__(self, name: str, cpu: int, gpu: int, ram: int, zone: str = None, rack: str = None) -> None:
         # Basic info - DOES NOT CHANGE
         self.name = name
         self.cpu = cpu
         self.gpu = gpu
         self.ram = ram
 
+        # Topology, None when the node file has no zone or rack column
+        self.zone = zone
+        self.rack = rack
+
         # Remaining resource
         self.curCpu = cpu
         self.curGpu = gpu
         self.curRam = ram
 
         # Tracking system usage
-        self.currentTime = 0
+        self.index = -1 # Position in the node list
+        self.nodeList = None # Cluster this node belongs to, provides the simulation clock
         self.log = [] # Tuple of (start, end, pod.name, cpu, gpu, ram usage)
-        self.admission = {} # Map tracking pod.name starting time on this node 
+        self.admission = {} # Map tracking pod.id -> (starting time on this node, pod.name)
+        self.rank = -1 # Position of name among the names of the node list, see NodeList.updateRanks
+
+    __setstate__ = setState
+
+    @property
+    def currentTime(self) -> int:
+        if self.nodeList is None:
+            return 0
+        return self.nodeList.currentTime
     
     def addPod(self, pod: Pod) -> None:
         if global_.zFlag:
@@ -40,7 +57,11 @@ class Node:
             print("Node %s RAM went negative" % (self.name))
             exit(1)
 
-        self.admission[pod.name] = self.currentTime
+        self.admission[pod.id] = (self.currentTime, pod.name)
+        if self.nodeList is not None:
+            self.nodeList.podAdded(self, pod)
+        if global_.traceSink is not None:
+            global_.traceSink.record(self.currentTime, "node", "ADD", pod, self, -1, self.curCpu, self.curGpu, self.curRam)
         if global_.zFlag:
             print("\tAfter CPU: %d, GPU: %d, RAM: %d" \
                 % (self.curCpu, self.curGpu, self.curRam))
@@ -50,7 +71,8 @@ class Node:
             print("Time [%d] Removing Pod [%s] from Node [%s]\n\tBefore CPU: %d, GPU: %d, RAM: %d" \
                 % (self.currentTime, pod.name, self.name, self.curCpu, self.curGpu, self.curRam))
         
-        if pod.name not in self.admission:
+        admitted = self.admission.pop(pod.id, None)
+        if admitted is None:
             print("Removing non-existant pod [%s]" % (pod.name))
             exit(1)
 
@@ -59,10 +81,14 @@ class Node:
         self.curRam += pod.ram
 
         # (startTime, endTime, cpu, gpu, ram usage)
-        usage = (self.admission[pod.name], self.currentTime, pod.name, pod.cpu, pod.gpu, pod.ram)
-        self.log.append(usage)
+        usage = (admitted[0], self.currentTime, pod.name, pod.cpu, pod.gpu, pod.ram)
+        if self.nodeList is None or self.nodeList.keepLogs:
+            self.log.append(usage)
         
-        del self.admission[pod.name]
+        if self.nodeList is not None:
+            self.nodeList.podRemoved(self, pod)
+        if global_.traceSink is not None:
+            global_.traceSink.record(self.currentTime, "node", "REMOVE", pod, self, -1, self.curCpu, self.curGpu, self.curRam)
 
         if global_.zFlag:
             print("\tAfter CPU: %d, GPU: %d, RAM: %d" \
@@ -75,23 +101,49 @@ class Node:
         return "Name: %s, CPU: %d, GPU: %d, RAM: %d" \
             % (self.name, self.cpu, self.gpu, self.ram)
 
+    def getLRPScore(self) -> float:
+        # Free share of each resource out of 10, averaged
+        # A resource the node does not have scores 0, like in kube-scheduler, so GPU-less nodes work
+        gpuScore = self.curGpu * 10 / self.gpu if self.gpu > 0 else 0
+        return ((self.curCpu * 10 / self.cpu) + gpuScore + (self.curRam * 10 / self.ram)) / 3
+
     def getCurResourceStr(self) -> str:
         return "Name: %s, CPU: %d, GPU: %d, RAM: %d" \
             % (self.name, self.curCpu, self.curGpu, self.curRam)
     
     def getPodListStr(self) -> str:
-        s = "Node[%s] Pod List: " % (self.name)
-        for pod in self.admission.values():
-            s += pod.name + " "
-        return s
+        return "Node[%s] Pod List: " % (self.name) + "".join(name + " " for start, name in self.admission.values())
     
     def getUsageLogStr(self) -> str:
-        s = "Node[%s] Usage Log:" % (self.name)
-        for i in self.log:
-            s += " " + str(i)
-        return s
+        return "Node[%s] Usage Log:" % (self.name) + "".join(" " + str(i) for i in self.log)
+
+def addShape(shapes: list[tuple], shape: tuple) -> list[tuple]:
+    # Node capacities (cpu, gpu, ram) that no other one has at least as much of in every resource, with shape added
+    if any(cpu >= shape[0] and gpu >= shape[1] and ram >= shape[2] for cpu, gpu, ram in shapes):
+        return shapes
+    return [s for s in shapes if not (s[0] <= shape[0] and s[1] <= shape[1] and s[2] <= shape[2])] + [shape]
+
+def fitsShape(shapes: list[tuple], cpu: int, gpu: int, ram: int) -> bool:
+    # True if an empty node of one of the shapes can run that much resource
+    return any(c >= cpu and g >= gpu and r >= ram for c, g, r in shapes)
+
+class PodMatcher:
+    # Matches the candidate pods of one scheduling cycle one at a time with NodeList.getMatch
+    def __init__(self, nodeList, k: int) -> None:
+        self.nodeList = nodeList
+        self.k = k
+
+    def getMatch(self, pod: Pod) -> list[Node]:
+        return self.nodeList.getMatch(pod, self.k)
+
+    def close(self) -> None:
+        pass
 
 class NodeList:
+    tablePolicy = "distance" # Node policy used by the node table
+    batchMinPods = 8 # Cycles with at least this many pods are matched as a batch
+    batchNodesPerPod = 8 # ... and at most this many nodes per pod, short queues on big clusters are faster one by one
+
     def __init__(self) -> None:
         # Cluster node list
         self.nodes = []
@@ -101,6 +153,14 @@ class NodeList:
         self.totalGpu = 0
         self.totalRam = 0
 
+        # Current usage, kept up to date by Node.addPod and Node.removePod
+        self.cpuUsed = 0
+        self.gpuUsed = 0
+        self.ramUsed = 0
+
+        # Simulation clock shared by all nodes
+        self.currentTime = 0
+
         # Per second
         self.cpuPerSec = -1.00
         self.ramPerSec = -1.00
@@ -109,25 +169,145 @@ class NodeList:
         # Log 
         # Maps (currentTime) -> (cpu usage, gpu usage, ram usage)
         self.log = {} 
+        self.keepLogs = True # False only keeps the sums calcAvgUtil needs, see disableLogs
+        self.logStart = None # First and last logged time when keepLogs is False
+        self.logEnd = None
+        self.logSums = [0, 0, 0] # Usage summed over the logged times before logEnd
+        self.logLast = None # Usage at logEnd
+        self.logSamples = None # When a list, (time, cpu, gpu, ram) of every logged time is appended to it, see parallel_sim.py
+
+        # Node ranks are out of date after addNode until updateRanks
+        self.ranksDirty = False
+
+        # Capacity given back to the cluster, by a pod leaving a node or a new node, see mayFitSince
+        self.releaseEpoch = 0 # Number of releases so far
+        self.releaseMax = ([], [], []) # Per resource (epoch, free resource of the node after that release), free decreasing
+        self.sinceMax = dict() # Epoch -> most free per resource since then, only valid until the next release
+
+        # Node capacities that no other node has at least as much of in every resource, see canEverFit
+        self.shapes = []
+
+        # Max free resource per subtree of nodes, prunes nodes that cannot run a pod
+        self.capacityTree = CapacityTree()
+
+        # Optional array backed copy of the nodes for vectorized matching
+        self.table = None
+
+    def enableTable(self) -> None:
+        self.table = NodeTable()
+        for node in self.nodes:
+            self.table.addNode(node)
 
     def addNode(self, node: Node) -> None:
         self.totalCpu += node.cpu
         self.totalGpu += node.gpu
         self.totalRam += node.ram
+        self.cpuUsed += (node.cpu - node.curCpu)
+        self.gpuUsed += (node.gpu - node.curGpu)
+        self.ramUsed += (node.ram - node.curRam)
+        node.nodeList = self
+        node.index = len(self.nodes) # Also the node id
         self.nodes.append(node)
+        self.ranksDirty = True
+        self.shapes = addShape(self.shapes, (node.cpu, node.gpu, node.ram))
+        self.capacityTree.addNode(node)
+        if self.table is not None:
+            self.table.addNode(node)
+        self.addRelease(node)
+
+    def addRelease(self, node: Node) -> None:
+        # Per resource, a release is only kept until a later one leaves a node with at least as much free
+        # The most free since any epoch is then the first release kept after it
+        self.releaseEpoch += 1
+        self.sinceMax = dict()
+        for releases, free in zip(self.releaseMax, (node.curCpu, node.curGpu, node.curRam)):
+            while len(releases) > 0 and releases[-1][1] <= free:
+                releases.pop()
+            releases.append((self.releaseEpoch, free))
+
+    def mayFitSince(self, pod: Pod, epoch: int) -> bool:
+        # False if pod did not fit any node at release epoch and still cannot
+        # Nodes that had no release since then only lost free resource, the others have at most what they had
+        # right after their last release, so one resource short on all of those means no node can run pod
+        if epoch == self.releaseEpoch:
+            return False
+        free = self.sinceMax.get(epoch)
+        if free is None:
+            # Pods that failed in the same cycle share the epoch, look it up once per release
+            free = []
+            for releases in self.releaseMax:
+                i = bisect_right(releases, (epoch, inf))
+                free.append(releases[i][1] if i < len(releases) else -1)
+            self.sinceMax[epoch] = free
+        return pod.cpu <= free[0] and pod.gpu <= free[1] and pod.ram <= free[2]
+
+    def canEverFit(self, pod: Pod) -> bool:
+        # False if pod needs more than some resource of every node, even with nothing running
+        return fitsShape(self.shapes, pod.cpu, pod.gpu, pod.ram)
+
+    def updateRanks(self) -> None:
+        # Ranks the nodes by name, the getMatch heaps break ties on the int rank instead of comparing names
+        for rank, node in enumerate(sorted(self.nodes, key=lambda node: node.name)):
+            node.rank = rank
+        self.ranksDirty = False
+
+    def podAdded(self, node: Node, pod: Pod) -> None:
+        # Called by node after it took the resource of the pod
+        self.cpuUsed += pod.cpu
+        self.gpuUsed += pod.gpu
+        self.ramUsed += pod.ram
+        self.capacityTree.updateNode(node)
+        if self.table is not None:
+            self.table.updateNode(node)
+
+    def podRemoved(self, node: Node, pod: Pod) -> None:
+        # Called by node after it returned the resource of the pod
+        self.cpuUsed -= pod.cpu
+        self.gpuUsed -= pod.gpu
+        self.ramUsed -= pod.ram
+        self.capacityTree.updateNode(node)
+        if self.table is not None:
+            self.table.updateNode(node)
+        self.addRelease(node)
     
+    def disableLogs(self) -> None:
+        # Stops keeping the cluster log and the node usage logs, they grow with the length of the simulation
+        # calcAvgUtil still works, getClusterLog and getUsageLogs come out empty
+        self.keepLogs = False
+
     def updateClusterInfo(self, currentTime: int) -> None:
-        cpuUsed = 0
-        gpuUsed = 0
-        ramUsed = 0
-        for i in self.nodes:
-            i.currentTime = currentTime
-            cpuUsed += (i.cpu - i.curCpu)
-            gpuUsed += (i.gpu - i.curGpu)
-            ramUsed += (i.ram - i.curRam)
-        self.log[currentTime] = (cpuUsed, gpuUsed, ramUsed)
+        # Sets current time and logs cluster usage, does not depend on the number of nodes
+        self.currentTime = currentTime
+        if self.keepLogs:
+            self.log[currentTime] = (self.cpuUsed, self.gpuUsed, self.ramUsed)
+            return
+
+        # Time only moves forward, the last usage of a time replaces the earlier ones like in the log
+        if self.logStart == None:
+            self.logStart = currentTime
+        elif currentTime != self.logEnd:
+            self.logSums[0] += self.logLast[0]
+            self.logSums[1] += self.logLast[1]
+            self.logSums[2] += self.logLast[2]
+        self.logEnd = currentTime
+        self.logLast = (self.cpuUsed, self.gpuUsed, self.ramUsed)
+        if self.logSamples is not None:
+            sample = (currentTime, self.cpuUsed, self.gpuUsed, self.ramUsed)
+            if len(self.logSamples) > 0 and self.logSamples[-1][0] == currentTime:
+                self.logSamples[-1] = sample
+            else:
+                self.logSamples.append(sample)
 
     def calcAvgUtil(self):
+        if not self.keepLogs:
+            cpuUsed = self.logSums[0] + self.logLast[0]
+            gpuUsed = self.logSums[1] + self.logLast[1]
+            ramUsed = self.logSums[2] + self.logLast[2]
+            self.cpuPerSec = cpuUsed / (self.logEnd - self.logStart)
+            self.gpuPerSec = gpuUsed / (self.logEnd - self.logStart)
+            self.ramPerSec = ramUsed / (self.logEnd - self.logStart)
+            return
+
         startTime = min(self.log.keys())
         endTime = max(self.log.keys())
         cpuUsed = 0
@@ -145,50 +325,60 @@ class NodeList:
     def getMatch(self, pod: Pod, k: int) -> list[Node]:
         # Return a list of nodes that can run the given pod
         # Can use derived class and a custom policy
-        # Default policy, return the first n nodes that has enough resource to run this pod
-        
         # Finds at most top k closest (in terms of resource) node to the pod
+        if not self.capacityTree.canFit(pod):
+            return []
+        if self.table is not None:
+            return self.table.matchByDistance(pod, k)
+        if self.ranksDirty:
+            self.updateRanks()
+
         potentialMatches = [] # Max heap
 
-        for i in self.nodes:
-            if i.curCpu >= pod.cpu and i.curGpu >= pod.gpu and i.curRam >= pod.ram:
-                distance = sqrt((i.curCpu-pod.cpu)**2 + (i.curGpu-pod.cpu)**2 + (i.curRam-pod.ram)**2)
-                heapq.heappush(potentialMatches, (-distance, i))
-                if len(potentialMatches) > k:
-                    # Remove the largest distance node
-                    heapq.heappop(potentialMatches)
+        for i in self.capacityTree.getFeasible(pod):
+            distance = sqrt((i.curCpu-pod.cpu)**2 + (i.curGpu-pod.cpu)**2 + (i.curRam-pod.ram)**2)
+            heapq.heappush(potentialMatches, (-distance, i.rank, i))
+            if len(potentialMatches) > k:
+                # Remove the largest distance node
+                heapq.heappop(potentialMatches)
         
         matchedNodes = []
         while len(potentialMatches) > 0:
-            matchedNodes.append(heapq.heappop(potentialMatches)[1])
+            matchedNodes.append(heapq.heappop(potentialMatches)[2])
         
         # Reverse list so that it is sorted from smallest distance to largest distance
         return matchedNodes[::-1]
 
+    def getBatchMatcher(self, pods: list[Pod], k: int):
+        # Returns an object whose getMatch(pod) gives the same nodes as getMatch(pod, k)
+        # Matching the pods in the given order is fastest, taking nodes between calls is fine, close ends the cycle
+        # With a node table and a long enough queue the whole batch is checked in one vectorized pass
+        if self.table is not None and len(pods) >= self.batchMinPods and len(pods) * self.batchNodesPerPod >= len(self.nodes):
+            return BatchMatcher(self.table, self.tablePolicy, pods, k, self.capacityTree)
+        return PodMatcher(self, k)
+
+    def getFirstFit(self, pod: Pod) -> Node:
+        # First node in list order that has enough resource to run this pod, None if there is none
+        return self.capacityTree.getFirstFit(pod)
+
     def __repr__(self) -> str:
-        s = "Node List:\n"
-        for i in self.nodes:
-            s += "\t" + i.__repr__() + "\n"
+        s = "Node List:\n" + "".join("\t" + i.__repr__() + "\n" for i in self.nodes)
         s += "\tTotal CPU: %d\n" % (self.totalCpu)
         s += "\tTotal GPU: %d\n" % (self.totalGpu)
         s += "\tTotal RAM: %d\n" % (self.totalRam)
         return s
 
     def getUsageLogs(self) -> str:
-        s = "Node Usage Log:\n"
-        for i in self.nodes:
-            s += "\t" + i.getUsageLogStr() + "\n"
-        return s
+        return "Node Usage Log:\n" + "".join("\t" + i.getUsageLogStr() + "\n" for i in self.nodes)
     
     def getClusterLog(self) -> str:
-        s = "Cluster Log:\n"
-        s += "time,cpuUsed,gpuUsed,ramUsed,cpuPercent,gpuPercent,ramPercent\n"
+        s = ["Cluster Log:\n", "time,cpuUsed,gpuUsed,ramUsed,cpuPercent,gpuPercent,ramPercent\n"]
         for time in sorted(self.log.keys()):
             cpu, gpu, ram = self.log[time]
-            s += "%d,%d,%d,%d,%.2f,%.2f,%.2f\n" \
-            % (time, cpu, gpu, ram, cpu/self.totalCpu, gpu/self.totalGpu, ram/self.totalRam)
+            s.append("%d,%d,%d,%d,%.2f,%.2f,%.2f\n" \
+            % (time, cpu, gpu, ram, cpu/self.totalCpu, gpu/self.totalGpu, ram/self.totalRam))
         
-        return s
+        return "".join(s)
 
     def getAvgUtil(self) -> str:
         s = "Average Util:\n"
@@ -198,37 +388,41 @@ class NodeList:
         return s
 
 class NodeListByLRP(NodeList): #LeastRequestedPriority
+    tablePolicy = "lrp"
+
     def __init__(self) -> None:
         super().__init__()
 
-    def addNode(self, node: Node) -> None:
-        self.nodes.append(node)
-
     def getMatch(self, pod: Pod, k: int) -> list[Node]:
         #favors nodes with fewer requested resources
+        if not self.capacityTree.canFit(pod):
+            return []
+        if self.table is not None:
+            return self.table.matchByLRP(pod, k)
+        if self.ranksDirty:
+            self.updateRanks()
+
         potentialMatches = [] # Max heap
 
-        for i in self.nodes:
-            if i.curCpu >= pod.cpu and i.curGpu >= pod.gpu and i.curRam >= pod.ram:
-                score = ((i.curCpu * 10 / i.cpu) + (i.curGpu * 10 / i.gpu) + (i.curRam * 10 / i.ram)) / 3
-                heapq.heappush(potentialMatches, (-score, i))
-                if len(potentialMatches) > k:
-                    # Remove the largest usage rate node
-                    heapq.heappop(potentialMatches)
+        for i in self.capacityTree.getFeasible(pod):
+            score = i.getLRPScore()
+            heapq.heappush(potentialMatches, (-score, i.rank, i))
+            if len(potentialMatches) > k:
+                # Remove the largest usage rate node
+                heapq.heappop(potentialMatches)
         
         matchedNodes = []
         while len(potentialMatches) > 0:
-            matchedNodes.append(heapq.heappop(potentialMatches)[1])
+            matchedNodes.append(heapq.heappop(potentialMatches)[2])
 
         return matchedNodes[::-1]
 
 
 class NodeListByBRA(NodeList): #BalancedResourceAllocation, always used with LeastRequestedPriority
+    tablePolicy = "bra"
+
     def __init__(self) -> None:
         super().__init__()
-
-    def addNode(self, node: Node) -> None:
-        self.nodes.append(node)
     
     def getBRAScore(self, pod:Pod, node:Node) -> float:
         # cpuFraction = pod.cpu / node.curCpu
@@ -242,20 +436,44 @@ class NodeListByBRA(NodeList): #BalancedResourceAllocation, always used with Lea
 
     def getMatch(self, pod: Pod, k: int) -> list[Node]:
         #favors nodes with balanced resource usage rate
+        if not self.capacityTree.canFit(pod):
+            return []
+        if self.table is not None:
+            return self.table.matchByBRA(pod, k)
+        if self.ranksDirty:
+            self.updateRanks()
+
         potentialMatches = []
         
         #First priority : favors nodes with fewer requested resources
-        for i in self.nodes:
-            if i.curCpu >= pod.cpu and i.curGpu >= pod.gpu and i.curRam >= pod.ram:
-                lrpscore = ((i.curCpu * 10 / i.cpu) + (i.curGpu * 10 / i.gpu) + (i.curRam * 10 / i.ram)) / 3
-                brascore = self.getBRAScore(pod, i) #Second priority : favors node with higher bra score
-                heapq.heappush(potentialMatches, (-lrpscore, brascore, i))
-                if len(potentialMatches) > k:
-                    # Remove the largest usage rate node
-                    heapq.heappop(potentialMatches)
+        for i in self.capacityTree.getFeasible(pod):
+            lrpscore = i.getLRPScore()
+            brascore = self.getBRAScore(pod, i) #Second priority : favors node with higher bra score
+            heapq.heappush(potentialMatches, (-lrpscore, brascore, i.rank, i))
+            if len(potentialMatches) > k:
+                # Remove the largest usage rate node
+                heapq.heappop(potentialMatches)
 
         matchedNodes = []
         while len(potentialMatches) > 0:
-            matchedNodes.append(heapq.heappop(potentialMatches)[2])
+            matchedNodes.append(heapq.heappop(potentialMatches)[3])
+
+        return matchedNodes[::-1]
 
-        return matchedNodes[::-1]
\ No newline at end of file
+
+class NodeListByFF(NodeList): #FirstFit
+    tablePolicy = "first"
+
+    def __init__(self) -> None:
+        super().__init__()
+
+    def getMatch(self, pod: Pod, k: int) -> list[Node]:
+        # First k nodes in list order that have enough resource to run this pod
+        if not self.capacityTree.canFit(pod):
+            return []
+        if self.table is not None:
+            return self.table.matchByFirstFit(pod, k)
+        if k == 1:
+            node = self.getFirstFit(pod) # O(log N) instead of visiting every feasible node
+            return [] if node is None else [node]
+        return self.capacityTree.getFeasible(pod)[:k]
@@ -0,0 +1,400 @@
+from collections import deque
+import getopt, importlib.util, multiprocessing, os, random, sys, zlib
+
+import simulator
+import workload_file
+from pods import *
+from nodes import *
+from schedulers import *
+from arrival_source import ArrivalSource, createPod, getArrivalTime
+from simulator import EventQueue
+
+# Simulates a large cluster as partitions of its nodes, each one a simulation of its own in a worker process
+# A dispatcher reads the pod file in arrival order and sends every pod to one partition, partitions share no
+# nodes and no pods so they never wait for each other, only for the dispatcher
+# Time goes forward in windows: the pods arriving in a window are routed with what the partitions reported at
+# its start, then every partition simulates up to the end of the window in parallel and reports again
+# Routing only depends on those reports and partition i seeds its random module with seed + i, so a seed gives
+# the same results however the processes are scheduled, and one partition gives the results of simulator.py
+
+groupings = ("hash", "zone")
+
+class NodeRows:
+    # Collects the nodes of a node file for loadNodeFile, before they are split into partitions
+    def __init__(self) -> None:
+        self.nodes = []
+
+    def addNode(self, node: Node) -> None:
+        self.nodes.append(node)
+
+class ArrivalLines(ArrivalSource):
+    # Pod lines in arrival order, the pods are made by the partition a line is sent to
+    def __init__(self, pfile: str) -> None:
+        super().__init__(pfile, None)
+
+    def advance(self) -> None:
+        line = next(self.lines, None)
+        if line == None:
+            self.nextPod = None
+            self.close()
+        else:
+            self.linesRead += 1
+            self.nextPod = line
+            self.nextTime = getArrivalTime(line)
+
+    def getNextTime(self) -> int:
+        if self.nextPod == None:
+            return None
+        return self.nextTime
+
+class WindowArrivals:
+    # Pod lines a partition got from the dispatcher, made into pods as its simulation reaches them
+    # Same interface as ArrivalSource, so simulate streams them in and drops the pods that terminated
+    def __init__(self, podList: StreamedPodList) -> None:
+        self.podList = podList
+        self.lines = deque()
+
+    def add(self, lines: list[str]) -> None:
+        self.lines.extend(lines)
+
+    def hasNext(self) -> bool:
+        return len(self.lines) > 0
+
+    def getNextTime(self) -> int:
+        if len(self.lines) == 0:
+            return None
+        return getArrivalTime(self.lines[0])
+
+    def popPod(self) -> Pod:
+        return createPod(self.podList, self.lines.popleft())
+
+    def podDone(self, pod: Pod) -> None:
+        self.podList.podDone(pod)
+
+def getPartitions(nodes: list[Node], partitions: int, groupBy: str) -> list[list[Node]]:
+    # Nodes of each partition, in node file order
+    # hash spreads the nodes by a hash of their name, zone keeps every zone in one partition, the biggest
+    # zones go first, each one to the partition with the fewest nodes so far
+    if groupBy == "hash":
+        partOf = lambda node: zlib.crc32(node.name.encode()) % partitions
+    else:
+        zones = dict() # zone -> number of nodes, in first seen order
+        for node in nodes:
+            if node.zone == None:
+                print('Partitions by zone need a node file with zone and rack columns, see node_gen.py -z')
+                sys.exit(1)
+            zones[node.zone] = zones.get(node.zone, 0) + 1
+        sizes = [0] * partitions
+        zonePart = dict()
+        for zone in sorted(zones, key=lambda zone: -zones[zone]):
+            smallest = sizes.index(min(sizes))
+            zonePart[zone] = smallest
+            sizes[smallest] += zones[zone]
+        partOf = lambda node: zonePart[node.zone]
+
+    parts = [[] for _ in range(partitions)]
+    for node in nodes:
+        parts[partOf(node)].append(node)
+    for i, part in enumerate(parts):
+        if len(part) == 0:
+            print('Partition %d got no nodes, use fewer partitions' % (i))
+            sys.exit(1)
+    return parts
+
+class Dispatcher:
+    # Picks the partition of each arriving pod
+    # room is the free resource of a partition minus what its queued pods need, as of its last report,
+    # minus the pods sent to it since
+    def __init__(self, parts: list[list[Node]]) -> None:
+        self.shapes = []
+        self.capacity = []
+        for part in parts:
+            shapes = []
+            for node in part:
+                shapes = addShape(shapes, (node.cpu, node.gpu, node.ram))
+            self.shapes.append(shapes)
+            self.capacity.append((sum(node.cpu for node in part), sum(node.gpu for node in part), sum(node.ram for node in part)))
+        self.room = [list(capacity) for capacity in self.capacity]
+
+    def report(self, index: int, room: tuple) -> None:
+        self.room[index] = list(room)
+
+    def route(self, cpu: int, gpu: int, ram: int) -> int:
+        # Among the partitions with a node big enough, the one whose tightest resource keeps the largest share
+        # of its capacity after taking the pod, the first one on ties
+        # A pod no partition can run goes to partition 0, which rejects it like simulator.py would
+        best = 0
+        bestScore = None
+        need = (cpu, gpu, ram)
+        for i, shapes in enumerate(self.shapes):
+            if not fitsShape(shapes, cpu, gpu, ram):
+                continue
+            room = self.room[i]
+            capacity = self.capacity[i]
+            score = min(((room[r] - need[r]) / capacity[r] for r in range(3) if need[r] > 0), default=0.0)
+            if bestScore == None or score > bestScore:
+                best = i
+                bestScore = score
+        room = self.room[best]
+        for r in range(3):
+            room[r] -= need[r]
+        return best
+
+class ClusterUsage:
+    # Usage log of the whole cluster, the sums NodeList.calcAvgUtil divides by the time from the first to the last
+    # logged time
+    # Partitions send the usage of every time they logged, the cluster logs the times any partition logged, with
+    # the usage of each partition as of its last logged time, like one node list with all the nodes would
+    def __init__(self, partitions: int) -> None:
+        self.usage = [(0, 0, 0)] * partitions # Usage of each partition as of its last logged time
+        self.total = [0, 0, 0] # Sum of usage
+        self.sums = [0, 0, 0] # total summed over the logged times
+        self.start = None
+        self.end = None
+
+    def add(self, samples: dict) -> None:
+        # samples is partition -> its (time, cpu, gpu, ram) in time order, all after the times added before
+        merged = sorted((sample[0], i, sample[1:]) for i, part in samples.items() for sample in part)
+        for k, (time, i, usage) in enumerate(merged):
+            old = self.usage[i]
+            for r in range(3):
+                self.total[r] += usage[r] - old[r]
+            self.usage[i] = usage
+            if k + 1 == len(merged) or merged[k + 1][0] != time: # Last partition logging this time
+                for r in range(3):
+                    self.sums[r] += self.total[r]
+                if self.start == None:
+                    self.start = time
+                self.end = time
+
+    def calcAvgUtil(self, myNodeList: NodeList) -> None:
+        # Sets the per second usage of myNodeList, 0 when less than two times were logged
+        myNodeList.cpuPerSec = myNodeList.gpuPerSec = myNodeList.ramPerSec = 0
+        if self.start != None and self.end != self.start:
+            myNodeList.cpuPerSec, myNodeList.gpuPerSec, myNodeList.ramPerSec = [s / (self.end - self.start) for s in self.sums]
+
+def takeSamples(myNodeList: NodeList) -> list[tuple]:
+    # Usage samples logged since the last call
+    samples = myNodeList.logSamples
+    myNodeList.logSamples = []
+    return samples
+
+def getReport(myEventQueue: EventQueue, myScheduler: Scheduler, myNodeList: NodeList) -> tuple:
+    # Time of the next event, None if there is none, the room of the partition, see Dispatcher, and its usage samples
+    room = [myNodeList.totalCpu - myNodeList.cpuUsed, myNodeList.totalGpu - myNodeList.gpuUsed, myNodeList.totalRam - myNodeList.ramUsed]
+    for pod in myScheduler.getQueuedPods():
+        room[0] -= pod.cpu
+        room[1] -= pod.gpu
+        room[2] -= pod.ram
+    return myEventQueue.getNextEvtTime(), tuple(room), takeSamples(myNodeList)
+
+def getResult(myScheduler: Scheduler, myNodeList: NodeList, myPodList: StreamedPodList) -> tuple:
+    # What the summary needs from a partition, and the usage samples of its last run
+    return (str(myScheduler), myScheduler.getPodQueueStr(), [pod.name for pod in myScheduler.rejectedPods],
+        myPodList.getTotals(), takeSamples(myNodeList))
+
+def runPartition(conn, nodes: list[Node], sched: str, nsched: str, useTable: bool, seed: int) -> None:
+    # Worker process of one partition
+    # Gets (pod lines, stop time) once per window and sends a report back, a stop time of None runs to the end
+    # and sends the result instead
+    random.seed(seed)
+    simulator.resetEventID()
+    myScheduler = simulator.parseSchedulerInfo(sched)
+    myNodeList = simulator.parseNodeListInfo(nsched)
+    myPodList = StreamedPodList()
+    myArrivals = WindowArrivals(myPodList)
+    myEventQueue = EventQueue()
+    # Pods are streamed in, the logs would grow with the trace, the usage samples are sent every window instead
+    myNodeList.disableLogs()
+    myNodeList.logSamples = []
+    if useTable:
+        myNodeList.enableTable()
+    for node in nodes:
+        myNodeList.addNode(node)
+    if myScheduler.name == "DRF":
+        myScheduler.calculate_tot_resources(myNodeList)
+
+    started = False
+    while True:
+        lines, stopTime = conn.recv()
+        myArrivals.add(lines)
+        if len(myEventQueue) > 0 or myArrivals.hasNext():
+            simulator.simulate(myEventQueue, myScheduler, myNodeList, myArrivals, stopTime, started)
+            started = True
+        if stopTime == None:
+            break
+        conn.send(getReport(myEventQueue, myScheduler, myNodeList))
+    conn.send(getResult(myScheduler, myNodeList, myPodList))
+    conn.close()
+
+def receive(conn, index: int):
+    try:
+        return conn.recv()
+    except EOFError:
+        print('Partition %d stopped, exiting' % (index))
+        sys.exit(1)
+
+def simulateParallel(pfile: str, parts: list[list[Node]], sched: str, nsched: str, useTable: bool, seed: int, window: int) -> tuple:
+    # Runs the partitions window by window, returns the result of each partition and the usage of the cluster
+    conns = []
+    for i, part in enumerate(parts):
+        conn, child = multiprocessing.Pipe()
+        multiprocessing.Process(target=runPartition, args=(child, part, sched, nsched, useTable, seed + i), daemon=True).start()
+        child.close()
+        conns.append(conn)
+
+    myDispatcher = Dispatcher(parts)
+    myUsage = ClusterUsage(len(parts))
+    nextTimes = [None] * len(parts) # Next event of each partition, as of its last report
+    arrivals = ArrivalLines(pfile)
+    windowStart = arrivals.getNextTime()
+    while arrivals.hasNext():
+        windowEnd = windowStart + window
+        batches = [[] for _ in parts]
+        while arrivals.hasNext() and arrivals.getNextTime() < windowEnd:
+            line = arrivals.popPod()
+            fields = line.split()
+            batches[myDispatcher.route(int(fields[6]), int(fields[7]), int(fields[8]))].append(line)
+
+        # Partitions with nothing to do in this window are not woken up
+        running = [i for i in range(len(parts)) if len(batches[i]) > 0 or nextTimes[i] != None and nextTimes[i] < windowEnd]
+        for i in running:
+            conns[i].send((batches[i], windowEnd - 1))
+        samples = dict()
+        for i in running:
+            nextTimes[i], room, samples[i] = receive(conns[i], i)
+            myDispatcher.report(i, room)
+        myUsage.add(samples)
+
+        # Skips the windows where no partition has an event and no pod arrives
+        windowStart = windowEnd
+        if arrivals.hasNext():
+            nextTime = min([arrivals.getNextTime()] + [t for t in nextTimes if t != None])
+            if nextTime > windowStart:
+                windowStart += (nextTime - windowStart) // window * window
+
+    for conn in conns:
+        conn.send(([], None))
+    results = [receive(conn, i) for i, conn in enumerate(conns)]
+    myUsage.add({i: result[-1] for i, result in enumerate(results)})
+    return results, myUsage
+
+def printSummary(pfile: str, nfile: str, results: list[tuple], myUsage: ClusterUsage, groupBy: str, window: int) -> None:
+    # Same summary as simulator.py, over the pods and nodes of every partition
+    totalPods = 0
+    totalJct = 0
+    startedPods = 0
+    totalLat = 0
+    rejected = []
+    myPodList = PodList()
+    myNodeList = NodeList()
+    myUsage.calcAvgUtil(myNodeList)
+    for _, _, rejectedNames, totals, _ in results:
+        totalPods += totals[0]
+        totalJct += totals[1]
+        startedPods += totals[2]
+        totalLat += totals[3]
+        rejected.extend(rejectedNames)
+    if totalPods != 0:
+        myPodList.avgJct = totalJct / totalPods
+    if startedPods != 0:
+        myPodList.avgLatency = totalLat / startedPods
+
+    print("Summary:")
+    print("Pod File: %s\tNode File:%s" %(pfile, nfile))
+    print(results[0][0])
+    print("Partitions: %d by %s, %d sec windows" % (len(results), groupBy, window))
+    if len(results) == 1:
+        print("Unable to schedule Pods: %s" % (results[0][1]))
+    else:
+        print("Unable to schedule Pods: %s" % ("".join("[%d] %s" % (i, result[1]) for i, result in enumerate(results))))
+    if len(rejected) > 0:
+        print("Larger than every node: Rejected[%d]: %s" % (len(rejected), "".join(name + " " for name in rejected)))
+    print(myPodList.getBenchmarkStr())
+    print(myNodeList.getAvgUtil())
+
+def userCallHelper():
+    print('parallel_sim.py -h -a -j <partitions> -g <grouping> -w <window> -r <seed> -p <pods.txt> -n <nodes.txt> -s <scheduler> -d <node scheduler>')
+    print('Splits the nodes into partitions that are simulated in parallel, one worker process each')
+    print('-p pod file, text, -n node file, text or binary')
+    print('-s pod scheduler and -d node scheduler, same as simulator.py, every partition gets its own')
+    print('-j number of partitions, default number of CPUs')
+    print('-g hash (default) spreads the nodes by name, zone keeps each zone in one partition')
+    print('-w seconds of simulated time between two syncs of the partitions, default 60')
+    print('   pods arriving in a window are routed with the state of the partitions at its start')
+    print('-r seed, partition i seeds the random module with seed + i, default 0')
+    print('-a for array backed node matching (needs numpy)')
+
+def main(argv):
+    pfile = ''
+    nfile = ''
+    sched = ''
+    nsched = "DEF"
+    partitions = os.cpu_count()
+    groupBy = "hash"
+    window = 60
+    seed = 0
+    useTable = False
+
+    try:
+        opts, args = getopt.getopt(argv, "haj:g:w:r:p:n:s:d:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    try:
+        for opt, arg in opts:
+            if opt == "-h":
+                userCallHelper()
+                sys.exit(1)
+            elif opt == "-p":
+                pfile = arg
+            elif opt == "-n":
+                nfile = arg
+            elif opt == "-s":
+                sched = arg
+            elif opt == "-d":
+                nsched = arg
+            elif opt == "-j":
+                partitions = int(arg)
+            elif opt == "-g":
+                groupBy = arg
+            elif opt == "-w":
+                window = int(arg)
+            elif opt == "-r":
+                seed = int(arg)
+            elif opt == "-a":
+                useTable = True
+    except ValueError:
+        print('Invalid value for %s: %s' % (opt, arg))
+        sys.exit(1)
+
+    if pfile == "" or nfile == "":
+        print('Missing pod file or node file, exiting')
+        sys.exit(1)
+    if simulator.parseSchedulerInfo(sched) == None:
+        print('Missing scheduler or used invalid name')
+        sys.exit(1)
+    if simulator.parseNodeListInfo(nsched) == None:
+        print('Invalid node scheduler: %s' % (nsched))
+        sys.exit(1)
+    if groupBy not in groupings:
+        print('Unknown grouping %s, use hash or zone' % (groupBy))
+        sys.exit(1)
+    if partitions < 1 or window < 1:
+        print('There has to be at least one partition and windows of at least one second')
+        sys.exit(1)
+    if workload_file.isBinary(pfile):
+        print('The pod file is read while the simulation runs, it has to be a text file')
+        sys.exit(1)
+    if useTable and importlib.util.find_spec("numpy") is None:
+        print('Array backed node matching needs numpy, exiting')
+        sys.exit(1)
+
+    myNodes = NodeRows()
+    simulator.loadNodeFile(nfile, myNodes)
+    parts = getPartitions(myNodes.nodes, partitions, groupBy)
+    results, myUsage = simulateParallel(pfile, parts, sched, nsched, useTable, seed, window)
+    printSummary(pfile, nfile, results, myUsage, groupBy, window)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -1,90 +1,287 @@
-from random import randint
+try:
+    import numpy as np
+except ImportError: # Needed to generate pods, checked in main
+    np = None
+
+from array import array
 from name_generator import iter_all_strings
-import sys
-import random
+import getopt, itertools, math, sys, tempfile
+import workload_file
+
+# Generates a pod file in arrival order, so the simulator never has to sort it (see -l)
+# Every column is drawn in numpy batches of chunkSize pods and written out before the next chunk
+# A fixed seed gives the same file every time
+
+header = "UserName podName arrivalTime work prio tickets cpu gpu ram"
+chunkSize = 1 << 18
+
+kinds = { # cpu, gpu and ram ranges, the same as the old pods_large, pods_small and pods_mix files
+    "large": ((4, 16), (1, 4), (8, 32)),
+    "small": ((1, 8), (0, 2), (1, 16)),
+    "mix": ((1, 16), (0, 4), (1, 32)),
+}
+
+def parseCount(s: str) -> int:
+    # 10k -> 10000, 1M -> 1000000
+    scale = {"k": 1000, "K": 1000, "m": 1000000, "M": 1000000}
+    if s[-1] in scale:
+        return int(float(s[:-1]) * scale[s[-1]])
+    return int(s)
+
+def parseSpec(spec: str, forms: dict) -> tuple:
+    # "poisson:2" -> ("poisson", [2.0]), forms is name -> (min, max) number of values
+    parts = spec.split(":")
+    name = parts[0]
+    if name not in forms:
+        print("Unknown %s, use one of %s" % (name, ", ".join(forms)))
+        sys.exit(1)
+    low, high = forms[name]
+    try:
+        values = [float(v) for v in parts[1:]]
+    except ValueError:
+        values = None
+    if values == None or not low <= len(values) <= high:
+        print("Invalid values in %s" % (spec))
+        sys.exit(1)
+    return name, values
+
+arrivalForms = {"uniform": (1, 1), "poisson": (1, 1), "bursty": (2, 2), "diurnal": (3, 3)}
+workForms = {"uniform": (2, 2), "pareto": (3, 3), "lognormal": (3, 3)}
+
+def checkArrivals(spec: tuple) -> None:
+    # Exits when the values of an arrival form are out of range, see getArrivals
+    name, values = spec
+    if name == "uniform" and values[0] < 0:
+        print('The uniform max time has to be at least 0')
+        sys.exit(1)
+    if name != "uniform" and values[0] <= 0:
+        print('The %s rate has to be above 0' % (name))
+        sys.exit(1)
+    if name == "bursty" and values[1] < 1:
+        print('The mean burst has to be at least 1 pod')
+        sys.exit(1)
+    if name == "diurnal" and (values[1] <= 0 or not 0 <= values[2] <= 1):
+        print('The diurnal period has to be above 0 and the amplitude from 0 to 1')
+        sys.exit(1)
+
+def checkWork(spec: tuple) -> None:
+    # Exits when the values of a work form are out of range, see getWork
+    name, values = spec
+    if name == "uniform" and not 1 <= values[0] <= values[1]:
+        print('The uniform work needs 1 <= min <= max')
+        sys.exit(1)
+    if name == "pareto" and (values[0] <= 0 or not 1 <= values[1] <= values[2]):
+        print('The pareto alpha has to be above 0 and 1 <= min <= max')
+        sys.exit(1)
+    if name == "lognormal" and (values[0] <= 0 or values[1] < 0 or values[2] < 1):
+        print('The lognormal median has to be above 0, sigma at least 0 and max at least 1')
+        sys.exit(1)
+
+def getArrivals(rng, spec: tuple, n: int):
+    # Yields chunks of n arrival times in total, every chunk sorted and after the previous one
+    #   uniform:<maxTime>  every second in [0, maxTime] equally likely, like the old generator
+    #   poisson:<rate>  exponential gaps, rate pods per second on average
+    #   bursty:<rate>:<mean burst>  bursts with poisson gaps, each a geometric number of pods arriving together
+    #   diurnal:<rate>:<period>:<amplitude>  poisson with a rate of rate * (1 + amplitude * sin(2 pi t / period))
+    name, values = spec
+    if name == "uniform":
+        # Number of pods per second, then the position of each pod in the cumulative counts is its time
+        seconds = int(values[0]) + 1
+        ends = np.cumsum(rng.multinomial(n, [1 / seconds] * seconds))
+        for start in range(0, n, chunkSize):
+            yield np.searchsorted(ends, np.arange(start, min(start + chunkSize, n)), side="right")
+        return
+
+    last = 0.0
+    left = n
+    while left > 0:
+        if name == "poisson":
+            times = last + np.cumsum(rng.exponential(1 / values[0], chunkSize))
+            last = times[-1]
+        elif name == "bursty":
+            rate, meanBurst = values
+            bursts = max(1, int(chunkSize / meanBurst))
+            starts = last + np.cumsum(rng.exponential(meanBurst / rate, bursts))
+            last = starts[-1]
+            times = np.repeat(starts, rng.geometric(1 / meanBurst, bursts))
+        else:
+            # Thinning, candidates at the highest rate and each one kept with the rate at its time over the highest
+            rate, period, amplitude = values
+            candidates = last + np.cumsum(rng.exponential(1 / (rate * (1 + amplitude)), chunkSize))
+            last = candidates[-1]
+            keep = rng.random(chunkSize) * (1 + amplitude) < 1 + amplitude * np.sin(2 * math.pi * candidates / period)
+            times = candidates[keep]
+        times = np.floor(times[:left]).astype(np.int64)
+        left -= len(times)
+        yield times
+
+def getWork(rng, spec: tuple, size: int):
+    #   uniform:<min>:<max>  like the old generator
+    #   pareto:<alpha>:<min>:<max>  heavy tailed, most pods are close to min, a few are huge, capped at max
+    #   lognormal:<median>:<sigma>:<max>  capped at max
+    name, values = spec
+    if name == "uniform":
+        return rng.integers(int(values[0]), int(values[1]) + 1, size)
+    if name == "pareto":
+        alpha, low, high = values
+        work = low * (1 + rng.pareto(alpha, size))
+    else:
+        median, sigma, high = values
+        work = median * np.exp(sigma * rng.standard_normal(size))
+    return np.clip(np.floor(work), 1, high).astype(np.int64)
+
+def getResources(rng, kind: str, correlation: float, size: int) -> list:
+    # cpu, gpu and ram in the ranges of kind
+    # With a correlation above 0 they share part of their draw, a pod that wants a lot of cpu tends to want a lot of
+    # gpu and ram too, at 1 all three are at the same point of their range
+    shared = rng.random(size)
+    columns = []
+    for low, high in kinds[kind]:
+        u = correlation * shared + (1 - correlation) * rng.random(size)
+        columns.append(np.minimum(low + np.floor(u * (high - low + 1)).astype(np.int64), high))
+    return columns
+
+def getUserWeights(users: int, skew: float):
+    # Zipf like, user i gets (i + 1) ** -skew of the pods, 0 is uniform
+    weights = np.arange(1, users + 1, dtype=np.float64) ** -skew
+    return weights / weights.sum()
+
+class TextWriter:
+    def __init__(self, outFile: str, userNames: list) -> None:
+        self.file = open(outFile, 'w', buffering=1 << 20)
+        self.file.write(header + "\n")
+        self.userNames = userNames
+
+    def write(self, userIds, names: list, columns: list) -> None:
+        userNames = self.userNames
+        self.file.write("".join("%s Pod%s %d %d %d %d %d %d %d\n" % row for row in
+            zip([userNames[i] for i in userIds.tolist()], names, *[c.tolist() for c in columns])))
+
+    def close(self, rows: int) -> None:
+        self.file.close()
+
+class BinaryWriter:
+    # Binary workload file (see workload_file.py), users are strings 0 to users - 1 and the pods follow
+    # Columns and the string table are spooled to temp files, so memory does not depend on the number of pods
+    def __init__(self, outFile: str, userNames: list) -> None:
+        self.outFile = outFile
+        self.spools = {name: tempfile.TemporaryFile() for name in workload_file.podColumns + ("stringOffsets", "strings")}
+        self.stringBytes = 0
+        self.nextId = 0
+        self.addStrings(userNames)
+
+    def addStrings(self, strings: list) -> None:
+        encoded = [s.encode() for s in strings]
+        offsets = array('q', itertools.accumulate((len(s) for s in encoded), initial=self.stringBytes))
+        self.spools["stringOffsets"].write(offsets[:-1].tobytes())
+        self.spools["strings"].write(b"".join(encoded))
+        self.stringBytes = offsets[-1]
+        self.nextId += len(strings)
+
+    def write(self, userIds, names: list, columns: list) -> None:
+        nameIds = np.arange(self.nextId, self.nextId + len(names), dtype=np.int64)
+        self.addStrings(["Pod" + name for name in names])
+        for name, column in zip(workload_file.podColumns, [userIds, nameIds] + columns):
+            self.spools[name].write(column.astype(np.int64).tobytes())
+
+    def close(self, rows: int) -> None:
+        self.spools["stringOffsets"].write(array('q', [self.stringBytes]).tobytes())
+        workload_file.writeWorkload(self.outFile, "pods", header, rows, self.spools)
+        for spool in self.spools.values():
+            spool.close()
+
+def generate(outFile: str, n: int, arrivals: tuple, work: tuple, kind: str, correlation: float, users: int,
+    skew: float, seed: int, binary: bool) -> None:
+    rng = np.random.default_rng(seed)
+    userNames = ["User" + name for name in itertools.islice(iter_all_strings(), users)]
+    userTickets = rng.integers(1, 11, users) * 10 # Tickets come from the user priority
+    userWeights = getUserWeights(users, skew)
+    podNames = iter_all_strings()
+
+    writer = BinaryWriter(outFile, userNames) if binary else TextWriter(outFile, userNames)
+    for at in getArrivals(rng, arrivals, n):
+        size = len(at)
+        userIds = rng.choice(users, size, p=userWeights)
+        prio = rng.integers(1, 5, size)
+        cpu, gpu, ram = getResources(rng, kind, correlation, size)
+        # Same column order as the pod file
+        writer.write(userIds, list(itertools.islice(podNames, size)),
+            [at, getWork(rng, work, size), prio, userTickets[userIds], cpu, gpu, ram])
+    writer.close(n)
+
+def userCallHelper():
+    print('pod_gen.py -h -b -n <pods> -o <out> -s <seed> -a <arrivals> -w <work> -k <kind> -c <correlation> -u <users>[:<skew>]')
+    print('Writes a pod file sorted by arrival time, default 2500 pods to pods.txt')
+    print('-n number of pods, k and M suffixes work')
+    print('-b writes the binary workload format instead of text')
+    print('-s seed, default 0')
+    print('-a arrivals, default uniform:120')
+    print('   uniform:<max time>, poisson:<pods per sec>, bursty:<pods per sec>:<mean burst size>')
+    print('   diurnal:<pods per sec>:<period>:<amplitude>, the rate goes up and down by amplitude (0 to 1) every period')
+    print('-w work, default uniform:100:1000')
+    print('   uniform:<min>:<max>, pareto:<alpha>:<min>:<max>, lognormal:<median>:<sigma>:<max>')
+    print('-k cpu, gpu and ram ranges of the old files, mix (default), small or large')
+    print('-c how much cpu, gpu and ram go together, 0 (default) is independent, 1 is always the same part of the range')
+    print('-u number of users and how skewed the pods are towards the first ones, default 100:0 (uniform)')
 
 def main(argv):
-    # outFile = argv[0] if len(argv) == 1 else "pods.txt"
-    N = 2500 # number of pods
-    MAXTIME = 120
-    NUMUSERS = 100 # number of users
-
-    userNames = []
-    userPriorities = dict()
-    genUserNames = iter_all_strings()
-    for _ in range(NUMUSERS):
-        name = "User" + next(genUserNames)
-        userNames.append(name)
-        userPriorities[name] = randint(1,10)
-
-    cpus = [4,8,16]
-    rams = [8,16,32]
-    gpus = [1,2,4]
-
-    # Large pods
-    outFile = "pods_large.txt"
-    genPodNames = iter_all_strings()
-    # currentTime = 0
-    with open(outFile, 'w') as f:
-        f.write("UserName podName arrivalTime work prio tickets cpu gpu ram\n")
-        for i in range(0, N):
-            if i != 0:
-                f.write("\n")
-
-            userName = random.choice(userNames)
-            podName = "Pod" + next(genPodNames)
-            arrivalTime = randint(0, MAXTIME) # Generate pods between 0 to 60 s
-            work = randint(100, 1000)
-            prio = randint(1, 4)
-            tickets = userPriorities[userName] * 10
-            cpu = randint(cpus[0],cpus[2]) # Only has cpus from 8 to 16
-            gpu = randint(gpus[0],gpus[2])
-            ram = randint(rams[0],rams[2])
-
-            # currentTime += arrivalTime
-            f.write("%s %s %d %d %d %d %d %d %d" % (userName, podName, arrivalTime, work, prio, tickets, cpu, gpu, ram))
-    
-    # Small pods
-    outFile = "pods_small.txt"
-    genPodNames = iter_all_strings()
-    with open(outFile, 'w') as f:
-        f.write("UserName podName arrivalTime work prio tickets cpu gpu ram tickets\n")
-        for i in range(0, N):
-            if i != 0:
-                f.write("\n")
-
-            userName = random.choice(userNames)
-            podName = "Pod" + next(genPodNames)
-            arrivalTime = randint(0, MAXTIME) # Generate pods between 0 to 60 s
-            work = randint(100, 1000)
-            prio = randint(1, 4)
-            tickets = userPriorities[userName] * 10
-            cpu = randint(1,cpus[1]) # Only has cpus from 1 to 8
-            gpu = randint(0,gpus[1]) # Can have no gpu
-            ram = randint(1,rams[1]) # has 1 to 16 ram
-
-            f.write("%s %s %d %d %d %d %d %d %d" % (userName, podName, arrivalTime, work, prio, tickets, cpu, gpu, ram))
-    
-    # mix pods
-    outFile = "pods_mix.txt"
-    genPodNames = iter_all_strings()
-    with open(outFile, 'w') as f:
-        f.write("UserName podName arrivalTime work prio tickets cpu gpu ram tickets\n")
-        for i in range(0, N):
-            if i != 0:
-                f.write("\n")
-
-            userName = random.choice(userNames)
-            podName = "Pod" + next(genPodNames)
-            arrivalTime = randint(0, MAXTIME) # Generate pods between 0 to 60 s
-            work = randint(100, 1000)
-            prio = randint(1, 4)
-            tickets = userPriorities[userName] * 10
-            cpu = randint(1,cpus[2]) # Has cpus from 1 to 16
-            gpu = randint(0,gpus[2])
-            ram = randint(1,rams[2])
-
-            f.write("%s %s %d %d %d %d %d %d %d" % (userName, podName, arrivalTime, work, prio, tickets, cpu, gpu, ram))
+    n = 2500
+    outFile = "pods.txt"
+    seed = 0
+    arrivals = ("uniform", [120.0])
+    work = ("uniform", [100.0, 1000.0])
+    kind = "mix"
+    correlation = 0.0
+    users = 100
+    skew = 0.0
+    binary = False
+
+    try:
+        opts, args = getopt.getopt(argv, "hbn:o:s:a:w:k:c:u:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    try:
+        for opt, arg in opts:
+            if opt == "-h":
+                userCallHelper()
+                sys.exit(1)
+            elif opt == "-n":
+                n = parseCount(arg)
+            elif opt == "-o":
+                outFile = arg
+            elif opt == "-s":
+                seed = int(arg)
+            elif opt == "-a":
+                arrivals = parseSpec(arg, arrivalForms)
+            elif opt == "-w":
+                work = parseSpec(arg, workForms)
+            elif opt == "-k":
+                kind = arg
+            elif opt == "-c":
+                correlation = float(arg)
+            elif opt == "-u":
+                parts = arg.split(":")
+                users = int(parts[0])
+                skew = float(parts[1]) if len(parts) > 1 else 0.0
+            elif opt == "-b":
+                binary = True
+    except ValueError:
+        print('Invalid value for %s: %s' % (opt, arg))
+        sys.exit(1)
+
+    if np is None:
+        print('pod_gen.py needs numpy, exiting')
+        sys.exit(1)
+    if kind not in kinds:
+        print('Unknown kind %s, use mix, small or large' % (kind))
+        sys.exit(1)
+    if not 0 <= correlation <= 1 or users < 1 or n < 1:
+        print('Correlation has to be from 0 to 1 and there has to be at least one user and one pod')
+        sys.exit(1)
+    checkArrivals(arrivals)
+    checkWork(work)
+    generate(outFile, n, arrivals, work, kind, correlation, users, skew, seed, binary)
 
 if __name__ == "__main__":
-   main(sys.argv[1:])
\ No newline at end of file
+   main(sys.argv[1:])
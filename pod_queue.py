@@ -0,0 +1,177 @@
+import heapq, itertools
+from collections import deque
+from pods import *
+
+
+class PodQueue:
+    # Pending pods ordered by (sortKey(pod), higher prio first, insertion order)
+    # Same order as inserting before the first pod with a larger key, or the same key and a lower prio
+    # The key is computed once when the pod is added, pods must not change it while queued
+    def __init__(self, sortKey) -> None:
+        self.sortKey = sortKey
+        self.heap = [] # (key, -prio, seq, pod)
+        self.seq = 0
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def __iter__(self):
+        # Queue order, O(n log n), only for printing
+        return (entry[3] for entry in sorted(self.heap))
+
+    def push(self, pod: Pod) -> None:
+        heapq.heappush(self.heap, (self.sortKey(pod), -pod.prio, self.seq, pod))
+        self.seq += 1
+
+    def pushAll(self, pods: list[Pod]) -> None:
+        # Same as pushing the pods one by one, a single heapify when there are many of them
+        if len(pods) * 4 < len(self.heap):
+            for pod in pods:
+                self.push(pod)
+            return
+        for pod in pods:
+            self.heap.append((self.sortKey(pod), -pod.prio, self.seq, pod))
+            self.seq += 1
+        heapq.heapify(self.heap)
+
+    def peek(self) -> Pod:
+        return self.heap[0][3]
+
+    def peekKey(self):
+        return self.heap[0][0]
+
+    def popleft(self) -> Pod:
+        return heapq.heappop(self.heap)[3]
+
+    def getFront(self) -> list[Pod]:
+        # Pods sharing the smallest key in queue order, without popping them
+        # Only walks the heap entries with that key, their children cannot have a smaller one
+        if len(self.heap) == 0:
+            return []
+        key = self.heap[0][0]
+        front = []
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            if i < len(self.heap) and self.heap[i][0] == key:
+                front.append(self.heap[i])
+                stack.append(2*i + 1)
+                stack.append(2*i + 2)
+        front.sort()
+        return [entry[3] for entry in front]
+
+
+class FairShareQueue:
+    # Pending pods as one FIFO queue per user, users ordered by getShare(user), smallest first
+    # Users with the same share are taken in the order their share was last updated
+    # The heap holds (share, seq, version, user), entries of older versions are stale and skipped
+    def __init__(self, getShare) -> None:
+        self.getShare = getShare
+        self.userQueues = dict() # user id -> deque of pods, in first seen order
+        self.versions = dict() # user id -> version of its live heap entry
+        self.heap = []
+        self.seq = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        # Pods in the order they would be picked if shares did not change, only for printing
+        live = sorted(entry for entry in self.heap if entry[2] == self.versions[entry[3]])
+        for entry in live:
+            yield from self.userQueues[entry[3]]
+
+    def updateUser(self, user) -> None:
+        # Call when the share of a user changes, O(log U)
+        # Drops the old heap entry and adds a new one if the user has pods waiting
+        self.versions[user] = self.versions.get(user, 0) + 1
+        if len(self.userQueues.get(user, ())) > 0:
+            heapq.heappush(self.heap, (self.getShare(user), self.seq, self.versions[user], user))
+            self.seq += 1
+            if len(self.heap) > 2 * len(self.userQueues) + 16:
+                # Too many stale entries, only keep the live ones
+                self.heap = [entry for entry in self.heap if entry[2] == self.versions[entry[3]]]
+                heapq.heapify(self.heap)
+
+    def push(self, pod: Pod) -> None:
+        queue = self.userQueues.setdefault(pod.userId, deque())
+        queue.append(pod)
+        self.size += 1
+        if len(queue) == 1:
+            self.updateUser(pod.userId)
+
+    def pushFront(self, pods: list[Pod]) -> None:
+        # Puts pods back in front of their users' queues, keeping their order
+        users = dict() # Used as an ordered set
+        for pod in reversed(pods):
+            self.userQueues[pod.userId].appendleft(pod)
+            self.size += 1
+            users[pod.userId] = True
+        for user in users:
+            self.updateUser(user)
+
+    def popUser(self):
+        # User with the smallest share that has pods waiting, None if there is none
+        # The user is out of the heap until updateUser is called for it
+        while self.heap:
+            share, seq, version, user = heapq.heappop(self.heap)
+            if version == self.versions[user]:
+                self.versions[user] += 1
+                return user
+        return None
+
+    def peekUser(self):
+        # User popUser would return, without taking it out of the heap, None if there is none
+        while self.heap:
+            share, seq, version, user = self.heap[0]
+            if version == self.versions[user]:
+                return user
+            heapq.heappop(self.heap)
+        return None
+
+    def peek(self, user) -> Pod:
+        return self.userQueues[user][0]
+
+    def getFront(self, stateTS: int) -> list[Pod]:
+        # Pods at the front of each user's queue that entered their state at stateTS
+        # Users in the order they would be picked if shares did not change, so the first pick comes first
+        live = sorted(entry for entry in self.heap if entry[2] == self.versions[entry[3]])
+        front = []
+        for entry in live:
+            front.extend(itertools.takewhile(lambda pod: pod.stateTS == stateTS, self.userQueues[entry[3]]))
+        return front
+
+    def popleft(self, user) -> Pod:
+        self.size -= 1
+        return self.userQueues[user].popleft()
+
+
+class UserQueues:
+    # Pending pods as one FIFO queue per user, O(1) to take the first pod of a user
+    # Pods keep a global insertion seq so the whole queue can still be listed in arrival order
+    def __init__(self) -> None:
+        self.userQueues = dict() # user id -> deque of (seq, pod)
+        self.seq = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        # Pods in the order they were added, only for printing
+        merged = heapq.merge(*self.userQueues.values())
+        return (pod for seq, pod in merged)
+
+    def append(self, pod: Pod) -> None:
+        self.userQueues.setdefault(pod.userId, deque()).append((self.seq, pod))
+        self.seq += 1
+        self.size += 1
+
+    def popUser(self, user) -> Pod:
+        # First pod added by this user, None if the user has no pods waiting
+        queue = self.userQueues.get(user)
+        if not queue:
+            return None
+        self.size -= 1
+        return queue.popleft()[1]
@@ -0,0 +1,193 @@
+from array import array
+from sys import exit
+
+try:
+    import numpy as np
+except ImportError: # Optional, only used to speed up the benchmark reductions
+    np = None
+
+from pods import *
+
+
+def column(values) -> property:
+    # Pod attribute stored in values[view.index], values is bound here so a read is a single index
+    def get(self):
+        return values[self.index]
+    def set(self, value):
+        values[self.index] = value
+    return property(get, set)
+
+class PodView:
+    # Handle to one row of a PodTable, used like a Pod by the simulator and the schedulers
+    # Only holds the row, every attribute lives in the table columns
+    # Each PodTable makes a subclass with the attributes bound to its columns, see PodTable.makeViewClass
+    __slots__ = ("index",)
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+
+    calcJct = Pod.calcJct
+    __repr__ = Pod.__repr__
+    getStateInfoStr = Pod.getStateInfoStr
+
+    def __reduce__(self):
+        # The view class is made at run time and cannot be pickled, a view is pickled as its table and row
+        return (self.table.getView, (self.index,))
+
+class PodTable(PodList):
+    # PodList that stores the pods as columns of typed arrays instead of one Pod object each
+    # The table does not keep a PodView per pod, the view returned by createPod is the one the simulation
+    # passes around and it goes away with the last event or queue holding it
+    # Resources, prio and tickets are 32 bit
+    def __init__(self) -> None:
+        self.avgJct = -1.00
+        self.avgLatency = -1.00
+
+        self.names = []
+        self.users = [] # Each user name once
+        self.userIndex = dict() # user -> position in users, the user id
+        self.userIds = array('i')
+
+        # Basic info - DOES NOT CHANGE
+        self.at = array('q')
+        self.work = array('q')
+        self.cpu = array('i')
+        self.gpu = array('i')
+        self.ram = array('i')
+        self.prio = array('i')
+        self.tickets = array('i')
+
+        # Node that the pod is running on, None if it is not running
+        self.node = []
+
+        # State information
+        self.state = [] # State members are shared, a list only holds references
+        self.stateTS = array('q')
+        self.preempted = bytearray()
+        self.remainWork = array('q')
+        self.dynamicPrio = array('i')
+
+        # Benchmarking values
+        self.execStartTime = array('q')
+        self.finishTime = array('q')
+        self.totalWaitTime = array('q')
+        self.jct = array('d')
+
+        self.viewClass = self.makeViewClass()
+
+    def makeViewClass(self) -> type:
+        # PodView subclass whose attributes read and write the columns of this table
+        users = self.users
+        userIds = self.userIds
+        preempted = self.preempted
+        attrs = {"__slots__": (), "table": self}
+        for name in ("name", "at", "work", "cpu", "gpu", "ram", "prio", "tickets", "node", "state", "stateTS",
+                     "remainWork", "dynamicPrio", "execStartTime", "finishTime", "totalWaitTime", "jct"):
+            attrs[name] = column(getattr(self, name if name != "name" else "names"))
+        attrs["user"] = property(lambda pod: users[userIds[pod.index]])
+        attrs["id"] = property(lambda pod: pod.index) # Row and user ids are the ids of Pod
+        attrs["userId"] = property(lambda pod: userIds[pod.index])
+        attrs["preempted"] = property(lambda pod: preempted[pod.index] == 1,
+            lambda pod, value: preempted.__setitem__(pod.index, 1 if value else 0))
+        return type("PodView", (PodView,), attrs)
+
+    def createPod(self, user: str, name: str, arrivalTime: int, work: int, cpu: int, gpu: int, ram: int, prio: int, tickets: int, state: State) -> PodView:
+        self.userIds.append(self.getUserId(user))
+        self.names.append(name)
+        self.at.append(arrivalTime)
+        self.work.append(work)
+        self.cpu.append(cpu)
+        self.gpu.append(gpu)
+        self.ram.append(ram)
+        self.prio.append(prio)
+        self.tickets.append(tickets)
+
+        self.node.append(None)
+        self.state.append(state)
+        self.stateTS.append(arrivalTime)
+        self.preempted.append(0)
+        self.remainWork.append(work)
+        self.dynamicPrio.append(prio)
+
+        self.execStartTime.append(-1)
+        self.finishTime.append(0)
+        self.totalWaitTime.append(0)
+        self.jct.append(-1.00)
+
+        return self.viewClass(len(self.names) - 1)
+
+    def loadWorkload(self, workload) -> list[PodView]:
+        # Fills an empty table from a binary pod file (workload_file.Workload), returns a view per pod in file order
+        # The columns that do not change are read from the memory mapped file in place, the others start as copies
+        # Pods cannot be added with createPod afterwards
+        if len(self.names) != 0:
+            print("PodTable can only load a workload file when it is empty")
+            exit(1)
+        rows = workload.rows
+        self.names = workload.getStrings("nameIds")
+        self.users = workload.getStringTable()
+        self.userIds = workload.getColumn("userIds")
+        for name in ("at", "work", "cpu", "gpu", "ram", "prio", "tickets"):
+            setattr(self, name, workload.getColumn(name))
+
+        self.node = [None] * rows
+        self.state = [State.CREATED] * rows
+        self.stateTS = array('q', self.at)
+        self.preempted = bytearray(rows)
+        self.remainWork = array('q', self.work)
+        self.dynamicPrio = array('i', self.prio)
+
+        self.execStartTime = array('q', [-1]) * rows
+        self.finishTime = array('q', [0]) * rows
+        self.totalWaitTime = array('q', [0]) * rows
+        self.jct = array('d', [-1.00]) * rows
+
+        self.viewClass = self.makeViewClass()
+        return [self.viewClass(i) for i in range(rows)]
+
+    def getView(self, index: int) -> PodView:
+        return self.viewClass(index)
+
+    def __getstate__(self) -> dict:
+        # Columns read from a workload file are copied, the file is not part of the pickle
+        state = self.__dict__.copy()
+        del state["viewClass"]
+        for name in ("at", "work", "cpu", "gpu", "ram", "prio", "tickets", "userIds"):
+            if isinstance(state[name], memoryview):
+                state[name] = array('q', state[name])
+        for name in ("names", "users"):
+            if not isinstance(state[name], list):
+                state[name] = [state[name][i] for i in range(len(state[name]))]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        setState(self, state)
+        self.viewClass = self.makeViewClass()
+
+    @property
+    def pods(self) -> list[PodView]:
+        # New views of every row, for printing and the reductions without numpy
+        return [self.viewClass(i) for i in range(len(self.names))]
+
+    def addPod(self, pod: Pod) -> None:
+        print("PodTable only holds pods made by createPod()")
+        exit(1)
+
+    def calcAvgJct(self) -> None:
+        if np is None:
+            return super().calcAvgJct()
+        work = np.frombuffer(self.work, dtype=np.int64)
+        totalWaitTime = np.frombuffer(self.totalWaitTime, dtype=np.int64)
+        jct = np.frombuffer(self.jct, dtype=np.float64)
+        jct[:] = (work + totalWaitTime) / work
+        # cumsum adds in order like the loop in PodList, np.sum would round differently
+        totalJct = np.cumsum(jct)[-1] if len(jct) > 0 else 0.0
+        self.avgJct = totalJct / len(jct)
+
+    def calcAvgLatency(self) -> None:
+        if np is None:
+            return super().calcAvgLatency()
+        execStartTime = np.frombuffer(self.execStartTime, dtype=np.int64)
+        started = execStartTime[execStartTime != -1]
+        if len(started) != 0:
+            self.avgLatency = int(started.sum()) / len(started)
@@ -9,11 +9,21 @@ class State(Enum):
     TERM = auto() # The done state
     PREEMPT = auto()
 
+def setState(obj, state: dict) -> None:
+    # __setstate__ of the classes that are pickled in a checkpoint, see simulator.Simulation
+    # Sets the attributes one by one like __init__ does, the default fills the instance __dict__ directly
+    # and attribute reads on such an object are about 2x slower in CPython 3.11+
+    for name, value in state.items():
+        setattr(obj, name, value)
+
 class Pod:
-    def __init__(self, user: str, name: str, arrivalTime: int, work: int, cpu: int, gpu: int, ram: int, prio: int, tickets: int, state: State) -> None:
+    def __init__(self, user: str, name: str, arrivalTime: int, work: int, cpu: int, gpu: int, ram: int, prio: int, tickets: int, state: State,
+        id: int = -1, userId: int = -1) -> None:
         # Basic info - DOES NOT CHANGE
         self.user = user
         self.name = name
+        self.id = id # Dense ids given by the PodList, the simulation keys its maps by these, names are only for output
+        self.userId = userId
         self.at = arrivalTime
         self.work = work
         self.cpu = cpu
@@ -39,6 +49,8 @@ class Pod:
 
         # JCT
         self.jct = -1.00
+
+    __setstate__ = setState
     
     def calcJct(self) -> None:
         self.jct = (self.work + self.totalWaitTime) / self.work
@@ -61,6 +73,11 @@ class PodList:
         self.pods = []
         self.avgJct = -1.00
         self.avgLatency = -1.00
+
+        # Ids, see Pod
+        self.podCount = 0 # Next pod id
+        self.users = [] # Each user name once, position is the user id
+        self.userIndex = dict() # user -> user id
     
     def calcAvgJct(self) -> None:
         totalJct = 0
@@ -82,14 +99,84 @@ class PodList:
     def addPod(self, pod: Pod) -> None:
         self.pods.append(pod)
 
+    def getUserId(self, user: str) -> int:
+        userId = self.userIndex.get(user)
+        if userId is None:
+            userId = self.userIndex[user] = len(self.users)
+            self.users.append(user)
+        return userId
+
+    def createPod(self, user: str, name: str, arrivalTime: int, work: int, cpu: int, gpu: int, ram: int, prio: int, tickets: int, state: State) -> Pod:
+        pod = Pod(user, name, arrivalTime, work, cpu, gpu, ram, prio, tickets, state, self.podCount, self.getUserId(user))
+        self.podCount += 1
+        self.addPod(pod)
+        return pod
+
+    def podDone(self, pod: Pod) -> None:
+        # Called when a streamed pod terminates, the list keeps every pod so nothing to do
+        pass
+
     def __repr__(self) -> str:
-        s = "Pod List:\n"
-        for i in self.pods:
-            s += "\t" + i.__repr__() + "\n"
-        return s
+        return "Pod List:\n" + "".join("\t" + i.__repr__() + "\n" for i in self.pods)
     
     def getBenchmarkStr(self) -> str:
         s = "Pod Benchmarks:\n"
         s += "\tAverage JCT: %.2f" % (self.avgJct)
         s += "\tAverage Latency: %.2f" % (self.avgLatency)
-        return s
\ No newline at end of file
+        return s
+
+class StreamedPodList(PodList):
+    # PodList for pods streamed from the pod file, see ArrivalSource
+    # Only keeps the pods that have not terminated, a terminated pod is added to running totals by podDone
+    def __init__(self) -> None:
+        self.avgJct = -1.00
+        self.avgLatency = -1.00
+
+        self.podCount = 0
+        self.users = []
+        self.userIndex = dict()
+
+        self.live = dict() # pod -> None, in the order the pods were created
+        self.totalPods = 0
+        self.doneJct = 0 # JCT sum of the terminated pods
+        self.doneLat = 0 # Latency sum of the terminated pods
+        self.donePods = 0
+
+    @property
+    def pods(self) -> list[Pod]:
+        # Pods that have not terminated
+        return list(self.live)
+
+    def addPod(self, pod: Pod) -> None:
+        self.live[pod] = None
+        self.totalPods += 1
+
+    def podDone(self, pod: Pod) -> None:
+        del self.live[pod]
+        pod.calcJct()
+        self.doneJct += pod.jct
+        self.doneLat += pod.execStartTime # A terminated pod always started
+        self.donePods += 1
+
+    def calcAvgJct(self) -> None:
+        totalPods, totalJct, _, _ = self.getTotals()
+        self.avgJct = totalJct / totalPods
+
+    def calcAvgLatency(self) -> None:
+        _, _, startedPods, totalLat = self.getTotals()
+        if startedPods != 0:
+            self.avgLatency = totalLat / startedPods
+
+    def getTotals(self) -> tuple:
+        # Sums behind calcAvgJct and calcAvgLatency, so the pods of several lists can be averaged together
+        # Number of pods, JCT sum, number of pods that started and their latency sum
+        totalJct = self.doneJct
+        totalLat = self.doneLat
+        startedPods = self.donePods
+        for pod in self.live:
+            pod.calcJct()
+            totalJct += pod.jct
+            if pod.execStartTime != -1:
+                totalLat += pod.execStartTime
+                startedPods += 1
+        return self.totalPods, totalJct, startedPods, totalLat
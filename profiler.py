@@ -0,0 +1,129 @@
+import time
+
+from pods import *
+from nodes import *
+from node_table import BatchMatcher
+
+class Profiler:
+    # Time and number of calls of the hot methods of one simulation, see attach()
+    # Calls are kept as a tree, a method called from two places has two entries, which gives
+    # the folded stacks of a flamegraph directly
+    # Nothing is changed until attach(), without a profiler the simulation runs exactly as before
+    instanceMethods = {
+        "eventQueue": ("putEvent", "getEvent", "getEventByPod", "removeEvent"),
+        "scheduler": ("addToQueue", "addToRunList", "rmFromRunList", "schedulePods", "preemptPods"),
+        "nodeList": ("updateClusterInfo", "getMatch", "getBatchMatcher"),
+    }
+    classMethods = ((Node, "addPod"), (Node, "removePod"), (BatchMatcher, "getMatch")) # Made during the run
+
+    def __init__(self) -> None:
+        self.root = [0, 0.0, dict()] # Tree entry: calls, seconds, name -> child entry
+        self.current = [self.root] # Entry of the method running now
+        self.cycleTimes = [] # Seconds of each schedulePods call
+        self.cyclePods = [] # Pods matched against the nodes in each schedulePods call
+        self.matches = 0
+        self.wrapped = [] # (object, name, original or None), to undo attach()
+
+    def wrap(self, func, name: str, isMatch: bool = False, isCycle: bool = False):
+        current = self.current
+        clock = time.perf_counter
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            parent = current[0]
+            entry = parent[2].get(name)
+            if entry is None:
+                entry = parent[2][name] = [0, 0.0, dict()]
+            current[0] = entry
+            if isMatch:
+                profiler.matches += 1
+            matches = profiler.matches
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = clock() - start
+                entry[0] += 1
+                entry[1] += seconds
+                current[0] = parent
+                if isCycle:
+                    profiler.cycleTimes.append(seconds)
+                    profiler.cyclePods.append(profiler.matches - matches)
+        return wrapper
+
+    def attach(self, mySim) -> None:
+        # Replaces the hot methods of the simulation's objects with timed ones, until detach()
+        # Instance methods are set on the objects themselves, methods of objects made during the run on their class
+        mySim.run = self.wrap(mySim.run, "simulate")
+        self.wrapped.append((mySim, "run", None))
+        for attr, names in self.instanceMethods.items():
+            obj = getattr(mySim, attr)
+            for name in names:
+                qualName = type(obj).__name__ + "." + name
+                setattr(obj, name, self.wrap(getattr(obj, name), qualName, qualName.endswith(".getMatch"), name == "schedulePods"))
+                self.wrapped.append((obj, name, None))
+        for cls, name in self.classMethods:
+            original = cls.__dict__[name]
+            setattr(cls, name, self.wrap(original, cls.__name__ + "." + name, cls is BatchMatcher))
+            self.wrapped.append((cls, name, original))
+
+    def detach(self) -> None:
+        # Puts the original methods back, a simulation has to be detached before it is saved
+        for obj, name, original in reversed(self.wrapped):
+            if original is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self.wrapped = []
+
+    def getPhases(self) -> dict:
+        # name -> [calls, seconds, self seconds], summed over every place the method was called from
+        phases = dict()
+        stack = [self.root]
+        while len(stack) > 0:
+            entry = stack.pop()
+            for name, child in entry[2].items():
+                phase = phases.setdefault(name, [0, 0.0, 0.0])
+                phase[0] += child[0]
+                phase[1] += child[1]
+                phase[2] += child[1] - sum(grandChild[1] for grandChild in child[2].values())
+                stack.append(child)
+        return phases
+
+    def getFoldedStr(self) -> str:
+        # One line per call path with its self time in microseconds, the input format of flamegraph.pl and speedscope
+        lines = []
+        stack = [("", self.root)]
+        while len(stack) > 0:
+            path, entry = stack.pop()
+            for name, child in entry[2].items():
+                childPath = path + ";" + name if path != "" else name
+                selfTime = child[1] - sum(grandChild[1] for grandChild in child[2].values())
+                lines.append("%s %d" % (childPath, round(selfTime * 1e6)))
+                stack.append((childPath, child))
+        return "\n".join(sorted(lines)) + "\n"
+
+    def getHistogramStr(self, values: list, unit: str) -> str:
+        # Power of 2 buckets, the bucket of v holds [2^(i-1), 2^i)
+        buckets = dict()
+        for v in values:
+            i = int(v).bit_length()
+            buckets[i] = buckets.get(i, 0) + 1
+        most = max(buckets.values())
+        lines = []
+        for i in range(min(buckets), max(buckets) + 1):
+            low = 0 if i == 0 else 1 << (i - 1)
+            count = buckets.get(i, 0)
+            lines.append("\t%10d - %-10d%s %8d %s" % (low, (1 << i) - 1, unit, count, "#" * round(40 * count / most)))
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        s = "Profile:\n"
+        s += "\t%-36s %10s %10s %10s %12s\n" % ("Phase", "Calls", "Seconds", "Self", "Us per call")
+        for name, (calls, seconds, selfSeconds) in sorted(self.getPhases().items(), key=lambda item: -item[1][1]):
+            s += "\t%-36s %10d %10.3f %10.3f %12.2f\n" % (name, calls, seconds, selfSeconds, 1e6 * seconds / calls)
+        if len(self.cycleTimes) > 0:
+            s += "Scheduling cycles: %d, pods examined: %d\n" % (len(self.cycleTimes), sum(self.cyclePods))
+            s += "Cycle latency:\n" + self.getHistogramStr([t * 1e6 for t in self.cycleTimes], "us") + "\n"
+            s += "Pods examined per cycle:\n" + self.getHistogramStr(self.cyclePods, "") + "\n"
+        return s
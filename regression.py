@@ -0,0 +1,321 @@
+import getopt, os, random, re, subprocess, sys, tempfile
+
+import global_, node_table, simulator, trace_sink, workload_file
+from nodes import Node, NodeList, NodeListByFF
+from pods import Pod, PodList, State
+from schedulers import Scheduler
+
+# Checks that the simulator options give the same runs as its default path
+# Every run is a new simulator.py process with the random module seeded, made once from the pod file and once restored
+# from a checkpoint taken halfway with a few larger nodes added, and its summary and -e trace are compared with those of the default path
+# The generated workload is built so the paths the options change are all taken:
+#   pods arrive in bursts, so the queue gets long and each scheduling cycle matches many pods
+#   every node has fewer gpus than the largest pods, those are rejected and readmitted once the larger nodes join
+#   pods keep failing to fit while the cluster is full, so the unschedulable cache is used
+#   wide nodes run many GPU-less pods, more than maxExactCandidates, small ones fewer, so both ways of planVictims are used
+# Before that, checkFirstFit compares the FF node scheduler and getFirstFit with a scan of the node list
+# checkPlanVictims checks a busy node where the greedy pass alone would not take the fewest pods
+# checkWorkloadColumns reads the -b conversions of the generated files with getColumn
+# and checkFork runs a simulation stopped halfway on, as a clone and in a forked child, the child tracing to a file of its own
+
+columns = ("sched", "options", "rejected", "readmitted", "preempted", "result")
+
+allScheds = ("FCFS", "SRTF:1", "SRF:1", "RR:1:200", "PRIO:1:200:4", "DRF:1", "Lottery:1")
+allOptions = ("-a", "-c", "-l", "-b", "-a -b -c")
+
+fleet = [("small", 4, 1, 8, 0.6), ("wide", 192, 3, 384, 0.4)] # Shape, cpu, gpu, ram and share of the nodes
+extraFleet = [("huge", 64, 8, 64, 1.0)] # Added at the checkpoint, every pod fits it
+podRanges = ((1, 16), (0, 4), (1, 32)) # cpu, gpu and ram of the pods, the pods_mix ranges, more gpus than every node
+meanBurst = 16 # Pods arriving together
+
+repoDir = os.path.dirname(os.path.abspath(__file__))
+
+def genNodes(path: str, prefix: str, count: int, shapes: list, rng: random.Random) -> None:
+    # Node file with each shape's share of count nodes, in random order
+    rows = []
+    for _, cpu, gpu, ram, share in shapes:
+        rows += [(cpu, gpu, ram)] * round(count * share)
+    rng.shuffle(rows)
+    with open(path, 'w') as f:
+        f.write("nodeName cpu gpu ram\n")
+        f.write("\n".join("%s%d %d %d %d" % ((prefix, i) + row) for i, row in enumerate(rows)))
+
+def genPods(path: str, count: int, nodes: int, rng: random.Random) -> None:
+    # Pod file sorted by arrival time, bursts of about meanBurst pods and about nodes / 10 pods per second
+    users = ["user%d" % (i) for i in range(20)]
+    tickets = {user: rng.randint(1, 10) * 10 for user in users}
+    rows = []
+    time = 0
+    while len(rows) < count:
+        for _ in range(min(rng.randint(1, 2*meanBurst - 1), count - len(rows))):
+            user = rng.choice(users)
+            cpu, gpu, ram = [rng.randint(low, high) for low, high in podRanges]
+            rows.append("%s pod%d %d %d %d %d %d %d %d" % (user, len(rows), time, rng.randint(100, 1000), rng.randint(1, 4),
+                tickets[user], cpu, gpu, ram))
+        time += rng.randint(0, 2*meanBurst*10 // nodes)
+    with open(path, 'w') as f:
+        f.write("UserName podName arrivalTime work prio tickets cpu gpu ram\n")
+        f.write("\n".join(rows))
+
+def genWorkload(workDir: str, pods: int, nodes: int, seed: int) -> tuple:
+    # Pod file, node file and the node file added at the checkpoint, arrivals go on past the checkpoint
+    pfile = os.path.join(workDir, "pods.txt")
+    nfile = os.path.join(workDir, "nodes.txt")
+    xfile = os.path.join(workDir, "extra_nodes.txt")
+    rng = random.Random(seed)
+    genPods(pfile, pods, nodes, rng)
+    genNodes(nfile, "node", nodes, fleet, rng)
+    genNodes(xfile, "extra", 2, extraFleet, rng)
+    return pfile, nfile, xfile
+
+def checkFirstFit(seed: int, steps: int = 2000) -> str:
+    # getFirstFit against a scan of the node list, and FF with and without -a, while pods come and go on a mixed cluster
+    rng = random.Random(seed)
+    shapes = [(4, 1, 8), (192, 3, 384), (64, 8, 64)]
+    nodeLists = [NodeListByFF(), NodeListByFF()]
+    nodeLists[1].enableTable()
+    for i in range(100):
+        cpu, gpu, ram = rng.choice(shapes)
+        for nodeList in nodeLists:
+            nodeList.addNode(Node("node%d" % (i), cpu, gpu, ram))
+    running = []
+    for i in range(steps):
+        pod = Pod("user", "pod%d" % (i), 0, 1, rng.randint(1, 64), rng.randint(0, 8), rng.randint(1, 64), 0, 1, State.WAIT, i)
+        nodes = nodeLists[0].nodes
+        fits = [node.name for node in nodes if node.curCpu >= pod.cpu and node.curGpu >= pod.gpu and node.curRam >= pod.ram]
+        firstFit = nodeLists[0].getFirstFit(pod)
+        if (firstFit.name if firstFit else None) != (fits[0] if fits else None):
+            return "differs: getFirstFit"
+        for k in (1, 8):
+            if any([node.name for node in nodeList.getMatch(pod, k)] != fits[:k] for nodeList in nodeLists):
+                return "differs: getMatch k=%d" % (k)
+        if len(fits) > 0:
+            for nodeList in nodeLists:
+                nodeList.nodes[firstFit.index].addPod(pod)
+            running.append((pod, firstFit.index))
+        if len(running) > 0 and rng.random() < 0.5:
+            pod, index = running.pop(rng.randrange(len(running)))
+            for nodeList in nodeLists:
+                nodeList.nodes[index].removePod(pod)
+    return "same"
+
+def checkPlanVictims() -> str:
+    # A busy node, 10 candidates is more than maxExactCandidates, where one large pod is enough
+    # The greedy pass alone would take many small cheap ones
+    node = Node("busy", 29, 0, 64)
+    candidates = [Pod("user", "t%d" % (i), 0, 100, 1, 0, 1, 0, 1, State.RUN, i) for i in range(7)]
+    candidates += [Pod("user", name, 0, 100, cpu, 0, 1, 1, 1, State.RUN, 7 + i) for i, (name, cpu) in enumerate((("a", 6), ("b", 6), ("c", 10)))]
+    for pod in candidates:
+        node.addPod(pod)
+        pod.node = node
+    highPrioPod = Pod("user", "high", 0, 100, 10, 0, 1, 2, 1, State.WAIT, len(candidates))
+    victims = Scheduler("PRIO").planVictims(node, candidates, highPrioPod, len(candidates))
+    names = [pod.name for pod in victims or []]
+    return "same" if names == ["c"] else "differs: " + ",".join(names)
+
+def checkWorkloadColumns(files: tuple) -> str:
+    # Columns of the -b conversions of the pod and node files, read with getColumn and from the text file
+    for path, kind in zip(files[:2], ("pods", "nodes")):
+        workload = workload_file.Workload(workload_file.getCached(path, kind))
+        with open(path, 'r') as f:
+            rows = [line.split() for line in f.readlines()[1:] if line.strip() != ""]
+        names = workload_file.podColumns if kind == "pods" else workload_file.nodeColumns
+        for i, name in enumerate(names):
+            values = workload.getColumn(name).tolist()
+            if name.endswith("Ids"):
+                values = [workload.getString(id) for id in values]
+            if values != [row[i] if name.endswith("Ids") else int(row[i]) for row in rows]:
+                return "differs: %s %s" % (kind, name)
+    return "same"
+
+def getSummary(mySim: simulator.Simulation) -> str:
+    mySim.podList.calcAvgJct()
+    mySim.podList.calcAvgLatency()
+    mySim.nodeList.calcAvgUtil()
+    return "\n".join((mySim.scheduler.getPodQueueStr(), mySim.podList.getBenchmarkStr(), mySim.nodeList.getAvgUtil()))
+
+def checkFork(files: tuple, checkpointTime: int, seed: int, workDir: str) -> str:
+    # Lottery draws from the random module, a simulation stopped at checkpointTime has to end the same way
+    # when it is run on, run as a clone and run in a forked child
+    # The trace is written on a writer thread, the child's trace has to be the end of this process's one
+    pfile, nfile, _ = files
+    random.seed(seed)
+    mySim = simulator.loadMain(pfile, nfile, simulator.parseSchedulerInfo("Lottery:1"), NodeList(), PodList(),
+        simulator.EventQueue(), False, False, False)
+    traceFile = os.path.join(workDir, "fork.jsonl")
+    childTraceFile = os.path.join(workDir, "fork.child.jsonl")
+    global_.traceSink = trace_sink.openSink(traceFile, True)
+    try:
+        mySim.run(checkpointTime)
+        forkFile = os.path.join(workDir, "fork.txt")
+        def variant(child: simulator.Simulation) -> None:
+            child.run()
+            with open(forkFile, 'w') as f:
+                f.write(getSummary(child))
+        code = mySim.fork(variant, childTraceFile)
+        if code != 0:
+            return "differs: the forked child exited with %d" % (code)
+        myClone = mySim.clone()
+        mySim.run()
+        global_.traceSink.close()
+    finally:
+        global_.traceSink = None
+    myClone.run()
+    expected = getSummary(mySim)
+    with open(forkFile, 'r') as f:
+        summaries = {"fork": f.read(), "clone": getSummary(myClone)}
+    diffs = [name for name in summaries if summaries[name] != expected]
+    with open(traceFile, 'r') as f, open(childTraceFile, 'r') as g:
+        trace, childTrace = f.read(), g.read()
+    if childTrace == "" or len(childTrace) == len(trace) or not trace.endswith(childTrace):
+        diffs.append("trace")
+    return "same" if len(diffs) == 0 else "differs: " + ",".join(diffs)
+
+def runSim(argv: list[str], seed: int, workDir: str) -> str:
+    # Output of simulator.py argv, run in workDir by a new process that seeds the random module first
+    code = "import random, sys, simulator; random.seed(%d); simulator.main(sys.argv[1:])" % (seed)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (repoDir, os.environ.get("PYTHONPATH")))))
+    proc = subprocess.run([sys.executable, "-c", code] + argv, cwd=workDir, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return proc.stdout # The simulator exits on errors, the message is in the output
+
+def runCase(sched: str, options: str, files: tuple, checkpointTime: int, seed: int, workDir: str) -> dict:
+    # Summaries and traces of a run from the pod file and of the run restored from its checkpoint
+    pfile, nfile, xfile = files
+    tag = "".join(c for c in sched + options if c.isalnum())
+    checkpoint = os.path.join(workDir, tag + ".ckpt")
+    traces = [os.path.join(workDir, tag + ".jsonl"), os.path.join(workDir, tag + ".restored.jsonl")]
+    flags = options.split()
+    result = dict()
+    result["summary"] = runSim(flags + ["-p", pfile, "-n", nfile, "-s", sched, "-k", "%d:%s" % (checkpointTime, checkpoint),
+        "-e", traces[0]], seed, workDir)
+    # The restored run keeps the scheduler and pods of the checkpoint, -l and -c only matter when loading the pod file
+    restoreFlags = [flag for flag in flags if flag not in ("-l", "-c")]
+    result["restored"] = runSim(restoreFlags + ["-r", checkpoint, "-n", xfile, "-e", traces[1]], seed, workDir)
+    for name, path in zip(("trace", "restoredTrace"), traces):
+        with open(path, 'r') as f:
+            result[name] = f.read()
+    return result
+
+def getRejected(summary: str) -> set[str]:
+    # Pods of the "Larger than every node" line of a summary
+    match = re.search(r"Larger than every node: Rejected\[\d+\]: (.*)", summary)
+    return set(match.group(1).split()) if match else set()
+
+def getCoverage(result: dict) -> tuple:
+    # Rejected pods, the ones of them that ran after the larger nodes joined, and the preemptions of the restored run
+    rejected = getRejected(result["summary"])
+    readmitted = rejected - getRejected(result["restored"])
+    preempted = result["restoredTrace"].count('"kind": "PREEMPT"')
+    return len(rejected), len(readmitted), preempted
+
+def compare(result: dict, expected: dict) -> str:
+    # Parts of result that are not the same as in the default path
+    diffs = [name for name in expected if result[name] != expected[name]]
+    return "same" if len(diffs) == 0 else "differs: " + ",".join(diffs)
+
+def getTableStr(rows: list[tuple]) -> str:
+    widths = [max(len(str(row[i])) for row in [columns] + rows) for i in range(len(columns))]
+    return "".join("  ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip() + "\n"
+        for row in [columns] + rows)
+
+def userCallHelper():
+    print('regression.py -h -s <scheduler,...> -o <options,...> -z <pods:nodes> -r <seed> -g <dir>')
+    print('Runs each pod scheduler with and without the simulator options and checks the runs are the same')
+    print('Compares the summary and the -e trace, of a run from the pod file and of one restored from its checkpoint with larger nodes added')
+    print('Also checks the FF node scheduler against a scan of the node list, with and without -a')
+    print('and that planVictims takes the fewest pods on a node with more than maxExactCandidates candidates')
+    print('and that the -b conversions read the same with getColumn as from the text file')
+    print('and that a simulation stopped halfway ends the same when run on, cloned or forked, also traced on a writer thread')
+    print('-s pod schedulers, default %s' % (",".join(allScheds)))
+    print('-o options, each compared with the default path, e.g. "-a,-a -c", default %s' % (",".join(allOptions)))
+    print('-z size as pods:nodes, default 300:10')
+    print('-r seed for the generated workload and the random module, default 0')
+    print('-g keeps the generated workload, its -b conversions, checkpoints and traces in dir, default a temp dir')
+
+def main(argv):
+    scheds = list(allScheds)
+    optionsList = list(allOptions)
+    pods, nodes = 300, 10
+    seed = 0
+    workDir = ''
+
+    try:
+        opts, args = getopt.getopt(argv, "hs:o:z:r:g:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    try:
+        for opt, arg in opts:
+            if opt == "-h":
+                userCallHelper()
+                sys.exit(1)
+            elif opt == "-s":
+                scheds = arg.split(",")
+            elif opt == "-o":
+                optionsList = arg.split(",")
+            elif opt == "-z":
+                podCount, nodeCount = arg.split(":")
+                pods, nodes = int(podCount), int(nodeCount)
+            elif opt == "-r":
+                seed = int(arg)
+            elif opt == "-g":
+                workDir = arg
+    except ValueError:
+        print('Invalid value for %s: %s' % (opt, arg))
+        sys.exit(1)
+
+    if node_table.np is None:
+        print('regression.py needs numpy for -a, exiting')
+        sys.exit(1)
+    if pods < 1 or nodes < 1:
+        print('The workload needs at least one pod and one node')
+        sys.exit(1)
+    for sched in scheds:
+        if simulator.parseSchedulerInfo(sched) == None:
+            print('Invalid scheduler: %s' % (sched))
+            sys.exit(1)
+
+    tmpDir = None
+    if workDir == "":
+        tmpDir = tempfile.TemporaryDirectory()
+        workDir = tmpDir.name
+    workDir = os.path.abspath(workDir)
+    os.makedirs(workDir, exist_ok=True)
+    workload_file.cacheDir = os.path.join(workDir, ".workload_cache") # The simulator runs in workDir, its -b conversions go there too
+    firstFit = checkFirstFit(seed)
+    print("First fit: %s" % (firstFit))
+    planVictims = checkPlanVictims()
+    print("Busy node victims: %s" % (planVictims))
+    failed = firstFit != "same" or planVictims != "same"
+
+    files = genWorkload(workDir, pods, nodes, seed)
+    workloadColumns = checkWorkloadColumns(files)
+    print("Binary workload columns: %s" % (workloadColumns))
+    failed = failed or workloadColumns != "same"
+    checkpointTime = pods * 5 // nodes # Half of the arrival time
+    fork = checkFork(files, checkpointTime, seed, workDir)
+    print("Fork and clone: %s" % (fork))
+    failed = failed or fork != "same"
+    rows = []
+    for sched in scheds:
+        expected = runCase(sched, "", files, checkpointTime, seed, workDir)
+        coverage = getCoverage(expected)
+        # A workload that does not reject, readmit and preempt does not check those paths
+        covered = min(coverage) > 0 or not simulator.parseSchedulerInfo(sched).isPreemptive and min(coverage[:2]) > 0
+        rows.append((sched, "default") + coverage + ("baseline" if covered else "workload does not cover it",))
+        failed = failed or not covered
+        for options in optionsList:
+            status = compare(runCase(sched, options, files, checkpointTime, seed, workDir), expected)
+            rows.append((sched, options) + coverage + (status,))
+            failed = failed or status != "same"
+        print("%s done" % (sched), file=sys.stderr)
+
+    print(getTableStr(rows), end="")
+    if tmpDir != None:
+        tmpDir.cleanup()
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
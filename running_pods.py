@@ -0,0 +1,108 @@
+from bisect import insort
+from pods import *
+
+
+class RunningPods:
+    # Pods currently running in nodes, iterated by higher prio first then in the order they were added
+    # Same order as inserting each pod before the first pod with a lower prio
+    # One insertion ordered dict per prio gives O(1) add and remove by pod identity
+    # Pods that can still be preempted are also indexed by node then prio, used to find preemption victims
+    # without scanning every running pod
+    def __init__(self) -> None:
+        self.byPrio = dict() # prio -> dict of pod -> None
+        self.prios = [] # Negated prios that have pods, sorted
+        self.size = 0
+
+        # Only pods that can still be preempted, markPreempted takes a pod out
+        self.byNode = dict() # node -> prio -> dict of pod -> None
+        self.nodeSums = dict() # node -> prio -> [cpu, gpu, ram] of those pods
+        self.nodesByPrio = dict() # prio -> dict of node -> number of pods of that prio on it
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        for prio in self.prios:
+            yield from self.byPrio[-prio]
+
+    def __contains__(self, pod: Pod) -> bool:
+        return pod in self.byPrio.get(pod.prio, ())
+
+    def add(self, pod: Pod) -> None:
+        # pod.node must be set
+        pods = self.byPrio.get(pod.prio)
+        if pods is None:
+            pods = self.byPrio[pod.prio] = dict()
+            self.nodesByPrio[pod.prio] = dict()
+            insort(self.prios, -pod.prio) # O(number of prios), there are few of them
+        pods[pod] = None
+        self.size += 1
+
+        self.byNode.setdefault(pod.node, dict()).setdefault(pod.prio, dict())[pod] = None
+        sums = self.nodeSums.setdefault(pod.node, dict()).setdefault(pod.prio, [0, 0, 0])
+        sums[0] += pod.cpu
+        sums[1] += pod.gpu
+        sums[2] += pod.ram
+        nodes = self.nodesByPrio[pod.prio]
+        nodes[pod.node] = nodes.get(pod.node, 0) + 1
+
+    def markPreempted(self, pod: Pod) -> None:
+        # Pod is on its way out, it is no longer a preemption candidate
+        nodePrios = self.byNode[pod.node]
+        del nodePrios[pod.prio][pod]
+        sums = self.nodeSums[pod.node][pod.prio]
+        sums[0] -= pod.cpu
+        sums[1] -= pod.gpu
+        sums[2] -= pod.ram
+        if len(nodePrios[pod.prio]) == 0:
+            del nodePrios[pod.prio]
+            del self.nodeSums[pod.node][pod.prio]
+            if len(nodePrios) == 0:
+                del self.byNode[pod.node]
+                del self.nodeSums[pod.node]
+        nodes = self.nodesByPrio[pod.prio]
+        nodes[pod.node] -= 1
+        if nodes[pod.node] == 0:
+            del nodes[pod.node]
+
+    def remove(self, pod: Pod) -> None:
+        # KeyError if the pod is not running, pod.node must still be set
+        if pod in self.byNode.get(pod.node, {}).get(pod.prio, ()):
+            self.markPreempted(pod)
+
+        pods = self.byPrio[pod.prio]
+        del pods[pod]
+        self.size -= 1
+        if len(pods) == 0:
+            del self.byPrio[pod.prio]
+            del self.nodesByPrio[pod.prio]
+            self.prios.remove(-pod.prio)
+
+    def getNodesBelow(self, prio: int) -> list:
+        # Nodes running at least one pod with a lower prio than prio, O(candidate nodes)
+        nodes = dict() # Used as an ordered set
+        for negPrio in reversed(self.prios):
+            if -negPrio >= prio:
+                break
+            nodes.update(self.nodesByPrio[-negPrio])
+        return list(nodes)
+
+    def getNodeSumsBelow(self, node, prio: int) -> list[int]:
+        # [cpu, gpu, ram] of the pods running on node with a lower prio than prio
+        total = [0, 0, 0]
+        for p, sums in self.nodeSums.get(node, {}).items():
+            if p < prio:
+                total[0] += sums[0]
+                total[1] += sums[1]
+                total[2] += sums[2]
+        return total
+
+    def getNodePodsBelow(self, node, prio: int) -> list[Pod]:
+        # Pods running on node with a lower prio than prio, lowest prio first
+        nodePrios = self.byNode.get(node, {})
+        pods = []
+        for p in sorted(nodePrios):
+            if p >= prio:
+                break
+            pods.extend(nodePrios[p])
+        return pods
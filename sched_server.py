@@ -0,0 +1,334 @@
+import asyncio, getopt, json, sys, time
+
+import simulator
+from pods import *
+from nodes import *
+from schedulers import *
+from metrics import Metric
+
+# Scheduling service, drives a Scheduler and a NodeList with pods submitted over a socket instead of a pod file
+# Clients send newline delimited json, one request per line
+#   {"op": "submit", "pod": <name>, "user": <user>, "cpu": 1, "gpu": 0, "ram": 2, "work": 100, "prio": 1, "tickets": 10}
+#     user, work, prio and tickets are optional, work is what SRTF sorts by, the pod runs until its done
+#   {"op": "done", "pod": <name>}  a running pod finished, its node gets the resource back
+#   {"op": "stats"}
+# and get back, on the connection that submitted the pod
+#   {"op": "bind", "pod": <name>, "node": <node>}  the pod runs on that node from now on
+#   {"op": "preempt", "pod": <name>, "node": <node>}  a higher prio pod needs its place, it has the grace period to finish
+#   {"op": "evict", "pod": <name>, "node": <node>}  it did not finish in time, it is off its node and queued again
+#   {"op": "reject", "pod": <name>}  the pod is larger than every node
+#   {"op": "done", "pod": <name>}  the done of the pod went through
+#   {"op": "error", "pod": <name>, "error": <message>}  pod is there when the request had one
+#   {"op": "stats", ...}
+# Requests are applied as they come in, the first one since the last scheduling cycle starts a timer and
+# everything that came in until it fires is scheduled by one cycle
+# Time is whole seconds since the service started, it is what the scheduler sees as the arrival time of a pod
+
+podFields = ("cpu", "gpu", "ram", "work", "prio", "tickets")
+podDefaults = {"gpu": 0, "work": 1, "prio": 1, "tickets": 1}
+
+class SchedulingService:
+    def __init__(self, myScheduler: Scheduler, myNodeList: NodeList, window: float, grace: float) -> None:
+        self.scheduler = myScheduler
+        self.nodeList = myNodeList
+        self.window = window # Seconds from the first request of a batch to its scheduling cycle
+        self.grace = grace # Seconds a preempted pod keeps running, 30 in the simulator
+        self.evictions = dict() # Preempted pod -> timer evicting it
+        self.podList = StreamedPodList() # Pods that were submitted and are not done
+        self.pods = dict() # name -> pod, same pods
+        self.writers = dict() # pod -> writer of the connection that submitted it
+        self.queuedAt = dict() # pod -> perf_counter when it was submitted or preempted, until it is bound
+        self.cycleHandle = None # Timer of the next scheduling cycle, None if there is none
+        self.startTime = time.monotonic()
+
+        # Decision stats
+        self.submitted = 0
+        self.bound = 0
+        self.preempted = 0
+        self.evicted = 0
+        self.rejected = 0
+        self.done = 0
+        self.cycles = 0
+        self.bindMs = Metric() # From submission, or preemption, to the cycle that bound the pod
+        self.cycleMs = Metric() # Time of one scheduling cycle
+        self.cyclePods = Metric() # Pods bound by one cycle
+
+    def getTime(self) -> int:
+        return int(time.monotonic() - self.startTime)
+
+    def send(self, writer, msg: dict) -> None:
+        if writer is not None and not writer.is_closing():
+            writer.write(json.dumps(msg).encode() + b"\n")
+
+    def submit(self, request: dict, writer) -> None:
+        name = request.get("pod")
+        if not isinstance(name, str) or name in self.pods:
+            self.send(writer, {"op": "error", "pod": name, "error": "submit needs a pod name that is not in use, got %s" % (name)})
+            return
+        try:
+            values = [int(request[field]) if field in request else podDefaults[field] for field in podFields]
+        except (KeyError, ValueError, TypeError):
+            self.send(writer, {"op": "error", "pod": name, "error": "submit needs cpu and ram, and whole numbers for %s" % (", ".join(podFields))})
+            return
+        cpu, gpu, ram, work, prio, tickets = values
+        if min(cpu, gpu, ram, tickets) < 0 or work < 1 or not 1 <= prio <= self.scheduler.maxprio:
+            self.send(writer, {"op": "error", "pod": name, "error": "pod %s needs resource of at least 0, work of at least 1 and prio from 1 to %d"
+                % (name, self.scheduler.maxprio)})
+            return
+        if not fitsShape(self.nodeList.shapes, cpu, gpu, ram):
+            self.rejected += 1
+            self.send(writer, {"op": "reject", "pod": name})
+            return
+
+        currentTime = self.getTime()
+        pod = self.podList.createPod(str(request.get("user", "")), name, currentTime, work, cpu, gpu, ram, prio, tickets, State.WAIT)
+        self.pods[name] = pod
+        self.writers[pod] = writer
+        self.queuedAt[pod] = time.perf_counter()
+        self.submitted += 1
+        self.scheduler.addToQueue(pod)
+        self.scheduleCycle()
+
+    def finish(self, request: dict, writer) -> None:
+        # Same as a TO_TERM event of the simulator
+        # A pod preempted by a cycle that ran before its done came in is not running, the client gets an error
+        # and a bind once the pod is scheduled again
+        name = request.get("pod")
+        pod = self.pods.get(name)
+        if pod is None or pod.state != State.RUN:
+            self.send(writer, {"op": "error", "pod": name, "error": "done needs a running pod, got %s" % (name)})
+            return
+        currentTime = self.getTime()
+        self.nodeList.updateClusterInfo(currentTime)
+        pod.state = State.TERM
+        pod.stateTS = currentTime
+        pod.finishTime = currentTime
+        self.scheduler.rmFromRunList(pod)
+        node = pod.node
+        pod.node = None
+        node.removePod(pod)
+        if self.scheduler.name == "DRF":
+            self.scheduler.update_res_shares(pod)
+        eviction = self.evictions.pop(pod, None)
+        if eviction is not None: # Finished within the grace period
+            eviction.cancel()
+        del self.pods[pod.name]
+        del self.writers[pod]
+        self.podList.podDone(pod)
+        self.done += 1
+        self.send(writer, {"op": "done", "pod": name})
+        self.scheduleCycle()
+
+    def scheduleCycle(self) -> None:
+        if self.cycleHandle is None:
+            self.cycleHandle = asyncio.get_running_loop().call_later(self.window, self.runCycle)
+
+    def runCycle(self) -> None:
+        # One schedulePods call over everything that came in since the last one
+        self.cycleHandle = None
+        currentTime = self.getTime()
+        self.nodeList.updateClusterInfo(currentTime)
+        start = time.perf_counter()
+        scheduledPods, preemptedPods = self.scheduler.schedulePods(self.nodeList)
+        end = time.perf_counter()
+        self.cycles += 1
+        self.cycleMs.add((end - start) * 1000)
+        self.cyclePods.add(len(scheduledPods))
+
+        for pod in scheduledPods:
+            # Same as a TO_RUN event of the simulator, the pod runs until it is done
+            pod.state = State.RUN
+            if pod.execStartTime == -1:
+                pod.execStartTime = currentTime
+            pod.totalWaitTime += currentTime - pod.stateTS
+            pod.stateTS = currentTime
+            self.scheduler.addToRunList(pod)
+            self.bindMs.add((end - self.queuedAt.pop(pod)) * 1000)
+            self.bound += 1
+            self.send(self.writers[pod], {"op": "bind", "pod": pod.name, "node": pod.node.name})
+
+        loop = asyncio.get_running_loop()
+        for pod in preemptedPods:
+            # Keeps running for the grace period, like the simulator
+            self.evictions[pod] = loop.call_later(self.grace, self.evict, pod)
+            self.preempted += 1
+            self.send(self.writers[pod], {"op": "preempt", "pod": pod.name, "node": pod.node.name})
+
+        if len(scheduledPods) > 0:
+            # Like the simulator, running a pod is an event that the next cycle can act on
+            self.scheduleCycle()
+
+    def evict(self, pod: Pod) -> None:
+        # Same as a TO_PREEMPT event of the simulator
+        del self.evictions[pod]
+        currentTime = self.getTime()
+        self.nodeList.updateClusterInfo(currentTime)
+        node = pod.node
+        pod.state = State.PREEMPT
+        pod.stateTS = currentTime
+        pod.dynamicPrio -= 1
+        pod.preempted = False
+        self.scheduler.rmFromRunList(pod)
+        pod.node = None
+        node.removePod(pod)
+        self.scheduler.addToQueue(pod)
+        self.queuedAt[pod] = time.perf_counter()
+        self.evicted += 1
+        self.send(self.writers[pod], {"op": "evict", "pod": pod.name, "node": node.name})
+        self.scheduleCycle()
+
+    def getStats(self) -> dict:
+        def getQuantiles(metric: Metric) -> dict:
+            if metric.stats.count == 0:
+                return {}
+            return {"mean": metric.stats.mean, "std": metric.stats.getStd(), "p50": metric.quantile(0.5), "p95": metric.quantile(0.95),
+                "p99": metric.quantile(0.99), "max": metric.stats.max}
+
+        return {"op": "stats", "submitted": self.submitted, "bound": self.bound, "preempted": self.preempted, "evicted": self.evicted,
+            "rejected": self.rejected, "done": self.done, "queued": self.scheduler.getQueueLength(),
+            "running": len(self.scheduler.runningPods), "cycles": self.cycles,
+            "bindMs": getQuantiles(self.bindMs), "cycleMs": getQuantiles(self.cycleMs), "cyclePods": getQuantiles(self.cyclePods)}
+
+    async def serve(self, reader, writer) -> None:
+        # One client connection, its pods keep their nodes after it closes
+        while True:
+            try:
+                line = await reader.readline()
+            except ConnectionError:
+                break
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                op = request.get("op")
+            except (ValueError, AttributeError):
+                self.send(writer, {"op": "error", "error": "every line has to be a json object"})
+                continue
+            if op == "submit":
+                self.submit(request, writer)
+            elif op == "done":
+                self.finish(request, writer)
+            elif op == "stats":
+                self.send(writer, self.getStats())
+            else:
+                self.send(writer, {"op": "error", "error": "unknown op %s, use submit, done or stats" % (op)})
+            await writer.drain()
+        writer.close()
+
+    def __repr__(self) -> str:
+        s = "Scheduling Service: %s\n" % (self.scheduler)
+        s += "\tSubmitted: %d, Bound: %d, Preempted: %d, Evicted: %d, Rejected: %d, Done: %d, Queued: %d, Cycles: %d\n" \
+            % (self.submitted, self.bound, self.preempted, self.evicted, self.rejected, self.done, self.scheduler.getQueueLength(), self.cycles)
+        s += "\t%-12s %10s %10s %10s %10s %10s %10s\n" % ("", "mean", "std", "p50", "p95", "p99", "max")
+        s += "\t%-12s %s\n" % ("Bind ms", self.bindMs.getStr())
+        s += "\t%-12s %s\n" % ("Cycle ms", self.cycleMs.getStr())
+        s += "\t%-12s %s" % ("Cycle pods", self.cyclePods.getStr())
+        return s
+
+async def startServer(service: SchedulingService, address: str, socketPath: str):
+    if socketPath != "":
+        return await asyncio.start_unix_server(service.serve, path=socketPath)
+    host, port = address.rsplit(":", 1)
+    return await asyncio.start_server(service.serve, host, int(port))
+
+async def runServer(service: SchedulingService, address: str, socketPath: str, interval: float) -> None:
+    server = await startServer(service, address, socketPath)
+    print("Listening on %s" % (socketPath if socketPath != "" else address))
+    sys.stdout.flush()
+    async with server:
+        if interval <= 0:
+            await server.serve_forever()
+        while True:
+            await asyncio.sleep(interval)
+            print(service)
+            sys.stdout.flush()
+
+def userCallHelper():
+    print('sched_server.py -h -a -l <host>:<port> -u <socket path> -n <nodes.txt> -s <scheduler> -d <node scheduler> -w <window ms> -g <grace> -i <interval>')
+    print('Serves a pod scheduler over newline delimited json, see the top of sched_server.py for the messages')
+    print('-l tcp address, default 127.0.0.1:7070, -u listens on a unix socket instead')
+    print('-n node file of the cluster, text or binary')
+    print('-s pod scheduler and -d node scheduler, same as simulator.py')
+    print('-w milliseconds requests are batched for before a scheduling cycle, default 10')
+    print('-g seconds a preempted pod has to finish before it is evicted and queued again, default 30 like the simulator')
+    print('-i prints the decision stats every interval seconds, they are always printed on exit')
+    print('-a for array backed node matching (needs numpy)')
+
+def main(argv):
+    address = "127.0.0.1:7070"
+    socketPath = ''
+    nfile = ''
+    myScheduler = None
+    myNodeList = NodeList()
+    window = 10
+    grace = 30
+    interval = 0
+    useTable = False
+
+    try:
+        opts, args = getopt.getopt(argv, "hal:u:n:s:d:w:g:i:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    try:
+        for opt, arg in opts:
+            if opt == "-h":
+                userCallHelper()
+                sys.exit(1)
+            elif opt == "-l":
+                address = arg
+            elif opt == "-u":
+                socketPath = arg
+            elif opt == "-n":
+                nfile = arg
+            elif opt == "-s":
+                myScheduler = simulator.parseSchedulerInfo(arg)
+            elif opt == "-d":
+                myNodeList = simulator.parseNodeListInfo(arg)
+            elif opt == "-w":
+                window = float(arg)
+            elif opt == "-g":
+                grace = float(arg)
+            elif opt == "-i":
+                interval = float(arg)
+            elif opt == "-a":
+                useTable = True
+    except ValueError:
+        print('Invalid value for %s: %s' % (opt, arg))
+        sys.exit(1)
+
+    if nfile == "":
+        print('Missing node file, exiting')
+        sys.exit(1)
+    if myScheduler == None:
+        print('Missing scheduler or used invalid name')
+        sys.exit(1)
+    if myNodeList == None:
+        print('Missing node list or used invalid name')
+        sys.exit(1)
+    if window < 0 or grace < 0:
+        print('The batching window and the grace period cannot be negative')
+        sys.exit(1)
+    if useTable:
+        try:
+            myNodeList.enableTable()
+        except ImportError:
+            print('Array backed node matching needs numpy, exiting')
+            sys.exit(1)
+
+    # The service runs for as long as it is up, the logs would keep growing
+    myNodeList.disableLogs()
+    simulator.loadNodeFile(nfile, myNodeList)
+    if myScheduler.name == "DRF":
+        myScheduler.calculate_tot_resources(myNodeList)
+
+    service = SchedulingService(myScheduler, myNodeList, window / 1000, grace)
+    try:
+        asyncio.run(runServer(service, address, socketPath, interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(service)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
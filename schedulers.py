@@ -1,19 +1,27 @@
 from collections import deque
+from itertools import combinations
 from typing import Tuple
 from pods import *
 from nodes import *
+from pod_queue import PodQueue, FairShareQueue, UserQueues
+from fenwick_tree import FenwickTree
+from running_pods import RunningPods
 from sys import exit
 import global_
 import random
 
+maxExactCandidates = 8 # Above this many candidates on a node, planVictims only tries 1 and 2 victims before the greedy pass
+
 class Scheduler:
     def __init__(self, name: str, quantum: int = 10000, maxprio: int = 4, preemptive: bool = False) -> None:
         self.quantum = quantum
         self.maxprio = maxprio
         self.isPreemptive = preemptive
-        self.runningPods = [] # Pods currently running in nodes
+        self.runningPods = RunningPods() # Pods currently running in nodes, by prio
         self.podQueue = deque() # Pods in the queue waiting to be scheduled
         self.name = name
+        self.unschedulable = dict() # Pod id -> release epoch when it did not fit any node, see matchPod
+        self.rejectedPods = [] # Pods bigger than every node, never queued, see admit
     
     def addToQueue(self, pod: Pod) -> None:
         # Adds Pod to queue
@@ -28,36 +36,115 @@ class Scheduler:
         exit(1)
 
     def rmFromRunList(self, pod: Pod) -> None:
-        index = 0
-        while index < len(self.runningPods):
-            if self.runningPods[index].name == pod.name:
-                break
-            index += 1
-        if index == len(self.runningPods):
+        if pod not in self.runningPods:
             print("Fatal: attempting to remove pod not in runingPods")
             exit(1)
-        self.runningPods.pop(index)
+        self.runningPods.remove(pod)
     
     def addToRunList(self, pod: Pod) -> None:
-        index = 0
-        while index < len(self.runningPods):
-            if self.runningPods[index].prio < pod.prio:
-                break
-            index += 1
-        self.runningPods.insert(index, pod)
+        self.runningPods.add(pod)
     
-    def preemptPod(self, highPrioPod: Pod) -> Pod:
-        if len(self.runningPods) == 0:
+    def admit(self, pod: Pod, myNodeList: NodeList) -> None:
+        # Queues an arriving pod, unless it needs more than any node has even when empty
+        if myNodeList.canEverFit(pod):
+            self.addToQueue(pod)
+            return
+        if global_.qFlag:
+            print("Rejected Pod [%s], larger than every node" % (pod.name))
+        self.rejectedPods.append(pod)
+
+    def readmit(self, myNodeList: NodeList) -> None:
+        # Queues the rejected pods that fit one of the nodes added since
+        rejected = self.rejectedPods
+        self.rejectedPods = [pod for pod in rejected if not myNodeList.canEverFit(pod)]
+        for pod in rejected:
+            if myNodeList.canEverFit(pod):
+                self.addToQueue(pod)
+
+    def getRejectedStr(self) -> str:
+        return "Rejected[%d]: " % (len(self.rejectedPods)) + "".join(pod.name + " " for pod in self.rejectedPods)
+
+    def getCandidates(self, pods: list[Pod], myNodeList: NodeList) -> list[Pod]:
+        # Pods that matchPod would try to match, for the batch matcher
+        unschedulable = self.unschedulable
+        if myNodeList.table is None or len(unschedulable) == 0:
+            return pods # Only a batch over a node table looks at the pods
+        return [pod for pod in pods if pod.id not in unschedulable or myNodeList.mayFitSince(pod, unschedulable[pod.id])]
+
+    def matchPod(self, matcher, pod: Pod, myNodeList: NodeList) -> list[Node]:
+        # matcher.getMatch(pod), without matching a pod that did not fit any node while no release since could fit it
+        # Such a pod would fail again, preemption is still tried for it as what it can preempt changes without releases
+        epoch = self.unschedulable.get(pod.id)
+        if epoch is not None and not myNodeList.mayFitSince(pod, epoch):
+            return []
+        matchedNodes = matcher.getMatch(pod)
+        if len(matchedNodes) == 0:
+            self.unschedulable[pod.id] = myNodeList.releaseEpoch
+        elif epoch is not None:
+            del self.unschedulable[pod.id]
+        return matchedNodes
+
+    def preemptPods(self, highPrioPod: Pod) -> list[Pod]:
+        # Cheapest set of lower prio pods on one node whose resource plus the node's free resource can run highPrioPod
+        # Cost is fewest pods, then lowest prio, then least work done in their current run, then node order
+        # Only nodes running a lower prio pod that is not already preempted are looked at, returns [] if no node works
+        bestCost = None
+        bestVictims = []
+        for node in self.runningPods.getNodesBelow(highPrioPod.prio):
+            cpu, gpu, ram = self.runningPods.getNodeSumsBelow(node, highPrioPod.prio)
+            if node.curCpu + cpu < highPrioPod.cpu or node.curGpu + gpu < highPrioPod.gpu or node.curRam + ram < highPrioPod.ram:
+                continue # Not enough even with every candidate on this node
+            candidates = self.runningPods.getNodePodsBelow(node, highPrioPod.prio)
+            # Plans with more victims than the best one so far cannot win
+            victims = self.planVictims(node, candidates, highPrioPod, len(candidates) if bestCost == None else bestCost[0])
+            if victims == None:
+                continue
+            cost = (len(victims),) + self.getVictimsCost(victims) + (node.index,)
+            if bestCost == None or cost < bestCost:
+                bestCost = cost
+                bestVictims = victims
+
+        for currPod in bestVictims:
+            currPod.preempted = True
+            self.runningPods.markPreempted(currPod)
+        return bestVictims
+
+    def getVictimsCost(self, victims: list[Pod]) -> Tuple[int, int]:
+        return sum(pod.prio for pod in victims), sum(pod.node.currentTime - pod.stateTS for pod in victims)
+
+    def planVictims(self, node: Node, candidates: list[Pod], highPrioPod: Pod, maxVictims: int) -> list[Pod]:
+        # Fewest, then cheapest, candidates that free enough resource on node, None if all of them are not enough
+        # or it takes more than maxVictims
+        # Exact for up to 3 victims on nodes with few candidates and up to 2 on busy ones, else greedy by prio and work
+        # done then drops the ones not needed, so a busy node costs O(k^2) instead of O(k^3) in its k candidates
+        needCpu = highPrioPod.cpu - node.curCpu
+        needGpu = highPrioPod.gpu - node.curGpu
+        needRam = highPrioPod.ram - node.curRam
+        def isEnough(victims: list[Pod]) -> bool:
+            return sum(pod.cpu for pod in victims) >= needCpu \
+                and sum(pod.gpu for pod in victims) >= needGpu \
+                and sum(pod.ram for pod in victims) >= needRam
+
+        if not isEnough(candidates):
+            return None
+        exactSize = 3 if len(candidates) <= maxExactCandidates else 2
+        for size in range(1, min(exactSize, len(candidates), maxVictims) + 1):
+            victims = min((list(c) for c in combinations(candidates, size) if isEnough(c)), key=self.getVictimsCost, default=None)
+            if victims != None:
+                return victims
+        if maxVictims <= exactSize:
             return None
-        for currPod in self.runningPods:
-            if currPod.prio < highPrioPod.prio \
-                and currPod.cpu + currPod.node.curCpu >= highPrioPod.cpu \
-                and currPod.gpu + currPod.node.curGpu >= highPrioPod.gpu \
-                and currPod.ram + currPod.node.curRam >= highPrioPod.ram \
-                and currPod.preempted == False:
-                currPod.preempted = True
-                return currPod
-        return None
+
+        victims = []
+        for currPod in sorted(candidates, key=lambda pod: self.getVictimsCost([pod])):
+            victims.append(currPod)
+            if isEnough(victims):
+                break
+        for currPod in victims[::-1]:
+            rest = [pod for pod in victims if pod is not currPod]
+            if isEnough(rest):
+                victims = rest
+        return victims if len(victims) <= maxVictims else None
     
     def getQueueLength(self) -> int:
         return len(self.podQueue)
@@ -69,16 +156,25 @@ class Scheduler:
         return self.maxprio
     
     def getPodQueueStr(self) -> str:
-        s = "SchedQ[%d]: " % (len(self.podQueue))
-        for i in self.podQueue:
-            s += i.name + " "
-        return s
+        return "SchedQ[%d]: " % (len(self.podQueue)) + "".join(pod.name + " " for pod in self.podQueue)
+
+    def getQueuedPods(self) -> list[Pod]:
+        # Pods waiting to be scheduled, in queue order
+        return list(self.podQueue)
+
+    def takeOver(self, oldScheduler: "Scheduler") -> None:
+        # Continues the work of oldScheduler in the middle of a simulation, see Simulation.setScheduler
+        # Its running pods join the run list and its waiting pods are added to this queue
+        for pod in oldScheduler.runningPods:
+            self.addToRunList(pod)
+            if pod.preempted:
+                self.runningPods.markPreempted(pod)
+        for pod in oldScheduler.getQueuedPods():
+            self.addToQueue(pod)
+        self.rejectedPods.extend(oldScheduler.rejectedPods)
 
     def getRunPodStr(self) -> str:
-        s = "RunningPods[%d]:" % (len(self.runningPods))
-        for i in self.runningPods:
-            s += i.name + " "
-        return s
+        return "RunningPods[%d]:" % (len(self.runningPods)) + "".join(pod.name + " " for pod in self.runningPods)
     
     def __repr__(self) -> str:
         return "Scheduler: %s, Quantum: %d, Maxprio: %d, Preemptive: %s" \
@@ -88,20 +184,15 @@ class FCFS(Scheduler): # First Come First Served
     def __init__(self, preemptive: bool) -> None:
         # Does not care about quantum or maxprio, leaving as some large default
         super().__init__(name="FCFS", preemptive=preemptive)
+        self.podQueue = PodQueue(self.getQueueKey)
+
+    def getQueueKey(self, pod: Pod) -> int:
+        # A method instead of a lambda, so that the queue can be pickled with the scheduler
+        return pod.stateTS
 
     def addToQueue(self, pod: Pod) -> None:
         # Queue needs to be sorted by Pod.stateTS and Pod.prio
-        index = 0
-        while index < len(self.podQueue):
-            if pod.stateTS <= self.podQueue[index].stateTS:
-                break
-            index += 1
-        while index < len(self.podQueue) and pod.stateTS == self.podQueue[index].stateTS:
-            if pod.prio > self.podQueue[index].prio:
-                break
-            index += 1
-        
-        self.podQueue.insert(index, pod)
+        self.podQueue.push(pod)
 
     def schedulePods(self, myNodeList: NodeList) -> Tuple[list[Pod],list[Pod]]:
         if len(self.podQueue) == 0:
@@ -110,11 +201,12 @@ class FCFS(Scheduler): # First Come First Served
         scheduledPods = []
         preemptedPods = []
         notScheduledPods = []
-        currentTime = self.podQueue[0].stateTS
-        while len(self.podQueue) > 0 and self.podQueue[0].stateTS == currentTime:
+        currentTime = self.podQueue.peekKey()
+        matcher = myNodeList.getBatchMatcher(self.getCandidates(self.podQueue.getFront(), myNodeList), 8)
+        while len(self.podQueue) > 0 and self.podQueue.peekKey() == currentTime:
             # Try to schedule all the pods of current time
             currPod = self.podQueue.popleft()
-            matchedNodes = myNodeList.getMatch(currPod, 8)
+            matchedNodes = self.matchPod(matcher, currPod, myNodeList)
             if len(matchedNodes) > 0: # At least one Node can run this pod
                 chosenNode = random.choice(matchedNodes)
                 if global_.qFlag:
@@ -126,12 +218,13 @@ class FCFS(Scheduler): # First Come First Served
             else:
                 # No node can run this pod
                 if self.isPreemptive: # If preemptive, then try removing a pod
-                    preemptedPod = self.preemptPod(currPod)
-                    if preemptedPod != None:
-                        preemptedPods.append(preemptedPod)
-                        if global_.qFlag:
-                            print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
-                                % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
+                    victims = self.preemptPods(currPod)
+                    if len(victims) > 0:
+                        preemptedPods.extend(victims)
+                        for preemptedPod in victims:
+                            if global_.qFlag:
+                                print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
+                                    % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
                     else:
                         if global_.qFlag:
                             print("Unable to Preempt Pods for Pod [%s]" % (currPod.name))
@@ -142,28 +235,23 @@ class FCFS(Scheduler): # First Come First Served
                     if global_.qFlag:
                         print("Unable to Match Pod [%s] with Nodes" % (currPod.name))
     
-        while len(notScheduledPods) > 0:
-            self.addToQueue(notScheduledPods.pop())
+        matcher.close()
+        # Same order as adding them back one by one from the last one
+        self.podQueue.pushAll(notScheduledPods[::-1])
 
         return scheduledPods, preemptedPods
     
 class SRTF(Scheduler): # Shortest Remaining Time First
     def __init__(self, preemptive: bool) -> None:
         super().__init__(name="SRTF", preemptive=preemptive)
+        self.podQueue = PodQueue(self.getQueueKey)
+
+    def getQueueKey(self, pod: Pod) -> int:
+        return pod.remainWork
 
     def addToQueue(self, pod: Pod) -> None: # put smallest usage time 
         # Queue needs to be sorted by Pod.remainingWork and Pod.prio
-        index = 0
-        while index < len(self.podQueue):
-            if pod.remainWork <= self.podQueue[index].remainWork:
-                break
-            index += 1
-        while index < len(self.podQueue) and pod.remainWork == self.podQueue[index].remainWork:
-            if pod.prio > self.podQueue[index].prio:
-                break
-            index += 1
-        
-        self.podQueue.insert(index, pod)
+        self.podQueue.push(pod)
 
     def schedulePods(self, myNodeList: NodeList) -> Tuple[list[Pod],list[Pod]]:
         if len(self.podQueue) == 0:
@@ -172,11 +260,12 @@ class SRTF(Scheduler): # Shortest Remaining Time First
         scheduledPods = []
         preemptedPods = []
         notScheduledPods = []
-        smallestWork = self.podQueue[0].remainWork
-        while len(self.podQueue) > 0 and self.podQueue[0].remainWork == smallestWork:
+        smallestWork = self.podQueue.peekKey()
+        matcher = myNodeList.getBatchMatcher(self.getCandidates(self.podQueue.getFront(), myNodeList), 1)
+        while len(self.podQueue) > 0 and self.podQueue.peekKey() == smallestWork:
             # Try to schedule all the pods of current time
             currPod = self.podQueue.popleft()
-            matchedNodes = myNodeList.getMatch(currPod, 1)
+            matchedNodes = self.matchPod(matcher, currPod, myNodeList)
             if len(matchedNodes) > 0: # At least one Node can run this pod
                 # Not sure how this going to work yet. TODO FIND A BETTER WAY TO PICK CHOSEN NODE
                 chosenNode = matchedNodes[0] # There is only one node here lol
@@ -189,12 +278,13 @@ class SRTF(Scheduler): # Shortest Remaining Time First
             else:
                 # No node can run this pod
                 if self.isPreemptive: # If preemptive, then try removing a pod
-                    preemptedPod = self.preemptPod(currPod)
-                    if preemptedPod != None:
-                        preemptedPods.append(preemptedPod)
-                        if global_.qFlag:
-                            print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
-                                % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
+                    victims = self.preemptPods(currPod)
+                    if len(victims) > 0:
+                        preemptedPods.extend(victims)
+                        for preemptedPod in victims:
+                            if global_.qFlag:
+                                print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
+                                    % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
                     else:
                         if global_.qFlag:
                             print("Unable to Preempt Pods for Pod [%s]" % (currPod.name))
@@ -205,35 +295,23 @@ class SRTF(Scheduler): # Shortest Remaining Time First
                     if global_.qFlag:
                         print("Unable to Match Pod [%s] with Nodes" % (currPod.name))
     
-        while len(notScheduledPods) > 0:
-            self.addToQueue(notScheduledPods.pop())
+        matcher.close()
+        # Same order as adding them back one by one from the last one
+        self.podQueue.pushAll(notScheduledPods[::-1])
 
         return scheduledPods, preemptedPods
 
 class SRF(Scheduler): # Smallest Resource First
     def __init__(self, preemptive: bool) -> None:
         super().__init__(name="SRF", preemptive=preemptive)
+        # Sorted by aggregate resource score then Pod.prio
+        self.podQueue = PodQueue(self.getQueueKey)
 
-    def addToQueue(self, pod: Pod) -> None:
-        index = 0
-        currScore = (pod.cpu)**2 + (pod.gpu)**2 + (pod.ram)**2
-        while index < len(self.podQueue):
-            aggregateScore = (self.podQueue[index].cpu)**2 + (self.podQueue[index].gpu)**2 + (self.podQueue[index].ram)**2
-            if currScore <= aggregateScore:
-                break
-            index += 1
+    def getQueueKey(self, pod: Pod) -> int:
+        return (pod.cpu)**2 + (pod.gpu)**2 + (pod.ram)**2
 
-        while index < len(self.podQueue):
-            aggregateScore = (self.podQueue[index].cpu)**2 + (self.podQueue[index].gpu)**2 + (self.podQueue[index].ram)**2
-            if currScore == aggregateScore:
-                if pod.prio > self.podQueue[index].prio:
-                    break
-                index += 1
-            else:
-                break
-        
-        self.podQueue.insert(index, pod)
-        
+    def addToQueue(self, pod: Pod) -> None:
+        self.podQueue.push(pod)
 
     def schedulePods(self, myNodeList: NodeList) -> Tuple[list[Pod],list[Pod]]:
         if len(self.podQueue) == 0:
@@ -242,13 +320,14 @@ class SRF(Scheduler): # Smallest Resource First
         scheduledPods = []
         preemptedPods = []
         notScheduledPods = []
-        currScore = (self.podQueue[0].cpu)**2 + (self.podQueue[0].gpu)**2 + (self.podQueue[0].ram)**2
+        currScore = self.podQueue.peekKey()
+        matcher = myNodeList.getBatchMatcher(self.getCandidates(self.podQueue.getFront(), myNodeList), 1)
         while len(self.podQueue) > 0:
-            aggregateScore = (self.podQueue[0].cpu)**2 + (self.podQueue[0].gpu)**2 + (self.podQueue[0].ram)**2
+            aggregateScore = self.podQueue.peekKey()
             if currScore == aggregateScore: # Schedule every pod with the same smallest score
                 # Try to schedule all the pods of current time
                 currPod = self.podQueue.popleft()
-                matchedNodes = myNodeList.getMatch(currPod, 1)
+                matchedNodes = self.matchPod(matcher, currPod, myNodeList)
                 if len(matchedNodes) > 0: # At least one Node can run this pod
                     # Not sure how this going to work yet. TODO FIND A BETTER WAY TO PICK CHOSEN NODE
                     chosenNode = matchedNodes[0] # There is only one node here lol
@@ -261,12 +340,13 @@ class SRF(Scheduler): # Smallest Resource First
                 else:
                     # No node can run this pod
                     if self.isPreemptive: # If preemptive, then try removing a pod
-                        preemptedPod = self.preemptPod(currPod)
-                        if preemptedPod != None:
-                            preemptedPods.append(preemptedPod)
-                            if global_.qFlag:
-                                print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
-                                    % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
+                        victims = self.preemptPods(currPod)
+                        if len(victims) > 0:
+                            preemptedPods.extend(victims)
+                            for preemptedPod in victims:
+                                if global_.qFlag:
+                                    print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
+                                        % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
                         else:
                             if global_.qFlag:
                                 print("Unable to Preempt Pods for Pod [%s]" % (currPod.name))
@@ -279,8 +359,9 @@ class SRF(Scheduler): # Smallest Resource First
             else:
                 break
     
-        while len(notScheduledPods) > 0:
-            self.addToQueue(notScheduledPods.pop())
+        matcher.close()
+        # Same order as adding them back one by one from the last one
+        self.podQueue.pushAll(notScheduledPods[::-1])
 
         return scheduledPods, preemptedPods
 
@@ -301,20 +382,26 @@ class PRIO(Scheduler): # Priority scheduling
             self.activeQ.append(deque())
             self.expireQ.append(deque())
     
+    def getQueueLength(self) -> int:
+        return sum(len(q) for q in self.activeQ) + sum(len(q) for q in self.expireQ)
+
+    def getQueuedPods(self) -> list[Pod]:
+        pods = []
+        for q in self.activeQ + self.expireQ:
+            pods.extend(q)
+        return pods
+
     def getPodQueueStr(self) -> str:
-        s = "Prio SchedQ:"
-        s += "\n\tActive Queue:\n"
+        s = ["Prio SchedQ:", "\n\tActive Queue:\n"]
         for q in range(0, len(self.activeQ)):
-            s += "\t\t" + "[%d] " % (q)
-            for i in self.activeQ[q]:
-                s += i.name + " "
+            s.append("\t\t[%d] " % (q))
+            s.extend(pod.name + " " for pod in self.activeQ[q])
         
-        s += "\n\tExpire Queue:\n"
+        s.append("\n\tExpire Queue:\n")
         for q in range(0, len(self.expireQ)):
-            s += "\t\t" + "[%d] " % (q)
-            for i in self.expireQ[q]:
-                s += i.name + " "
-        return s
+            s.append("\t\t[%d] " % (q))
+            s.extend(pod.name + " " for pod in self.expireQ[q])
+        return "".join(s)
 
     def addToQueue(self, pod: Pod) -> None:
         if pod.dynamicPrio == -1: #when dynamic priority reaches -1, add to the expire queue
@@ -328,6 +415,13 @@ class PRIO(Scheduler): # Priority scheduling
         preemptedPods = []
         notScheduledPods = []
 
+        # Every queued pod is tried this cycle, the active queue first then the expire queue
+        candidates = []
+        for q in (self.activeQ, self.expireQ):
+            for i in range(self.maxprio - 1, -1, -1):
+                candidates.extend(q[i])
+        matcher = myNodeList.getBatchMatcher(self.getCandidates(candidates, myNodeList), 8)
+
         while True:
             # Try to get a pod for scheduling
             currPod = None
@@ -350,7 +444,7 @@ class PRIO(Scheduler): # Priority scheduling
 
             # Find a matching pod
             if currPod != None:
-                matchedNodes = myNodeList.getMatch(currPod, 8)
+                matchedNodes = self.matchPod(matcher, currPod, myNodeList)
                 if len(matchedNodes) > 0: # At least one Node can run this pod
                     chosenNode = random.choice(matchedNodes)
                     if global_.qFlag:
@@ -362,12 +456,13 @@ class PRIO(Scheduler): # Priority scheduling
                 else:
                     # No node can run this pod
                     if self.isPreemptive: # If preemptive, then try removing a pod
-                        preemptedPod = self.preemptPod(currPod)
-                        if preemptedPod != None:
-                            preemptedPods.append(preemptedPod)
-                            if global_.qFlag:
-                                print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
-                                    % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
+                        victims = self.preemptPods(currPod)
+                        if len(victims) > 0:
+                            preemptedPods.extend(victims)
+                            for preemptedPod in victims:
+                                if global_.qFlag:
+                                    print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
+                                        % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
                         else:
                             if global_.qFlag:
                                 print("Unable to Preempt Pods for Pod [%s]" % (currPod.name))
@@ -381,6 +476,7 @@ class PRIO(Scheduler): # Priority scheduling
                 # Scheduled all the possible pods
                 break
         
+        matcher.close()
         while notScheduledPods:
             self.addToQueue(notScheduledPods.pop()) # Put the not scheduled pods back into queue
 
@@ -392,48 +488,47 @@ class DRF(Scheduler): # DRF
         self.tot_cpu = 0
         self.tot_gpu = 0
         self.tot_ram = 0
-        self.res_shares = dict() #resource share per user
+        self.res_shares = dict() #resource share per user id
+        self.podQueue = FairShareQueue(self.get_dominant_share) #pods per user, users by current dominant share
 
     def calculate_tot_resources(self, nodelist: NodeList) -> None: #this is called by main only for the DRF before the simulation
         for node in nodelist.nodes:
-            self.tot_cpu += node.cpu
-            self.tot_gpu += node.gpu
-            self.tot_ram += node.ram
+            self.add_node_resources(node)
+
+    def add_node_resources(self, node: Node) -> None: #also called for nodes added in the middle of a simulation
+        self.tot_cpu += node.cpu
+        self.tot_gpu += node.gpu
+        self.tot_ram += node.ram
+
+    def takeOver(self, oldScheduler: Scheduler) -> None:
+        # Running pods count toward their users' shares like the pods placed by this scheduler, preempted ones already gave theirs back
+        for pod in oldScheduler.runningPods:
+            if pod.userId not in self.res_shares:
+                self.res_shares[pod.userId] = [0, 0, 0]
+            if not pod.preempted:
+                self.res_shares[pod.userId][0] += pod.cpu
+                self.res_shares[pod.userId][1] += pod.gpu
+                self.res_shares[pod.userId][2] += pod.ram
+        super().takeOver(oldScheduler)
+
+    def get_dominant_share(self, user: int) -> float:
+        curr_cpu = self.res_shares[user][0]
+        curr_gpu = self.res_shares[user][1]
+        curr_ram = self.res_shares[user][2]
+        gpu_share = curr_gpu / self.tot_gpu if self.tot_gpu > 0 else 0 #a cluster of GPU-less nodes
+        return max(curr_cpu / self.tot_cpu, gpu_share, curr_ram / self.tot_ram)
 
     def update_res_shares(self, pod: Pod) -> None: #only called when a job is terminated
         #reduce deallocated res share to prevent allocated resources being larger than total resources while they are actually not
-        self.res_shares[pod.user][0] -= pod.cpu
-        self.res_shares[pod.user][1] -= pod.gpu
-        self.res_shares[pod.user][2] -= pod.ram
+        self.res_shares[pod.userId][0] -= pod.cpu
+        self.res_shares[pod.userId][1] -= pod.gpu
+        self.res_shares[pod.userId][2] -= pod.ram
+        self.podQueue.updateUser(pod.userId)
 
     def addToQueue(self, pod: Pod) -> None:
-        addloc = -1
-
-        if pod.user not in self.res_shares.keys(): #current dominant resource share is zero
-            self.res_shares[pod.user] = [0, 0, 0] #cpu gpu ram
-            self.podQueue.insert(0, pod) #add to the front
-            addloc = 0
-
-        else:
-            curr_cpu = self.res_shares[pod.user][0]
-            curr_gpu = self.res_shares[pod.user][1]
-            curr_ram = self.res_shares[pod.user][2]
-            curr_dominant_share = max(curr_cpu / self.tot_cpu, curr_gpu / self.tot_gpu, curr_ram / self.tot_ram)
-
-            for i in range(len(self.podQueue)):
-                next_cpu = self.res_shares[self.podQueue[i].user][0]
-                next_gpu = self.res_shares[self.podQueue[i].user][1]
-                next_ram = self.res_shares[self.podQueue[i].user][2]
-
-                next_dominant_share = max(next_cpu / self.tot_cpu, next_gpu / self.tot_gpu, next_ram / self.tot_ram)
-                
-                if curr_dominant_share < next_dominant_share:
-                    self.podQueue.insert(i, pod)
-                    addloc = i
-                    break
-
-        if addloc == -1:
-            self.podQueue.append(pod)
+        if pod.userId not in self.res_shares.keys(): #current dominant resource share is zero
+            self.res_shares[pod.userId] = [0, 0, 0] #cpu gpu ram
+        self.podQueue.push(pod)
 
     def schedulePods(self, myNodeList: NodeList) -> Tuple[list[Pod],list[Pod]]:
         if len(self.podQueue) == 0:
@@ -442,11 +537,19 @@ class DRF(Scheduler): # DRF
         scheduledPods = []
         preemptedPods = []
         notScheduledPods = []
-        currentTime = self.podQueue[0].stateTS
-        while len(self.podQueue) > 0 and self.podQueue[0].stateTS == currentTime: # Try to schedule all the pods of current time
-            
-            currPod = self.podQueue.popleft()
-            matchedNodes = myNodeList.getMatch(currPod, 1)
+        currentTime = self.podQueue.peek(self.podQueue.peekUser()).stateTS
+        # The pods of current time are the batch, they are still picked one at a time by live dominant share
+        matcher = myNodeList.getBatchMatcher(self.getCandidates(self.podQueue.getFront(currentTime), myNodeList), 1)
+        while True: # Try to schedule all the pods of current time, always from the user with the smallest dominant share
+            currUser = self.podQueue.popUser()
+            if currUser == None:
+                break
+            if self.podQueue.peek(currUser).stateTS != currentTime:
+                self.podQueue.updateUser(currUser)
+                break
+
+            currPod = self.podQueue.popleft(currUser)
+            matchedNodes = self.matchPod(matcher, currPod, myNodeList)
             if len(matchedNodes) > 0: # At least one Node can run this pod
                 # Not sure how this going to work yet. TODO FIND A BETTER WAY TO PICK CHOSEN NODE
                 chosenNode = matchedNodes[0] # There is only one node here lol
@@ -458,20 +561,21 @@ class DRF(Scheduler): # DRF
                 scheduledPods.append(currPod)
 
                 #update current resource shares
-                self.res_shares[currPod.user][0] += currPod.cpu
-                self.res_shares[currPod.user][1] += currPod.gpu
-                self.res_shares[currPod.user][2] += currPod.ram
+                self.res_shares[currPod.userId][0] += currPod.cpu
+                self.res_shares[currPod.userId][1] += currPod.gpu
+                self.res_shares[currPod.userId][2] += currPod.ram
             else:
                 # No node can run this pod
                 if self.isPreemptive: # If preemptive, then try removing a pod
-                    preemptedPod = self.preemptPod(currPod)
-                    if preemptedPod != None:
-                        preemptedPods.append(preemptedPod)
-                        if global_.qFlag:
-                            print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
-                                % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
-                        #reduce resource share for preempted pod
-                        self.update_res_shares(preemptedPod)
+                    victims = self.preemptPods(currPod)
+                    if len(victims) > 0:
+                        preemptedPods.extend(victims)
+                        for preemptedPod in victims:
+                            if global_.qFlag:
+                                print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
+                                    % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
+                            #reduce resource share for preempted pod
+                            self.update_res_shares(preemptedPod)
                     else:
                         if global_.qFlag:
                             print("Unable to Preempt Pods for Pod [%s]" % (currPod.name))
@@ -481,53 +585,76 @@ class DRF(Scheduler): # DRF
                     notScheduledPods.append(currPod)
                     if global_.qFlag:
                         print("Unable to Match Pod [%s] with Nodes" % (currPod.name))
+
+            # Back in the heap with its current share if it has pods left
+            self.podQueue.updateUser(currUser)
     
-        while len(notScheduledPods) > 0:
-            self.addToQueue(notScheduledPods.pop())
+        matcher.close()
+        # Not scheduled pods go back to the front of their user's queue
+        self.podQueue.pushFront(notScheduledPods)
 
         return scheduledPods, preemptedPods
 
 class Lottery(Scheduler): # Random
     def __init__(self, preemptive: bool) -> None:
         super().__init__(name="Lottery", preemptive=preemptive)
-        self.podQueue = deque()
-        self.user_jobs = dict() #dict of (username, # of jobs in the queue)
+        self.podQueue = UserQueues()
+        self.user_jobs = dict() #dict of (user id, # of jobs in the queue)
         self.user_tickets = dict() #dict of tickets each user holds (should be updated to zero if no jobs in the queue)
         self.user_comp_tickets = dict() #dict of compensation tickets each user holds
 
-    def compute_winner(self) -> str:
-        totalTickets = 0
-        for user in self.user_jobs.keys():
-            if self.user_jobs[user] > 0:
-                totalTickets += (self.user_tickets[user] + self.user_comp_tickets[user])
-        
+        # Draw index, users in the order they were first seen like the dicts above
+        self.user_index = dict() #dict of (user id, position in the trees)
+        self.ticket_tree = FenwickTree() #tickets + comp tickets of the users with jobs, 0 for the others
+        self.active_tree = FenwickTree() #1 for the users with jobs, 0 for the others
+        self.index_users = []
+        self.user_names = dict() #dict of (user id, username), only for printing
+
+    def update_user(self, user: int) -> None: #call after changing any of the dicts of a user
+        if user not in self.user_index:
+            self.user_index[user] = len(self.index_users)
+            self.index_users.append(user)
+            self.ticket_tree.append(0)
+            self.active_tree.append(0)
+        i = self.user_index[user]
+        if self.user_jobs[user] > 0:
+            self.ticket_tree.set(i, self.user_tickets[user] + self.user_comp_tickets[user])
+            self.active_tree.set(i, 1)
+        else:
+            self.ticket_tree.set(i, 0)
+            self.active_tree.set(i, 0)
+
+    def compute_winner(self) -> int:
+        totalTickets = self.ticket_tree.total()
         winningTicket = random.randint(0, totalTickets)
-        currentTicket = 0
         winner = None
 
-        for user in self.user_jobs.keys():
-            if self.user_jobs[user] > 0:
-                currentTicket += (self.user_tickets[user] + self.user_comp_tickets[user])
-                if currentTicket >= winningTicket:
-                    winner = user
-                    break
+        # First user with jobs whose running ticket count reaches the winning ticket
+        if self.active_tree.total() > 0:
+            if winningTicket == 0: # Any count reaches 0, even a user with no tickets
+                winner = self.index_users[self.active_tree.search(1)]
+            else:
+                winner = self.index_users[self.ticket_tree.search(winningTicket)]
 
         if global_.qFlag:
-            print("current winner : ", winner)
-            print("number of jobs in the queue of user ", winner, self.user_jobs[winner])
+            print("current winner : ", self.user_names.get(winner))
+            print("number of jobs in the queue of user ", self.user_names.get(winner), self.user_jobs[winner])
         return winner
 
     def update_comp_ticket(self, pod: Pod, remainder: int) -> None: #this is called in the simulator when preempting a job
-        self.user_comp_tickets[pod.user] += int(self.quantum / remainder) + 1
+        self.user_comp_tickets[pod.userId] += int(self.quantum / remainder) + 1
+        self.update_user(pod.userId)
         
     def addToQueue(self, pod: Pod) -> None:
-        if pod.user not in self.user_jobs.keys() or self.user_tickets[pod.user] == 0:
+        if pod.userId not in self.user_jobs.keys() or self.user_tickets[pod.userId] == 0:
             #assign tickets
-            self.user_jobs[pod.user] = 1
-            self.user_tickets[pod.user] = pod.tickets
-            self.user_comp_tickets[pod.user] = 0
+            self.user_jobs[pod.userId] = 1
+            self.user_tickets[pod.userId] = pod.tickets
+            self.user_comp_tickets[pod.userId] = 0
+            self.user_names[pod.userId] = pod.user
         else:
-            self.user_jobs[pod.user] += 1
+            self.user_jobs[pod.userId] += 1
+        self.update_user(pod.userId)
         
         self.podQueue.append(pod)
 
@@ -538,27 +665,23 @@ class Lottery(Scheduler): # Random
         scheduledPods = []
         preemptedPods = []
         notScheduledPods = []
+        matcher = PodMatcher(myNodeList, 8) # Winners are drawn one pod at a time, no batch
         while True: # Try to schedule all the pods of current time
             target_user = self.compute_winner()
             self.user_comp_tickets[target_user] = 0 #use up comp tickets for the winner
 
-            currPod = None
-            for idx, pod in enumerate(self.podQueue): #find the first job added from the winner
-                if pod.user == target_user:
-                    currPod = pod
-                    break
-            
+            currPod = self.podQueue.popUser(target_user) #first job added from the winner
             if currPod == None:
                 break
 
-            del self.podQueue[idx]
-            self.user_jobs[currPod.user] -= 1
+            self.user_jobs[currPod.userId] -= 1
 
             #if no longer in the queue, remove the user ticket
-            if self.user_jobs[currPod.user] == 0:
-                self.user_tickets[currPod.user] = 0
+            if self.user_jobs[currPod.userId] == 0:
+                self.user_tickets[currPod.userId] = 0
+            self.update_user(currPod.userId)
 
-            matchedNodes = myNodeList.getMatch(currPod, 8)
+            matchedNodes = self.matchPod(matcher, currPod, myNodeList)
             if len(matchedNodes) > 0: # At least one Node can run this pod
                 chosenNode = random.choice(matchedNodes)
                 if global_.qFlag:
@@ -571,12 +694,13 @@ class Lottery(Scheduler): # Random
             else:
                 # No node can run this pod
                 if self.isPreemptive: # If preemptive, then try removing a pod
-                    preemptedPod = self.preemptPod(currPod)
-                    if preemptedPod != None:
-                        preemptedPods.append(preemptedPod)
-                        if global_.qFlag:
-                            print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
-                                % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
+                    victims = self.preemptPods(currPod)
+                    if len(victims) > 0:
+                        preemptedPods.extend(victims)
+                        for preemptedPod in victims:
+                            if global_.qFlag:
+                                print("Pod [%s] w/ Prio [%d] is preempted by Pod [%s] w/ Prio [%d]" \
+                                    % (preemptedPod.name, preemptedPod.prio, currPod.name, currPod.prio))
                     else:
                         if global_.qFlag:
                             print("Unable to Preempt Pods for Pod [%s]" % (currPod.name))
@@ -587,6 +711,7 @@ class Lottery(Scheduler): # Random
                     if global_.qFlag:
                         print("Unable to Match Pod [%s] with Nodes" % (currPod.name))
     
+        matcher.close()
         while len(notScheduledPods) > 0:
             self.addToQueue(notScheduledPods.pop())
 
@@ -1,11 +1,18 @@
-from collections import deque
+import heapq
 from enum import Enum, auto
-import sys, getopt
+import sys, getopt, os, pickle, random, traceback
 
 import global_
 from pods import *
 from nodes import *
 from schedulers import *
+from pod_table import PodTable
+from arrival_source import ArrivalSource, createPod
+import workload_file
+from workload_file import Workload
+from profiler import Profiler
+import trace_sink
+from metrics import OnlineMetrics
 
 
 class Transition(Enum):
@@ -25,53 +32,76 @@ class Event:
         self.timeStamp = ts
         self.pod = pod
         self.transition = trans # Transition enum
+        self.cancelled = False # Lazily deleted from the event queue
+
+    __setstate__ = setState
     
     def __repr__(self) -> str:
         return "ID: %d, TimeStamp: %d, Pod: %s, Transition: %s" % (self.id, self.timeStamp, self.pod.name, self.transition.name)
+
+def resetEventID() -> None:
+    # Event IDs start from 0 again, for running several simulations in one process
+    global eventID
+    eventID = 0
     
 class EventQueue:
     def __init__(self) -> None:
-        self.queue = deque()
+        # Min heap of (timeStamp, rank, seq, event)
+        # Arrivals (TO_WAIT) have rank 0 and go before the other events of the same time stamp, as if they
+        # were all put in the queue before the simulation started, even when they are streamed in later
+        # seq keeps events with the same time stamp and rank in insertion order
+        self.queue = []
+        self.seq = 0
+        self.size = 0 # Number of events that are not cancelled
+        self.podEvents = {} # Maps pod -> pending event of that pod
     
+    def __len__(self) -> int:
+        return self.size
+
+    def pruneCancelled(self) -> None:
+        # Drop cancelled events from the top, so the top is always a live event
+        while len(self.queue) > 0 and self.queue[0][3].cancelled:
+            heapq.heappop(self.queue)
+
     def getEvent(self) -> Event: 
-        if len(self.queue) == 0:
+        if self.size == 0:
             return None
 
-        return self.queue.popleft()
+        evt = heapq.heappop(self.queue)[3]
+        self.size -= 1
+        if self.podEvents.get(evt.pod) is evt:
+            del self.podEvents[evt.pod]
+        self.pruneCancelled()
+        return evt
     
     def putEvent(self, evt: Event) -> None:
-        index = 0
-        while index < len(self.queue):
-            if evt.timeStamp < self.queue[index].timeStamp:
-                break
-            index += 1
-        self.queue.insert(index, evt)
+        rank = 0 if evt.transition == Transition.TO_WAIT else 1
+        heapq.heappush(self.queue, (evt.timeStamp, rank, self.seq, evt))
+        self.seq += 1
+        self.size += 1
+        self.podEvents[evt.pod] = evt
     
     def getNextEvtTime(self) -> int:
-        if len(self.queue) == 0:
+        if self.size == 0:
             return None
         
-        return self.queue[0].timeStamp
+        return self.queue[0][0]
     
     def removeEvent(self, evt: Event) -> None:
-        for i in range(0, len(self.queue)):
-            if self.queue[i].id == evt.id:
-                break
-
-        del self.queue[i]
+        # Lazy deletion, the event is skipped once it reaches the top of the heap
+        if evt.cancelled:
+            return
+        evt.cancelled = True
+        self.size -= 1
+        if self.podEvents.get(evt.pod) is evt:
+            del self.podEvents[evt.pod]
+        self.pruneCancelled()
 
     def getEventByPod(self, pod: Pod) -> Event:
-        for i in self.queue:
-            if i.pod.name == pod.name:
-                return i
-        
-        return None
+        return self.podEvents.get(pod)
     
     def __repr__(self) -> str:
-        s = "Event Queue:\n"
-        for i in self.queue:
-            s += "\t" + i.__repr__() + "\n"
-        return s
+        return "Event Queue:\n" + "".join("\t" + evt.__repr__() + "\n" for _, _, _, evt in sorted(self.queue) if not evt.cancelled)
 
 
 def userCallHelper():
@@ -79,11 +109,23 @@ def userCallHelper():
     print('-p or --pfile for pod file')
     print('-n or --nfile for node file')
     print('-s or --sched for pod scheduler')
-    print('-d or --nsched for node scheduler')
+    print('-d or --nsched for node scheduler, DEF (default), LRP, BRA or FF')
     print('-v for general debugging info')
     print('-q for scheduler debugging info')
     print('-t for showing simulation traces')
     print('-z for showing node traces')
+    print('-a for array backed node matching (needs numpy)')
+    print('-c for compact pod storage, for very large pod files')
+    print('-l for reading the pod file during the simulation instead of loading it first, for very long traces')
+    print('-b for loading the pod and node files from binary copies, converted once and cached')
+    print('-k <time>:<file> for saving a checkpoint after simulating up to time, then keep going')
+    print('-r <file> for continuing from a checkpoint, -s switches the scheduler and -n adds nodes')
+    print('-e <file>[:<categories>[:<sample rate>]] for a structured trace, json lines for a .jsonl file, binary otherwise')
+    print('   categories event,node,sched (default all), sample rate keeps the records of that share of the pods')
+    print('-w for writing the -e trace on a background thread')
+    print('-m <interval> for percentiles of JCT, wait and start delay per user and prio, kept while the simulation runs')
+    print('   prints a progress line every interval seconds of simulated time, 0 for only the report after the summary')
+    print('-f <file> for profiling the hot paths, prints a report after the summary and writes flamegraph folded stacks to file')
 
 def parseSchedulerInfo(arg: str) -> Scheduler:
     myScheduler = None
@@ -126,16 +168,61 @@ def parseSchedulerInfo(arg: str) -> Scheduler:
 
     return myScheduler
 
+def parseNodeListInfo(arg: str) -> NodeList:
+    # Node list for a node scheduler name, DEF is the default policy, None for an invalid name
+    if arg == "DEF":
+        return NodeList()
+    elif arg == "LRP":
+        return NodeListByLRP()
+    elif arg == "BRA":
+        return NodeListByBRA()
+    elif arg == "FF":
+        return NodeListByFF()
+    return None
+
+def loadNodeFile(nodePath: str, myNodeList) -> None:
+    # Adds the nodes of a text or binary node file with myNodeList.addNode, a NodeList or a Simulation
+    if workload_file.isBinary(nodePath):
+        workload = Workload(nodePath)
+        if global_.vFlag:
+            print("Header: " + workload.header)
+        workload_file.loadNodes(workload, myNodeList)
+        return
+
+    with open(nodePath, 'r') as f:
+        header = f.readline().strip()
+        if global_.vFlag:
+            print("Header: " + header)
+        topology = workload_file.getTopologyFields(header, nodePath) # Optional zone and rack columns after ram
+        for line in f.readlines():
+            line = line.strip().split()
+            name = line[0]
+            cpu = int(line[1])
+            gpu = int(line[2])
+            ram = int(line[3])
+
+            myNodeList.addNode(Node(name, cpu, gpu, ram, **dict(zip(topology, line[4:]))))
+
 def main(argv):
     pfile = ''
     nfile = ''
+    useTable = False
+    streamPods = False
+    useBinary = False
+    restoreFile = ''
+    checkpointFile = ''
+    checkpointTime = 0
+    profileFile = ''
+    traceSpec = ''
+    traceThread = False
+    metricsInterval = -1
     myScheduler = None
     myNodeList = NodeList()
     myPodList = PodList()
     myEventQueue = EventQueue()
 
     try:
-        opts, args = getopt.getopt(argv,"hvtqzp:n:s:d:",["help, pfile=, nfile=, sched=, nsched="])
+        opts, args = getopt.getopt(argv,"hvtqzaclbwp:n:s:d:k:r:f:e:m:",["help, pfile=, nfile=, sched=, nsched="])
         # getopt.getopt(args, options, [long_options])
         # ":" indicates that an argument is needed, otherwise just an option, like -h
     except getopt.GetoptError:
@@ -152,12 +239,7 @@ def main(argv):
         elif opt in ("-s", "--sched"):
             myScheduler = parseSchedulerInfo(arg)
         elif opt in ("-d", "--nsched"):
-            if arg == "LRP":
-                myNodeList = NodeListByLRP()
-            elif arg == "BRA":
-                myNodeList = NodeListByBRA()
-            else:
-                myNodeList = None
+            myNodeList = parseNodeListInfo(arg)
         elif opt in ("-v"):
             global_.vFlag = True
         elif opt in ("-t"):
@@ -166,7 +248,96 @@ def main(argv):
             global_.qFlag = True
         elif opt in ("-z"):
             global_.zFlag = True
-    
+        elif opt in ("-a"):
+            useTable = True
+        elif opt in ("-c"):
+            myPodList = PodTable()
+        elif opt in ("-l"):
+            streamPods = True
+        elif opt in ("-b"):
+            useBinary = True
+        elif opt in ("-k"):
+            try:
+                checkpointTime, checkpointFile = arg.split(":", 1)
+                checkpointTime = int(checkpointTime)
+            except ValueError:
+                print('Checkpoint needs <time>:<file>, got %s' % (arg))
+                sys.exit(1)
+        elif opt in ("-r"):
+            restoreFile = arg
+        elif opt in ("-f"):
+            profileFile = arg
+        elif opt in ("-e"):
+            traceSpec = arg
+        elif opt in ("-w"):
+            traceThread = True
+        elif opt in ("-m"):
+            try:
+                metricsInterval = int(arg)
+            except ValueError:
+                print('Metrics interval has to be a number of seconds, got %s' % (arg))
+                sys.exit(1)
+
+    if restoreFile != "":
+        mySim = restoreMain(restoreFile, pfile, nfile, myScheduler, useBinary, useTable)
+    else:
+        mySim = loadMain(pfile, nfile, myScheduler, myNodeList, myPodList, myEventQueue, useBinary, useTable, streamPods)
+
+    if global_.vFlag:
+        print(mySim.podList)
+        print(mySim.nodeList)
+        print(mySim.eventQueue)
+        print(mySim.scheduler)
+
+    if metricsInterval >= 0:
+        # A restored simulation keeps the metrics it was saved with
+        if mySim.metrics == None:
+            mySim.metrics = OnlineMetrics()
+        mySim.metrics.interval = metricsInterval
+        mySim.metrics.nextReport = metricsInterval
+    if traceSpec != "":
+        global_.traceSink = trace_sink.openSink(traceSpec, traceThread)
+
+    # Start simulation
+    myProfiler = Profiler() if profileFile != "" else None
+    if myProfiler != None:
+        myProfiler.attach(mySim)
+    if checkpointFile != "":
+        mySim.run(checkpointTime)
+        if myProfiler != None: # The timed methods cannot be pickled
+            myProfiler.detach()
+        mySim.save(checkpointFile)
+        if myProfiler != None:
+            myProfiler.attach(mySim)
+    mySim.run()
+    if myProfiler != None:
+        myProfiler.detach()
+    if global_.traceSink is not None:
+        global_.traceSink.close()
+    mySim.podList.calcAvgJct()
+    mySim.podList.calcAvgLatency()
+    mySim.nodeList.calcAvgUtil()
+
+    print("Summary:")
+    print("Pod File: %s\tNode File:%s" %(mySim.podFile, mySim.nodeFile))
+    print(mySim.scheduler)
+    print("Unable to schedule Pods: %s" % (mySim.scheduler.getPodQueueStr()))
+    if len(mySim.scheduler.rejectedPods) > 0:
+        print("Larger than every node: %s" % (mySim.scheduler.getRejectedStr()))
+    print(mySim.podList.getBenchmarkStr())
+    print(mySim.nodeList.getAvgUtil())
+    if mySim.metrics != None:
+        print(mySim.metrics)
+    if myProfiler != None:
+        print(myProfiler)
+        with open(profileFile, 'w') as f:
+            f.write(myProfiler.getFoldedStr())
+    # print(mySim.nodeList.getUsageLogs())
+    # print(mySim.nodeList.getClusterLog())
+
+def loadMain(pfile: str, nfile: str, myScheduler: Scheduler, myNodeList: NodeList, myPodList: PodList, myEventQueue: EventQueue,
+    useBinary: bool, useTable: bool, streamPods: bool) -> "Simulation":
+    # New simulation from the pod and node files
     if pfile == "":
         print('Missing pod file, exiting')
         sys.exit(1)
@@ -183,73 +354,209 @@ def main(argv):
         print('Missing node list or used invalid name')
         sys.exit(1)
 
-    with open(pfile, 'r') as f:
-        header = f.readline().strip()
+    if streamPods and isinstance(myPodList, PodTable):
+        print('-l keeps only the pods that have not terminated, it does not work with -c')
+        sys.exit(1)
+
+    # Binary workload files are used as they are, -b converts text files once and reuses the result
+    podPath = pfile
+    nodePath = nfile
+    if useBinary:
+        nodePath = workload_file.getCached(nfile, "nodes")
+        if not streamPods:
+            podPath = workload_file.getCached(pfile, "pods")
+    if streamPods and workload_file.isBinary(podPath):
+        print('-l reads a text pod file, got a binary one')
+        sys.exit(1)
+
+    if useTable:
+        try:
+            myNodeList.enableTable()
+        except ImportError:
+            print('Array backed node matching needs numpy, exiting')
+            sys.exit(1)
+
+    myArrivals = None
+    if streamPods:
+        # Pods are read as the simulation reaches their arrival time, the logs would still grow with the trace
+        myPodList = StreamedPodList()
+        myNodeList.disableLogs()
+        myArrivals = ArrivalSource(podPath, myPodList)
         if global_.vFlag:
-            print("Header: " + header)
-        for line in f.readlines():
-            line = line.strip().split()
-            user = line[0]
-            name = line[1]
-            arrivalTime = int(line[2])
-            work = int(line[3])
-            prio = int(line[4])
-            tickets = int(line[5])
-            cpu = int(line[6])
-            gpu = int(line[7])
-            ram = int(line[8])
-
-            p = Pod(user, name, arrivalTime, work, cpu, gpu, ram, prio, tickets, State.CREATED)
-            myPodList.addPod(p)
-            myEventQueue.putEvent(Event(arrivalTime, p, Transition.TO_WAIT))
- 
-    with open(nfile, 'r') as f:
-        header = f.readline().strip()
+            print("Header: " + myArrivals.header)
+    elif workload_file.isBinary(podPath):
+        workload = Workload(podPath)
         if global_.vFlag:
-            print("Header: " + header)
-        for line in f.readlines():
-            line = line.strip().split()
-            name = line[0]
-            cpu = int(line[1])
-            gpu = int(line[2])
-            ram = int(line[3])
-
-            myNodeList.addNode(Node(name, cpu, gpu, ram))
+            print("Header: " + workload.header)
+        for p in workload_file.loadPods(workload, myPodList):
+            myEventQueue.putEvent(Event(p.at, p, Transition.TO_WAIT))
+    else:
+        with open(podPath, 'r') as f:
+            header = f.readline().strip()
+            if global_.vFlag:
+                print("Header: " + header)
+            for line in f.readlines():
+                p = createPod(myPodList, line)
+                myEventQueue.putEvent(Event(p.at, p, Transition.TO_WAIT))
+ 
+    loadNodeFile(nodePath, myNodeList)
     
     if myScheduler.name == "DRF":
         myScheduler.calculate_tot_resources(myNodeList)
-        
-    if global_.vFlag:
-        print(myPodList)
-        print(myNodeList)
-        print(myEventQueue)
-        print(myScheduler)
 
-    # Start simulation
-    simulate(myEventQueue, myScheduler, myNodeList)
-    myPodList.calcAvgJct()
-    myPodList.calcAvgLatency()
-    myNodeList.calcAvgUtil()
+    return Simulation(myPodList, myEventQueue, myScheduler, myNodeList, myArrivals, pfile, nfile)
 
-    print("Summary:")
-    print("Pod File: %s\tNode File:%s" %(pfile, nfile))
-    print(myScheduler)
-    print("Unable to schedule Pods: %s" % (myScheduler.getPodQueueStr()))
-    print(myPodList.getBenchmarkStr())
-    print(myNodeList.getAvgUtil())
-    # print(myNodeList.getUsageLogs())
-    # print(myNodeList.getClusterLog())
-    
-def simulate(myEventQueue: EventQueue, myScheduler: Scheduler, myNodeList: NodeList) -> None:
+def restoreMain(restoreFile: str, pfile: str, nfile: str, myScheduler: Scheduler, useBinary: bool, useTable: bool) -> "Simulation":
+    # Simulation from a checkpoint, -s switches to another scheduler and -n adds the nodes of another node file
+    if pfile != "":
+        print('The pods come from the checkpoint, -p cannot be used with -r')
+        sys.exit(1)
+
+    mySim = Simulation.load(restoreFile)
+    if myScheduler != None:
+        mySim.setScheduler(myScheduler)
+    if nfile != "":
+        loadNodeFile(workload_file.getCached(nfile, "nodes") if useBinary else nfile, mySim)
+        mySim.nodeFile += " + " + nfile
+    if useTable and mySim.nodeList.table == None:
+        try:
+            mySim.nodeList.enableTable()
+        except ImportError:
+            print('Array backed node matching needs numpy, exiting')
+            sys.exit(1)
+    return mySim
+
+class Simulation:
+    # Everything a simulation needs between two events, run() can stop at a simulated time and continue later
+    # A stopped simulation can be saved to a checkpoint file and restored, cloned in the same process or forked
+    # into a child process, so what-if variants only simulate what comes after their common prefix
+    def __init__(self, myPodList: PodList, myEventQueue: EventQueue, myScheduler: Scheduler, myNodeList: NodeList,
+        myArrivals: ArrivalSource = None, podFile: str = "", nodeFile: str = "") -> None:
+        self.podList = myPodList
+        self.eventQueue = myEventQueue
+        self.scheduler = myScheduler
+        self.nodeList = myNodeList
+        self.arrivals = myArrivals
+        self.podFile = podFile # Only for the summary
+        self.nodeFile = nodeFile
+        self.metrics = None # OnlineMetrics, updated while the simulation runs
+
+        self.started = False
+        self.finished = False
+
+        # Module level state when the last run stopped, put back by the next run so that a restored or
+        # cloned simulation makes the same random choices and event IDs as the original would have
+        self.randomState = None
+        self.eventID = 0
+
+    def run(self, stopTime: int = None) -> bool:
+        # Runs until the end or until the next event is after stopTime, True once the simulation ended
+        global eventID
+        if self.finished:
+            return True
+        if self.randomState != None:
+            random.setstate(self.randomState)
+            eventID = self.eventID
+        self.finished = simulate(self.eventQueue, self.scheduler, self.nodeList, self.arrivals, stopTime, self.started, self.metrics)
+        self.started = True
+        self.randomState = random.getstate()
+        self.eventID = eventID
+        return self.finished
+
+    def setScheduler(self, myScheduler: Scheduler) -> None:
+        # Switches to another scheduler between two runs, it takes over the waiting and running pods
+        if myScheduler.name == "DRF":
+            myScheduler.calculate_tot_resources(self.nodeList)
+        myScheduler.takeOver(self.scheduler)
+        self.scheduler = myScheduler
+
+    def addNode(self, node: Node) -> None:
+        # Adds a node between two runs
+        self.nodeList.addNode(node)
+        if self.scheduler.name == "DRF":
+            self.scheduler.add_node_resources(node)
+        self.scheduler.readmit(self.nodeList)
+
+    def save(self, path: str) -> None:
+        # Pickle of the whole simulation, a streamed pod file is read again from the same path on restore
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> "Simulation":
+        # Only load checkpoints you made, unpickling can run any code
+        try:
+            with open(path, 'rb') as f:
+                mySim = pickle.load(f)
+        except Exception:
+            mySim = None
+        if not isinstance(mySim, Simulation):
+            print('Not a checkpoint file: %s' % (path))
+            sys.exit(1)
+        return mySim
+
+    def clone(self) -> "Simulation":
+        # Independent copy in the same process
+        return pickle.loads(pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def fork(self, variant, tracePath: str = None) -> int:
+        # Runs variant(simulation) in a copy on write copy of the whole process and waits for it to exit
+        # This simulation is not changed, returns the exit code of the child, 0 when variant returned
+        # The child never writes to this process's trace, with tracePath it traces to that file with the same settings
+        sink = global_.traceSink
+        if sink is not None:
+            sink.sync() # Nothing buffered or being written by the writer thread is copied into the child
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                global_.traceSink = None if sink is None or tracePath is None else sink.reopen(tracePath)
+                variant(self)
+                if global_.traceSink is not None:
+                    global_.traceSink.close()
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code) # The parent's exit handlers and buffers are not the child's to run
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status)
+
+def simulate(myEventQueue: EventQueue, myScheduler: Scheduler, myNodeList: NodeList, myArrivals: ArrivalSource = None,
+    stopTime: int = None, resume: bool = False, myMetrics: OnlineMetrics = None) -> bool:
+    # Runs events until there are none left and returns True
+    # With a stopTime, returns False before the first event after stopTime, every event up to stopTime and the
+    # scheduling after them are done, calling it again with resume=True continues from there
     def printStateIntro(currentTime, proc, timeInPrevState, newState):
         if global_.tFlag:
             print("currentTime: %d, podName: %s, timeInPrevState: %d, from: %s to: %s" \
                 % (currentTime, proc.name, timeInPrevState, proc.state, newState))
 
+    def putArrivals():
+        # Streamed pods, puts the arrivals that are not after the next event in the queue
+        # Keeps the queue as if every arrival was put in it before the simulation started
+        if myArrivals == None:
+            return
+        while myArrivals.hasNext() and \
+            (len(myEventQueue) == 0 or myArrivals.getNextTime() <= myEventQueue.getNextEvtTime()):
+            pod = myArrivals.popPod()
+            myEventQueue.putEvent(Event(pod.at, pod, Transition.TO_WAIT))
+
+    def isPaused():
+        putArrivals()
+        return stopTime != None and len(myEventQueue) > 0 and myEventQueue.getNextEvtTime() > stopTime
+
+    if global_.tFlag and not resume:
+        print("\n###################\nSimulation Start")
+    if isPaused():
+        return False
     event = myEventQueue.getEvent()
     currentTime = -1
-    if global_.tFlag:
-        print("\n###################\nSimulation Start")
 
     # If there are events, then this simulator needs to continue running
     # Whether or not there are pods in the queue does not matter
@@ -270,8 +577,8 @@ def simulate(myEventQueue: EventQueue, myScheduler: Scheduler, myNodeList: NodeL
             # Update state info
             pod.state = State.WAIT
             pod.stateTS = currentTime
-            # Add to scheduler
-            myScheduler.addToQueue(pod)
+            # Add to scheduler, a pod no node can ever run is rejected here instead of failing every cycle
+            myScheduler.admit(pod, myNodeList)
 
         elif eventTrans == Transition.TO_RUN:
             printStateIntro(currentTime, pod, timeInPrevState, State.RUN)
@@ -280,6 +587,8 @@ def simulate(myEventQueue: EventQueue, myScheduler: Scheduler, myNodeList: NodeL
             pod.stateTS = currentTime
             if pod.execStartTime == -1:
                 pod.execStartTime = currentTime
+                if myMetrics != None:
+                    myMetrics.podStarted(pod, currentTime)
             pod.totalWaitTime += timeInPrevState
             myScheduler.addToRunList(pod)
 
@@ -318,6 +627,8 @@ def simulate(myEventQueue: EventQueue, myScheduler: Scheduler, myNodeList: NodeL
             pod.state = State.TERM
             pod.stateTS = currentTime
             pod.finishTime = currentTime
+            if myMetrics != None:
+                myMetrics.podDone(pod, currentTime)
             myScheduler.rmFromRunList(pod)
             # Return resouce to node
             node = pod.node
@@ -326,15 +637,24 @@ def simulate(myEventQueue: EventQueue, myScheduler: Scheduler, myNodeList: NodeL
             # update resource share
             if myScheduler.name == "DRF":
                 myScheduler.update_res_shares(pod)
+            if myArrivals != None:
+                myArrivals.podDone(pod)
+        if global_.traceSink is not None:
+            # node is the one the pod just left
+            global_.traceSink.record(currentTime, "event", eventTrans.name, pod,
+                node if eventTrans in (Transition.TO_PREEMPT, Transition.TO_TERM) else pod.node, myScheduler.getQueueLength())
         # Get next process
         # If another event of same time, process the next event before calling scheduler
         # If there are pods in the sched q and cannot be sched, then no point of running loop, exit
         # As long as a event happened, try to schedule some pods
+        putArrivals()
         if myEventQueue.getNextEvtTime() != currentTime:
             if global_.tFlag:
                 print(myScheduler.getPodQueueStr())
 
             scheduledPods, preemptedPods = myScheduler.schedulePods(myNodeList)
+            if global_.traceSink is not None:
+                global_.traceSink.recordCycle(currentTime, scheduledPods, preemptedPods, myScheduler.getQueueLength())
             while len(scheduledPods) > 0:
                 # There is a pod to run, create a new event
                 myEventQueue.putEvent(Event(currentTime, scheduledPods.pop(), Transition.TO_RUN))
@@ -352,12 +672,17 @@ def simulate(myEventQueue: EventQueue, myScheduler: Scheduler, myNodeList: NodeL
                     myEventQueue.putEvent(Event(currentTime+30, pod, Transition.TO_PREEMPT)) # Has 30 sec to run before termination
 
         # Get the next event
+        if isPaused():
+            return False
         event = myEventQueue.getEvent()
     
     myNodeList.updateClusterInfo(currentTime) # Sets current time and updates cluster usage
     
     if global_.tFlag:
         print("\nSimulation End\n####################################\n")
+    return True
 
 if __name__ == "__main__":
-   main(sys.argv[1:])
+    # Run from the imported module, so that checkpoints refer to simulator.Event and not __main__.Event
+    import simulator
+    simulator.main(sys.argv[1:])
@@ -0,0 +1,170 @@
+import contextlib, getopt, io, itertools, multiprocessing, os, random, sys, time
+
+import global_
+import simulator
+import workload_file
+from pods import *
+from nodes import *
+from pod_table import PodTable
+from simulator import Event, EventQueue, Transition
+from workload_file import Workload
+
+# Runs every combination of schedulers, node schedulers, pod files, node files and seeds on a process pool
+# Text pod and node files are converted once to the binary workload format before the pool starts,
+# every worker memory maps the same files so the parsed inputs are shared instead of read again per job
+
+columns = ("sched", "nsched", "pods", "nodes", "seed", "avgJct", "avgLatency", "cpuPerSec", "gpuPerSec", "ramPerSec", "unscheduled", "rejected", "seconds", "error")
+
+workloads = dict() # path -> Workload, opened once per worker process
+
+def getWorkload(path: str) -> Workload:
+    if path not in workloads:
+        workloads[path] = Workload(path)
+    return workloads[path]
+
+def runJob(job: tuple) -> tuple:
+    # One simulation, returns a row of the result table
+    # Module level state is reset first, a worker runs many jobs one after the other
+    sched, nsched, podPath, nodePath, seed, podName, nodeName, useTable, useCompact = job
+    global_.reset()
+    simulator.resetEventID()
+    random.seed(seed)
+
+    start = time.time()
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            myScheduler = simulator.parseSchedulerInfo(sched)
+            myNodeList = simulator.parseNodeListInfo(nsched)
+            myPodList = PodTable() if useCompact else PodList()
+            myEventQueue = EventQueue()
+            if useTable:
+                myNodeList.enableTable()
+            for p in workload_file.loadPods(getWorkload(podPath), myPodList):
+                myEventQueue.putEvent(Event(p.at, p, Transition.TO_WAIT))
+            workload_file.loadNodes(getWorkload(nodePath), myNodeList)
+            if myScheduler.name == "DRF":
+                myScheduler.calculate_tot_resources(myNodeList)
+
+            simulator.simulate(myEventQueue, myScheduler, myNodeList)
+            myPodList.calcAvgJct()
+            myPodList.calcAvgLatency()
+            myNodeList.calcAvgUtil()
+    except BaseException as e: # The simulator exits on fatal errors, a worker has to keep going
+        lines = out.getvalue().strip().splitlines()
+        error = lines[-1] if isinstance(e, SystemExit) and len(lines) > 0 else "%s: %s" % (type(e).__name__, e)
+        return (sched, nsched, podName, nodeName, seed, None, None, None, None, None, None, None, time.time() - start, error)
+
+    return (sched, nsched, podName, nodeName, seed, myPodList.avgJct, myPodList.avgLatency,
+        myNodeList.cpuPerSec, myNodeList.gpuPerSec, myNodeList.ramPerSec, myScheduler.getQueueLength(), len(myScheduler.rejectedPods),
+        time.time() - start, "")
+
+def formatRow(row: tuple) -> list[str]:
+    s = []
+    for value in row:
+        if value == None:
+            s.append("-")
+        elif isinstance(value, float):
+            s.append("%.2f" % (value))
+        else:
+            s.append(str(value))
+    return s
+
+def getTableStr(rows: list[tuple], header: tuple = columns) -> str:
+    # Columns padded to their widest value
+    cells = [list(header)] + [formatRow(row) for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(header))]
+    s = ""
+    for line in cells:
+        s += "  ".join(cell.ljust(widths[i]) for i, cell in enumerate(line)).rstrip() + "\n"
+    return s
+
+def getCsvStr(rows: list[tuple], header: tuple = columns) -> str:
+    s = ",".join(header) + "\n"
+    for row in rows:
+        s += ",".join("" if value == None else str(value) for value in row) + "\n"
+    return s
+
+def userCallHelper():
+    print('sweep.py -h -a -c -j <workers> -o <out.csv> -p <pods.txt,...> -n <nodes.txt,...> -s <scheduler,...> -d <node scheduler,...> -r <seed,...>')
+    print('Runs every combination of the comma separated values and prints one row per run')
+    print('-p pod files, -n node files')
+    print('-s pod schedulers, same format as simulator.py, e.g. FCFS,SRTF:1,RR:1:50,PRIO:1:50:4')
+    print('-d node schedulers, DEF (default), LRP, BRA or FF, default DEF')
+    print('-r seeds of the random module, default 0')
+    print('-j number of worker processes, default number of CPUs')
+    print('-o also writes the table to a csv file')
+    print('-a for array backed node matching (needs numpy)')
+    print('-c for compact pod storage')
+
+def main(argv):
+    pfiles = []
+    nfiles = []
+    scheds = []
+    nscheds = ["DEF"]
+    seeds = [0]
+    workers = os.cpu_count()
+    outFile = ''
+    useTable = False
+    useCompact = False
+
+    try:
+        opts, args = getopt.getopt(argv, "hacj:o:p:n:s:d:r:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    for opt, arg in opts:
+        if opt == "-h":
+            userCallHelper()
+            sys.exit(1)
+        elif opt == "-p":
+            pfiles = arg.split(",")
+        elif opt == "-n":
+            nfiles = arg.split(",")
+        elif opt == "-s":
+            scheds = arg.split(",")
+        elif opt == "-d":
+            nscheds = arg.split(",")
+        elif opt == "-r":
+            seeds = [int(seed) for seed in arg.split(",")]
+        elif opt == "-j":
+            workers = int(arg)
+        elif opt == "-o":
+            outFile = arg
+        elif opt == "-a":
+            useTable = True
+        elif opt == "-c":
+            useCompact = True
+
+    if len(pfiles) == 0 or len(nfiles) == 0 or len(scheds) == 0:
+        print('Missing pod files, node files or schedulers, exiting')
+        sys.exit(1)
+    for sched in scheds:
+        if simulator.parseSchedulerInfo(sched) == None:
+            print('Invalid scheduler: %s' % (sched))
+            sys.exit(1)
+    for nsched in nscheds:
+        if simulator.parseNodeListInfo(nsched) == None:
+            print('Invalid node scheduler: %s' % (nsched))
+            sys.exit(1)
+
+    # Parsed once here, the jobs only get the binary file paths
+    podPaths = {pfile: workload_file.getCached(pfile, "pods") for pfile in pfiles}
+    nodePaths = {nfile: workload_file.getCached(nfile, "nodes") for nfile in nfiles}
+
+    jobs = []
+    for pfile, nfile, sched, nsched, seed in itertools.product(pfiles, nfiles, scheds, nscheds, seeds):
+        jobs.append((sched, nsched, podPaths[pfile], nodePaths[nfile], seed, pfile, nfile, useTable, useCompact))
+
+    rows = []
+    with multiprocessing.Pool(min(workers, len(jobs))) as pool:
+        for row in pool.imap(runJob, jobs):
+            rows.append(row)
+
+    print(getTableStr(rows), end="")
+    if outFile != "":
+        with open(outFile, 'w') as f:
+            f.write(getCsvStr(rows))
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,224 @@
+from array import array
+import getopt, json, queue, re, sys, tempfile, threading, zlib
+
+import workload_file
+from workload_file import Workload
+
+# Structured trace of a simulation, typed records instead of the -t, -q and -z prints
+# Every record has the same fields, a string is None and a number -1 where it does not apply
+#   category event, kind TO_WAIT, TO_RUN, TO_PREEMPT or TO_TERM: the pod, its node and the queue length after the event
+#   category node, kind ADD or REMOVE: the pod, the node and the free cpu, gpu and ram of the node after the change
+#   category sched, kind MATCH or PREEMPT: a pod and node picked by a scheduling cycle, a preempted pod is on its own node
+#   category sched, kind CYCLE: the queue length after the scheduling cycle
+categories = ("event", "node", "sched")
+fields = ("time", "category", "kind", "pod", "node", "queue", "cpu", "gpu", "ram")
+binaryColumns = ("time", "categoryIds", "kindIds", "podIds", "nodeIds", "queue", "cpu", "gpu", "ram") # Ids into the string table
+
+class TraceSink:
+    # Records are kept as tuples and written bufferSize at a time, on a writer thread with background
+    # With a sampleRate below 1, only the records of about that share of the pods are kept
+    # Subclasses write a chunk of records with writeRecords(chunk) and finish the file with finish()
+    def __init__(self, path: str, enabled: tuple = categories, sampleRate: float = 1.0, bufferSize: int = 1 << 16,
+        background: bool = False) -> None:
+        self.path = path
+        self.background = background
+        self.enabled = frozenset(enabled)
+        self.sampleRate = sampleRate
+        self.bufferSize = bufferSize
+        self.buffer = []
+        self.records = 0 # Records handed to the writer
+
+        self.thread = None
+        self.error = None # Exception of the writer thread
+        if background:
+            self.chunks = queue.Queue(maxsize=4) # The simulation waits when the writer is this far behind
+            self.thread = threading.Thread(target=self.writeLoop, daemon=True)
+            self.thread.start()
+
+    def isSampled(self, name: str) -> bool:
+        # Decided by the hash of the pod name, the same pods are kept in every run and the random module is not used
+        return zlib.crc32(name.encode()) < self.sampleRate * (1 << 32)
+
+    def record(self, time: int, category: str, kind: str, pod=None, node=None, queue: int = -1,
+        cpu: int = -1, gpu: int = -1, ram: int = -1) -> None:
+        if category not in self.enabled:
+            return
+        podName = None
+        if pod is not None:
+            podName = pod.name
+            if self.sampleRate < 1 and not self.isSampled(podName):
+                return
+        self.buffer.append((time, category, kind, podName, None if node is None else node.name, queue, cpu, gpu, ram))
+        if len(self.buffer) >= self.bufferSize:
+            self.flush()
+
+    def recordCycle(self, time: int, scheduledPods: list, preemptedPods: list, queue: int) -> None:
+        # Decisions of one scheduling cycle
+        if "sched" not in self.enabled:
+            return
+        for pod in scheduledPods:
+            self.record(time, "sched", "MATCH", pod, pod.node)
+        for pod in preemptedPods:
+            self.record(time, "sched", "PREEMPT", pod, pod.node)
+        self.record(time, "sched", "CYCLE", queue=queue)
+
+    def flush(self) -> None:
+        chunk = self.buffer
+        self.buffer = []
+        self.records += len(chunk)
+        if self.thread is None:
+            self.writeRecords(chunk)
+        else:
+            self.checkError()
+            self.chunks.put(chunk)
+
+    def writeLoop(self) -> None:
+        # Writer thread, a chunk of None ends it
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.chunks.task_done()
+                return
+            if self.error is None: # After an error the chunks are only taken off the queue
+                try:
+                    self.writeRecords(chunk)
+                except Exception as e:
+                    self.error = e
+            self.chunks.task_done()
+
+    def checkError(self) -> None:
+        if self.error is not None:
+            print("Writing trace %s failed: %s" % (self.path, self.error))
+            sys.exit(1)
+
+    def sync(self) -> None:
+        # Hands the buffer to the writer and waits until everything handed to it is written
+        self.flush()
+        if self.thread is not None:
+            self.chunks.join()
+            self.checkError()
+
+    def reopen(self, path: str) -> "TraceSink":
+        # New sink of the same kind and settings writing to path, this one is not changed
+        return type(self)(path, tuple(self.enabled), self.sampleRate, self.bufferSize, self.background)
+
+    def close(self) -> None:
+        # Writes what is left and finishes the file
+        self.flush()
+        if self.thread is not None:
+            self.chunks.put(None)
+            self.thread.join()
+            self.checkError()
+        self.finish()
+
+class JsonlSink(TraceSink):
+    # One json object per line
+    def __init__(self, *args, **kwargs) -> None:
+        self.file = open(args[0], 'w', buffering=1 << 20)
+        self.quoted = {None: "null"} # Strings are json encoded once
+        super().__init__(*args, **kwargs)
+
+    def quote(self, s: str) -> str:
+        q = self.quoted.get(s)
+        if q is None:
+            q = self.quoted[s] = json.dumps(s)
+        return q
+
+    def writeRecords(self, chunk: list) -> None:
+        quote = self.quote
+        self.file.write("".join(
+            '{"time": %d, "category": %s, "kind": %s, "pod": %s, "node": %s, "queue": %d, "cpu": %d, "gpu": %d, "ram": %d}\n'
+            % (time, quote(category), quote(kind), quote(pod), quote(node), queue, cpu, gpu, ram)
+            for time, category, kind, pod, node, queue, cpu, gpu, ram in chunk))
+
+    def finish(self) -> None:
+        self.file.close()
+
+class BinarySink(TraceSink):
+    # Binary workload file of kind "trace" (see workload_file.py), one int64 column per field
+    # The columns are appended to temp files as the records come in and copied into the trace file at the end
+    def __init__(self, *args, **kwargs) -> None:
+        self.spools = [tempfile.TemporaryFile() for _ in binaryColumns]
+        self.strings = {None: -1} # string -> id
+        super().__init__(*args, **kwargs)
+
+    def writeRecords(self, chunk: list) -> None:
+        strings = self.strings
+        for i, values in enumerate(zip(*chunk)):
+            if binaryColumns[i].endswith("Ids"):
+                values = [strings.setdefault(s, len(strings) - 1) for s in values]
+            self.spools[i].write(array('q', values).tobytes())
+
+    def finish(self) -> None:
+        data = dict(zip(binaryColumns, self.spools))
+        data["stringOffsets"], data["strings"] = workload_file.packStrings(s for s in self.strings if s is not None)
+        workload_file.writeWorkload(self.path, "trace", " ".join(fields), self.records, data)
+        for spool in self.spools:
+            spool.close()
+
+def openSink(spec: str, background: bool = False) -> TraceSink:
+    # <file>[:<categories>[:<sample rate>]], a .jsonl file gets json lines, any other file the binary format
+    # A drive letter stays with the file, C:\t.jsonl:event is the file C:\t.jsonl
+    drive = spec[:2] if re.match(r"[A-Za-z]:[\\/]", spec) else ""
+    parts = spec[len(drive):].split(":", 2)
+    parts[0] = drive + parts[0]
+    enabled = parts[1].split(",") if len(parts) > 1 and parts[1] != "" else categories
+    for category in enabled:
+        if category not in categories:
+            print("Unknown trace category %s, use %s" % (category, ",".join(categories)))
+            sys.exit(1)
+    try:
+        sampleRate = float(parts[2]) if len(parts) > 2 else 1.0
+    except ValueError:
+        sampleRate = 0.0
+    if not 0 < sampleRate <= 1:
+        print("Trace sample rate has to be above 0 and at most 1, got %s" % (parts[2]))
+        sys.exit(1)
+    sinkClass = JsonlSink if parts[0].endswith(".jsonl") else BinarySink
+    return sinkClass(parts[0], enabled, sampleRate, background=background)
+
+def toJsonl(inFile: str, outFile: str) -> None:
+    # Binary trace to json lines
+    workload = Workload(inFile)
+    if workload.kind != "trace":
+        print("Expected a trace file, got a %s file" % (workload.kind))
+        sys.exit(1)
+    strings = workload.getStringList() + [None] # Id -1 is None
+    sink = JsonlSink(outFile)
+    step = sink.bufferSize
+    for start in range(0, workload.rows, step):
+        columns = []
+        for name in binaryColumns:
+            values = workload.getColumn(name)[start:start + step].tolist()
+            columns.append([strings[i] for i in values] if name.endswith("Ids") else values)
+        sink.writeRecords(list(zip(*columns)))
+    sink.finish()
+
+def userCallHelper():
+    print('trace_sink.py -i <trace.bin> -o <trace.jsonl>')
+    print('Converts a binary trace of simulator.py -e to json lines')
+
+def main(argv):
+    inFile = ''
+    outFile = ''
+    try:
+        opts, args = getopt.getopt(argv, "hi:o:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    for opt, arg in opts:
+        if opt == "-h":
+            userCallHelper()
+            sys.exit(1)
+        elif opt == "-i":
+            inFile = arg
+        elif opt == "-o":
+            outFile = arg
+
+    if inFile == "" or outFile == "":
+        userCallHelper()
+        sys.exit(1)
+    toJsonl(inFile, outFile)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,233 @@
+from array import array
+import getopt, hashlib, itertools, json, mmap, os, shutil, sys, tempfile
+
+from pods import *
+from nodes import *
+from pod_table import PodTable
+
+# Binary workload file, columns of the pod or node text file that can be memory mapped
+#   8 bytes magic, int64 length of the json index, the json index, padding to 8 bytes, the columns
+# The index has the kind (pods or nodes), the number of rows, the text header line and
+# column name -> [offset, length in bytes], offsets are from the start of the file and 8 byte aligned
+# Every number is a native int64, user and pod or node names are ids into one string table of distinct
+# strings, stored as the utf-8 bytes of all strings (strings) and the start of each string (stringOffsets)
+MAGIC = b"KSIMWL1\0"
+
+podColumns = ("userIds", "nameIds", "at", "work", "prio", "tickets", "cpu", "gpu", "ram") # Text file field order
+nodeColumns = ("nameIds", "cpu", "gpu", "ram")
+topologyFields = ("zone", "rack") # Optional node file columns after ram, in this order
+
+cacheDir = ".workload_cache" # Converted text files, named by the hash of their content
+
+def isBinary(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def getTopologyFields(header: str, path: str) -> tuple:
+    # Topology columns of a node file, from the names in its header line after ram
+    fields = tuple(header.split()[4:])
+    if fields != topologyFields[:len(fields)]:
+        print("Node file %s has columns %s after ram, expected %s" % (path, " ".join(fields), " ".join(topologyFields)))
+        sys.exit(1)
+    return fields
+
+def convert(inFile: str, outFile: str, kind: str) -> None:
+    # Text pod or node file to a binary workload file, kind is "pods" or "nodes"
+    strings = dict() # string -> id, in first seen order
+
+    with open(inFile, 'r') as f:
+        header = f.readline().strip()
+        names = podColumns if kind == "pods" else nodeColumns + tuple(field + "Ids" for field in getTopologyFields(header, inFile))
+        columns = [array('q') for _ in names]
+        for line in f:
+            line = line.strip().split()
+            if len(line) == 0:
+                continue
+            for i, column in enumerate(columns):
+                if names[i].endswith("Ids"):
+                    column.append(strings.setdefault(line[i], len(strings)))
+                else:
+                    column.append(int(line[i]))
+
+    data = dict(zip(names, columns))
+    data["stringOffsets"], data["strings"] = packStrings(strings)
+    writeWorkload(outFile, kind, header, len(columns[0]), data)
+
+def packStrings(strings) -> tuple:
+    # String table of strings in order, the utf-8 bytes of all strings and the start of each one
+    blob = bytearray()
+    stringOffsets = array('q')
+    for s in strings:
+        stringOffsets.append(len(blob))
+        blob += s.encode()
+    stringOffsets.append(len(blob))
+    return stringOffsets, blob
+
+def getSize(column) -> int:
+    # Bytes of an array, a bytes like object or a binary file
+    if isinstance(column, array):
+        return len(column) * column.itemsize
+    if hasattr(column, "seek"):
+        return column.seek(0, os.SEEK_END)
+    return len(column)
+
+def writeWorkload(outFile: str, kind: str, header: str, rows: int, data: dict) -> None:
+    # Writes the columns in data, name -> array, bytes like object or binary file with the raw column
+    # String columns need "stringOffsets" and "strings" in data too
+    # Offsets depend on the index length and the index holds the offsets, grow the space until it fits
+    indexSize = 256
+    while True:
+        offset = len(MAGIC) + 8 + indexSize
+        index = {"kind": kind, "rows": rows, "header": header, "columns": {}}
+        for name, column in data.items():
+            size = getSize(column)
+            index["columns"][name] = [offset, size]
+            offset += (size + 7) // 8 * 8
+        encoded = json.dumps(index).encode()
+        if len(encoded) <= indexSize:
+            break
+        indexSize = (len(encoded) + 7) // 8 * 8
+
+    # Written next to outFile then renamed, readers never see a partial file
+    fd, tmpFile = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(outFile)))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC)
+        f.write(array('q', [indexSize]).tobytes())
+        f.write(encoded.ljust(indexSize, b" "))
+        for column in data.values():
+            size = getSize(column)
+            if hasattr(column, "seek"):
+                column.seek(0)
+                shutil.copyfileobj(column, f)
+            else:
+                f.write(column.tobytes() if isinstance(column, array) else bytes(column))
+            f.write(bytes(-size % 8))
+    os.chmod(tmpFile, 0o644) # mkstemp makes it private to the user
+    os.replace(tmpFile, outFile)
+
+def getCached(inFile: str, kind: str) -> str:
+    # Binary file for inFile, converted once per content and kept in cacheDir
+    if isBinary(inFile):
+        return inFile
+    digest = hashlib.sha1()
+    with open(inFile, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    path = os.path.join(cacheDir, "%s.%s.bin" % (digest.hexdigest(), kind))
+    if not os.path.exists(path):
+        os.makedirs(cacheDir, exist_ok=True)
+        convert(inFile, path, kind)
+    return path
+
+class StringColumn:
+    # Read only sequence of strings, item i is strings[ids[i]] decoded when it is read
+    def __init__(self, workload, ids) -> None:
+        self.workload = workload
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> str:
+        return self.workload.getString(self.ids[index])
+
+class Workload:
+    # Memory mapped binary workload file, columns are int64 memoryviews over the mapping
+    # PodTable reads the columns that do not change in place, loadPods and loadNodes copy them out as lists once
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                print("Not a binary workload file: %s" % (path))
+                sys.exit(1)
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        indexSize = memoryview(self.mm)[len(MAGIC):len(MAGIC) + 8].cast('q')[0]
+        index = json.loads(bytes(self.mm[len(MAGIC) + 8:len(MAGIC) + 8 + indexSize]))
+        self.kind = index["kind"]
+        self.rows = index["rows"]
+        self.header = index["header"]
+        self.columns = index["columns"]
+        self.stringOffsets = self.getColumn("stringOffsets")
+        start, size = self.columns["strings"]
+        self.strings = memoryview(self.mm)[start:start + size]
+
+    def getColumn(self, name: str) -> memoryview:
+        # int64 column as a memoryview, items are python ints
+        start, size = self.columns[name]
+        return memoryview(self.mm)[start:start + size].cast('q')
+
+    def getString(self, id: int) -> str:
+        return str(self.strings[self.stringOffsets[id]:self.stringOffsets[id + 1]], "utf-8")
+
+    def getStrings(self, name: str) -> StringColumn:
+        return StringColumn(self, self.getColumn(name))
+
+    def getStringList(self) -> list[str]:
+        # Every string decoded, item i is the string with id i
+        offsets = self.stringOffsets.tolist()
+        strings = self.strings
+        return [str(strings[offsets[i]:offsets[i + 1]], "utf-8") for i in range(len(offsets) - 1)]
+
+    def getStringTable(self) -> StringColumn:
+        # Every string, item i is the string with id i
+        return StringColumn(self, range(len(self.stringOffsets) - 1))
+
+def loadPods(workload: Workload, podList: PodList) -> list[Pod]:
+    # Adds the pods of a binary pod file to podList, returns them in file order
+    if workload.kind != "pods":
+        print("Expected a pod file, got a %s file" % (workload.kind))
+        sys.exit(1)
+    if isinstance(podList, PodTable):
+        return podList.loadWorkload(workload)
+
+    # Pods are objects here, so the columns are read out as lists once instead of item by item
+    strings = workload.getStringList()
+    columns = [workload.getColumn(name).tolist() for name in podColumns]
+    pods = []
+    for userId, nameId, at, work, prio, tickets, cpu, gpu, ram in zip(*columns):
+        pods.append(podList.createPod(strings[userId], strings[nameId], at, work, cpu, gpu, ram, prio, tickets, State.CREATED))
+    return pods
+
+def loadNodes(workload: Workload, nodeList: NodeList) -> None:
+    if workload.kind != "nodes":
+        print("Expected a node file, got a %s file" % (workload.kind))
+        sys.exit(1)
+    strings = workload.getStringList()
+    columns = [workload.getColumn(name).tolist() for name in nodeColumns]
+    topology = [field for field in topologyFields if field + "Ids" in workload.columns]
+    topologyColumns = [[strings[i] for i in workload.getColumn(field + "Ids").tolist()] for field in topology]
+    for (nameId, cpu, gpu, ram), labels in zip(zip(*columns), zip(*topologyColumns) if topology else itertools.repeat(())):
+        nodeList.addNode(Node(strings[nameId], cpu, gpu, ram, **dict(zip(topology, labels))))
+
+def userCallHelper():
+    print('workload_file.py -p <pods.txt> | -n <nodes.txt> -o <out.bin>')
+    print('Converts a pod or node text file to the binary workload format')
+
+def main(argv):
+    inFile = ''
+    outFile = ''
+    kind = ''
+    try:
+        opts, args = getopt.getopt(argv, "hp:n:o:")
+    except getopt.GetoptError:
+        userCallHelper()
+        sys.exit(1)
+    for opt, arg in opts:
+        if opt == "-h":
+            userCallHelper()
+            sys.exit(1)
+        elif opt == "-p":
+            inFile = arg
+            kind = "pods"
+        elif opt == "-n":
+            inFile = arg
+            kind = "nodes"
+        elif opt == "-o":
+            outFile = arg
+
+    if inFile == "" or outFile == "":
+        userCallHelper()
+        sys.exit(1)
+    convert(inFile, outFile, kind)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])